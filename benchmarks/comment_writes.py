@@ -0,0 +1,100 @@
+"""Бенчмарк записи комментариев при всплеске нагрузки.
+
+Сравнивает прямую запись каждого комментария (comment.save())
+с отложенной записью через журнал и пакетный bulk_create.
+Потоки имитируют воркеры, одновременно комментирующие один пост.
+
+    python benchmarks/comment_writes.py --threads 16 --comments 200
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from common import setup_django
+
+
+def run_threads(threads, comments, write):
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        from django.db import OperationalError, connection
+
+        for i in range(comments):
+            started = time.perf_counter()
+            try:
+                write(i)
+            except OperationalError as error:
+                with lock:
+                    errors.append(str(error))
+            with lock:
+                latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    return time.perf_counter() - started, latencies, errors
+
+
+def report(name, total, elapsed, latencies, errors):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f'{name:>12}: {total / elapsed:8.0f} комм./с, '
+        f'p99 {p99:7.2f} мс, ошибок блокировки: {len(errors)}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--comments', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django(
+        BACKGROUND_TASKS_EAGER=False,
+        COMMENTS_QUEUE_DIR=tempfile.mkdtemp(),
+    )
+
+    from django.contrib.auth import get_user_model
+
+    from posts import comment_queue
+    from posts.models import Comment, Post
+
+    user = get_user_model().objects.create_user(username='bench')
+    post = Post.objects.create(author=user, text='Популярный пост')
+    total = args.threads * args.comments
+
+    def direct(i):
+        Comment.objects.create(post=post, author=user, text=f'Прямой {i}')
+
+    report('save()', total, *run_threads(args.threads, args.comments, direct))
+
+    # Журнал сбрасывается один раз в конце, без фонового потока.
+    comment_queue._flusher = True
+
+    def queued(i):
+        comment_queue.enqueue(post.id, user, f'Отложенный {i}')
+
+    elapsed, latencies, errors = run_threads(
+        args.threads, args.comments, queued
+    )
+    flush_started = time.perf_counter()
+    comment_queue.flush()
+    elapsed += time.perf_counter() - flush_started
+    report('write-behind', total, elapsed, latencies, errors)
+
+    assert Comment.objects.filter(text__startswith='Отложенный').count() == (
+        total
+    )
+
+
+if __name__ == '__main__':
+    main()
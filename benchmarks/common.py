@@ -0,0 +1,36 @@
+"""Общая подготовка окружения Django для бенчмарков.
+
+Бенчмарки запускаются из корня репозитория, например:
+
+    python benchmarks/comment_writes.py
+"""
+import os
+import sys
+import tempfile
+
+PROJECT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'yatube'
+)
+
+
+def setup_django(**overrides):
+    """Настраивает Django на отдельной временной базе SQLite
+    и применяет миграции. Возвращает путь к файлу базы.
+    """
+
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DATABASES['default']['OPTIONS'] = {'timeout': 5}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+    return db_path
@@ -0,0 +1,84 @@
+"""Бенчмарк накладных расходов семплирующего профайлера.
+
+Сравнивает медианное время ответа страницы автора без профайлера
+и с SamplingProfilerMiddleware: при доле выборки из настроек
+и при профилировании каждого запроса. Замеры чередуются по раундам,
+а порядок вариантов сдвигается, чтобы шум машины делился поровну.
+
+    python benchmarks/profiler_overhead.py --requests 300 --rounds 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from common import setup_django
+
+
+def measure(client, url, requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--posts', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django(PROFILING_DIR=tempfile.mkdtemp())
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.urls import reverse
+
+    from posts.models import Post
+
+    user = get_user_model().objects.create_user(username='bench')
+    Post.objects.bulk_create(
+        Post(author=user, text=f'Пост {i}') for i in range(args.posts)
+    )
+    url = reverse('posts:profile', args=(user.username,))
+    variants = {
+        'выключен': (False, 0),
+        f'доля {settings.PROFILING_REQUEST_RATE:g}': (
+            True, settings.PROFILING_REQUEST_RATE
+        ),
+        'каждый запрос': (True, 1),
+    }
+    latencies = {name: [] for name in variants}
+    order = list(variants)
+    measure(Client(), url, args.requests)
+
+    for _ in range(args.rounds):
+        order.append(order.pop(0))
+        for name in order:
+            enabled, rate = variants[name]
+            settings.PROFILING_ENABLED = enabled
+            settings.PROFILING_REQUEST_RATE = rate
+            # Middleware подключается при первом запросе нового клиента.
+            client = Client()
+            measure(client, url, 10)
+            latencies[name] += measure(client, url, args.requests)
+
+    baseline = statistics.median(latencies['выключен'])
+    for name, values in latencies.items():
+        median = statistics.median(values)
+        print(
+            f'{name:>14}: медиана {median * 1000:6.2f} мс, '
+            f'накладные расходы {(median / baseline - 1) * 100:+5.1f}%'
+        )
+    assert os.listdir(settings.PROFILING_DIR), 'профиль не записан'
+
+
+if __name__ == '__main__':
+    main()
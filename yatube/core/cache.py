@@ -0,0 +1,97 @@
+from functools import partial
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+GENERATION_KEY = '{}:generation'
+
+# Бэкенды, которые живут в памяти одного процесса: сброс ключа в одном
+# воркере не виден остальным.
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+_disabled = DummyCache('shared', {})
+
+
+def shared_cache():
+    """Кеш SHARED_CACHE для данных, которые должны совпадать во всех
+    процессах. Если он локален для процесса (LocMemCache), возвращается
+    DummyCache: такие данные читаются из базы, а не из устаревшей копии.
+    """
+
+    shared = caches[settings.SHARED_CACHE]
+    if isinstance(shared, PROCESS_LOCAL_BACKENDS):
+        return _disabled
+
+    return shared
+
+
+def is_enabled():
+    """Хранит ли SHARED_CACHE данные или они всегда читаются из базы."""
+
+    return shared_cache() is not _disabled
+
+
+def _generations(shared, keys):
+    """Текущие поколения ключей; ключу без поколения назначается новое."""
+
+    generation_keys = {GENERATION_KEY.format(key): key for key in keys}
+    found = shared.get_many(generation_keys)
+    for generation_key in generation_keys.keys() - found.keys():
+        shared.add(generation_key, uuid4().hex, None)
+    found.update(shared.get_many(generation_keys.keys() - found.keys()))
+
+    return {
+        key: found.get(generation_key, '')
+        for generation_key, key in generation_keys.items()
+    }
+
+
+def get_many(keys, load, timeout):
+    """Значения {ident: value} для ключей {ключ: ident} из общего кеша,
+    недостающие — одним вызовом load(idents), который возвращает
+    {ident: value}.
+
+    Значения хранятся под поколением ключа, прочитанным до обращения
+    к базе. Если invalidate сработал во время загрузки, устаревшее
+    значение запишется под прежним поколением, и его никто не прочтёт.
+    """
+
+    shared = shared_cache()
+    generations = _generations(shared, keys)
+    stored = {
+        f'{key}:{generations[key]}': ident for key, ident in keys.items()
+    }
+    result = {
+        stored[key]: value for key, value in shared.get_many(stored).items()
+    }
+    missing = [ident for ident in stored.values() if ident not in result]
+    if missing:
+        loaded = load(missing)
+        shared.set_many({
+            key: loaded[ident] for key, ident in stored.items()
+            if ident in loaded
+        }, timeout)
+        result.update(loaded)
+
+    return result
+
+
+def _bump(keys):
+    shared_cache().set_many({
+        GENERATION_KEY.format(key): uuid4().hex for key in keys
+    }, None)
+
+
+def invalidate(*keys):
+    """Сбрасывает ключи во всех процессах сменой их поколения. Внутри
+    транзакции поколение меняется ещё раз после коммита, чтобы значение,
+    прочитанное другим процессом до коммита, тоже не осталось в кеше.
+    """
+
+    _bump(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(partial(_bump, keys))
@@ -1,9 +1,13 @@
 import datetime as dt
 
+from django.utils.functional import SimpleLazyObject
+
 
 def year(request):
-    """Функция возвращает текущий год."""
+    """Функция возвращает текущий год. Вычисляется лениво, только если
+    шаблон его выводит.
+    """
 
     return {
-        'year': dt.datetime.today().year,
+        'year': SimpleLazyObject(lambda: dt.datetime.today().year),
     }
@@ -0,0 +1,13 @@
+from django import forms
+from django.conf import settings
+
+
+class CaptureForm(forms.Form):
+    """Запуск профилирования всех потоков процесса на время."""
+
+    seconds = forms.IntegerField(
+        label='Длительность, с',
+        min_value=1,
+        max_value=settings.PROFILING_MAX_CAPTURE_SEC,
+        initial=10,
+    )
@@ -0,0 +1,175 @@
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .tasks import every
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_SUFFIX = '.msg'
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _queue_path(*parts):
+    return os.path.join(settings.EMAIL_QUEUE_DIR, *parts)
+
+
+def _write(path, entry):
+    """Атомарно записывает письмо в очередь: сначала во временный
+    файл, затем переименование.
+    """
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        pickle.dump(entry, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = every(settings.EMAIL_QUEUE_INTERVAL_SEC, send_queued)
+
+
+def _name(send_at):
+    """Имя файла начинается со времени отправки, поэтому сортировка
+    имён даёт очередь в порядке готовности писем.
+    """
+
+    return f'{send_at:017.6f}-{uuid.uuid4().hex}{MESSAGE_SUFFIX}'
+
+
+def enqueue(message):
+    message.connection = None
+    entry = {'message': message, 'attempts': 0}
+    _write(_queue_path(_name(time.time())), entry)
+
+
+def _claim(batch_size):
+    """Забирает из очереди до batch_size писем, время отправки которых
+    подошло. Письмо переносится в processing/ переименованием, поэтому
+    одно письмо достаётся только одному обработчику.
+    """
+
+    try:
+        names = sorted(
+            name for name in os.listdir(_queue_path())
+            if name.endswith(MESSAGE_SUFFIX)
+        )
+    except FileNotFoundError:
+        return []
+
+    os.makedirs(_queue_path('processing'), exist_ok=True)
+    now = time.time()
+    claimed = []
+    for name in names[:batch_size]:
+        if float(name.split('-', 1)[0]) > now:
+            break
+        processing = _queue_path('processing', name)
+        try:
+            os.rename(_queue_path(name), processing)
+            os.utime(processing)
+            with open(processing, 'rb') as file:
+                entry = pickle.load(file)
+        except FileNotFoundError:
+            continue
+        claimed.append((name, processing, entry))
+
+    return claimed
+
+
+def _retry(name, processing, entry):
+    entry['attempts'] += 1
+    if entry['attempts'] >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        logger.error('Письмо %s не отправлено, попытки исчерпаны', name)
+        _write(_queue_path('failed', name), entry)
+    else:
+        delay = settings.EMAIL_QUEUE_RETRY_DELAY_SEC * 2 ** (
+            entry['attempts'] - 1
+        )
+        _write(_queue_path(_name(time.time() + delay)), entry)
+    os.remove(processing)
+
+
+def requeue_stale(max_age):
+    """Возвращает в очередь письма, застрявшие в processing/ дольше
+    max_age секунд, например после падения обработчика.
+    """
+
+    directory = _queue_path('processing')
+    if not os.path.isdir(directory):
+        return 0
+    requeued = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if time.time() - os.path.getmtime(path) > max_age:
+            os.replace(path, _queue_path(name))
+            requeued += 1
+
+    return requeued
+
+
+def send_queued(batch_size=None):
+    """Отправляет накопленные письма пачками через одно соединение
+    с EMAIL_QUEUE_BACKEND на пачку. Неотправленные письма возвращаются
+    в очередь с экспоненциальной задержкой, после EMAIL_QUEUE_MAX_ATTEMPTS
+    попыток — в failed/. Возвращает число отправленных писем.
+    """
+
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    sent = 0
+    while True:
+        claimed = _claim(batch_size)
+        if not claimed:
+            return sent
+
+        connection = get_connection(settings.EMAIL_QUEUE_BACKEND)
+        try:
+            connection.open()
+        except Exception:
+            logger.exception('Не удалось подключиться к почтовому серверу')
+            for item in claimed:
+                _retry(*item)
+            return sent
+        try:
+            for name, processing, entry in claimed:
+                try:
+                    sent += connection.send_messages([entry['message']])
+                except Exception:
+                    logger.exception('Ошибка отправки письма %s', name)
+                    _retry(name, processing, entry)
+                else:
+                    os.remove(processing)
+        finally:
+            connection.close()
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Почтовый бэкенд, который не отправляет письма в запросе, а кладёт
+    их в очередь на диске. Очередь разбирает фоновый поток или команда
+    send_queued_mail, сама отправка идёт через EMAIL_QUEUE_BACKEND.
+    От BACKGROUND_TASKS_EAGER не зависит: запрос не ждёт почтовый сервер
+    и в режиме отладки.
+    """
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            enqueue(message)
+        _start_worker()
+
+        return len(email_messages)
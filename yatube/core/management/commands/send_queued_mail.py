@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.mail import requeue_stale, send_queued
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди исходящей почты.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а разбирать очередь периодически.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.EMAIL_QUEUE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale(settings.EMAIL_QUEUE_STALE_SEC)
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь писем: {requeued}')
+        while True:
+            count = send_queued(options['batch_size'])
+            if count:
+                self.stdout.write(f'Отправлено писем: {count}')
+            if not options['loop']:
+                break
+            time.sleep(settings.EMAIL_QUEUE_INTERVAL_SEC)
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from core.tracing import load_traces
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает сохранённые трассы запросов: время по SQL, шаблонам '
+        'и миниатюрам, а с --spans — самые долгие спаны.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--slowest',
+            action='store_true',
+            help='Сортировать по длительности, а не по времени запроса.',
+        )
+        parser.add_argument(
+            '--spans',
+            type=int,
+            default=0,
+            help='Сколько самых долгих спанов показать для каждой трассы.',
+        )
+
+    def handle(self, *args, **options):
+        traces = load_traces()
+        if options['slowest']:
+            traces.sort(key=lambda trace: trace['duration'], reverse=True)
+        for trace in traces[:options['limit']]:
+            self.stdout.write(
+                f"{trace['duration']:9.1f} ms  {trace['status']}  "
+                f"{trace['method']} {trace['path']}  ({trace['view']})"
+            )
+            for kind, total in sorted(trace['summary'].items()):
+                self.stdout.write(
+                    f"    {kind:<10} {total['count']:4d} шт. "
+                    f"{total['duration']:9.1f} ms"
+                )
+            spans = sorted(
+                (span for span in trace['spans'] if span['kind'] != 'view'),
+                key=lambda span: span['duration'],
+                reverse=True,
+            )
+            for span in spans[:options['spans']]:
+                self.stdout.write(
+                    f"      {span['duration']:9.1f} ms  {span['kind']}: "
+                    f"{span['name']}"
+                )
@@ -1,16 +1,32 @@
 from django.db import models
 
 
+class VisibleQuerySet(models.QuerySet):
+    def visible(self):
+        """Только записи, не скрытые модератором."""
+
+        return self.filter(is_hidden=False)
+
+
 class TextAndPubDateModel(models.Model):
-    """Абстрактная модель. Добавляет дату создания и текст."""
+    """Абстрактная модель. Добавляет дату создания, текст
+    и флаг скрытия модератором (мягкое удаление).
+    """
 
     pub_date = models.DateTimeField(
         'Дата создания',
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True,
     )
     text = models.TextField(
         'Текст',
     )
+    is_hidden = models.BooleanField(
+        'Скрыто модератором',
+        default=False,
+    )
+
+    objects = VisibleQuerySet.as_manager()
 
     class Meta:
         abstract = True
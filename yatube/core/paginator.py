@@ -0,0 +1,53 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_count(model, using='default'):
+    """Приблизительное число строк в таблице модели без COUNT(*).
+    Возвращает None, если СУБД не даёт дешёвой оценки.
+    """
+
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                'SELECT MAX(rowid) - MIN(rowid) + 1 FROM '
+                + connection.ops.quote_name(table)
+            )
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+
+    return row[0] if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц: для выборки без фильтров берёт
+    оценку числа строк из статистики СУБД вместо COUNT(*), а точный
+    подсчёт делает только для небольших таблиц и отфильтрованных выборок.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+
+        return super().count
@@ -0,0 +1,150 @@
+import inspect
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import MiddlewareNotUsed, ObjectDoesNotExist
+from django.http import Http404, HttpRequest, HttpResponse
+from django.http import HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.http import http_date
+
+INDEX_FILE = 'index.html'
+
+
+def path_to_file(path):
+    """Файл на диске для адреса страницы (уже раскодированного, как
+    request.path_info) или None, если адрес выходит за PRERENDER_ROOT.
+    """
+
+    root = os.path.abspath(settings.PRERENDER_ROOT)
+    file_path = os.path.abspath(
+        os.path.join(root, path.lstrip('/'), INDEX_FILE)
+    )
+    if not file_path.startswith(root + os.sep):
+        return None
+
+    return file_path
+
+
+def anonymous_request(path, match=None):
+    """Запрос анонимного посетителя без cookies для отрисовки страниц
+    вне обработки настоящего запроса.
+    """
+
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {
+        'SERVER_NAME': settings.ALLOWED_HOSTS[0],
+        'SERVER_PORT': '80',
+    }
+    request.resolver_match = match
+    request.user = AnonymousUser()
+
+    return request
+
+
+def render_page(path):
+    """Рендерит страницу так, как её видит анонимный посетитель.
+    Декораторы представления (в том числе cache_page) пропускаются,
+    чтобы на диск не попала устаревшая копия из кеша.
+    Возвращает HTML или None, если страницы больше нет.
+    """
+
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    view = inspect.unwrap(match.func)
+    request = anonymous_request(path, match)
+    try:
+        response = view(request, *match.args, **match.kwargs)
+    except (Http404, ObjectDoesNotExist):
+        return None
+    if response.status_code != 200:
+        return None
+
+    return response.content
+
+
+def write_page(path):
+    """Перерисовывает страницу на диске; исчезнувшие страницы удаляются.
+    Файл подменяется атомарно, поэтому читатели не видят его наполовину.
+    """
+
+    file_path = path_to_file(path)
+    if file_path is None:
+        return False
+    content = render_page(path)
+    if content is None:
+        remove_page(path)
+        return False
+
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return True
+
+
+def remove_page(path):
+    file_path = path_to_file(path)
+    if file_path is not None and os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def write_pages(paths):
+    """Перерисовывает страницы; возвращает число записанных файлов."""
+
+    return sum(write_page(path) for path in dict.fromkeys(paths))
+
+
+class PrerenderMiddleware:
+    """Отдаёт анонимным GET-запросам без параметров заранее отрисованные
+    страницы из PRERENDER_ROOT, не доходя до сессий и представлений.
+    Если файла нет, запрос обрабатывается Django как обычно.
+    Ставится в MIDDLEWARE перед SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PRERENDER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or request.META.get('QUERY_STRING')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return self.get_response(request)
+
+        file_path = path_to_file(request.path_info)
+        if file_path is None:
+            return self.get_response(request)
+        try:
+            with open(file_path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                content = file.read()
+        except OSError:
+            return self.get_response(request)
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = 'no-cache'
+
+        return response
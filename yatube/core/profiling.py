@@ -0,0 +1,178 @@
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_SUFFIX = '.folded'
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+\.folded$')
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _collapse(frame):
+    """Стек кадра в формате collapsed stacks: от корня к листу,
+    функции как модуль:имя через точку с запятой.
+    """
+
+    names = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{frame.f_code.co_name}')
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+def _sample(stacks, idents=None):
+    """Снимает стеки потоков idents (None — всех, кроме текущего)."""
+
+    own = threading.get_ident()
+    for ident, frame in sys._current_frames().items():
+        if ident == own or idents is not None and ident not in idents:
+            continue
+        stacks[_collapse(frame)] += 1
+
+
+def profile_path(name):
+    if not PROFILE_NAME_RE.match(name):
+        raise ValueError(name)
+
+    return os.path.join(settings.PROFILING_DIR, name)
+
+
+def write_profile(name, stacks):
+    """Атомарно записывает стеки в файл для flamegraph.pl/speedscope."""
+
+    path = profile_path(name)
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.PROFILING_DIR, prefix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def list_profiles():
+    """Сохранённые профили, самые новые первыми: [(имя, размер, mtime)]."""
+
+    try:
+        entries = [
+            entry for entry in os.scandir(settings.PROFILING_DIR)
+            if entry.name.endswith(PROFILE_SUFFIX)
+        ]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+    return [
+        (entry.name, entry.stat().st_size, entry.stat().st_mtime)
+        for entry in entries
+    ]
+
+
+class RequestSampler:
+    """Фоновый поток, который раз в PROFILING_INTERVAL_MS снимает стеки
+    только тех потоков, что сейчас обслуживают выбранные запросы, и раз
+    в PROFILING_FLUSH_SEC (и перед засыпанием) переписывает накопленное
+    в файл процесса. Пока выбранных запросов нет, поток спит на событии.
+    """
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.idents = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.name = f'requests-{os.getpid()}{PROFILE_SUFFIX}'
+        threading.Thread(
+            target=self.run, name='yatube-profiler', daemon=True
+        ).start()
+
+    def add(self, ident):
+        with self.lock:
+            self.idents.add(ident)
+        self.wake.set()
+
+    def discard(self, ident):
+        with self.lock:
+            self.idents.discard(ident)
+
+    def run(self):
+        interval = settings.PROFILING_INTERVAL_MS / 1000
+        flushed = time.monotonic()
+        while True:
+            self.wake.wait()
+            with self.lock:
+                idents = set(self.idents)
+                if not idents:
+                    self.wake.clear()
+            if not idents:
+                write_profile(self.name, self.stacks)
+                continue
+            _sample(self.stacks, idents)
+            if time.monotonic() - flushed >= settings.PROFILING_FLUSH_SEC:
+                write_profile(self.name, self.stacks)
+                flushed = time.monotonic()
+            time.sleep(interval)
+
+
+def _get_sampler():
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = RequestSampler()
+    return _sampler
+
+
+def capture(seconds):
+    """Профилирует все потоки процесса в течение seconds секунд в фоне.
+    Возвращает имя файла, в который будет записан профиль.
+    """
+
+    name = f'capture-{os.getpid()}-{int(time.time())}{PROFILE_SUFFIX}'
+    interval = settings.PROFILING_INTERVAL_MS / 1000
+
+    def run():
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            _sample(stacks)
+            time.sleep(interval)
+        write_profile(name, stacks)
+
+    threading.Thread(target=run, name='yatube-capture', daemon=True).start()
+
+    return name
+
+
+class SamplingProfilerMiddleware:
+    """Профилирует долю PROFILING_REQUEST_RATE запросов
+    семплирующим профайлером: стеки снимает отдельный поток, сам запрос
+    ничего не замеряет. Не подключается, если PROFILING_ENABLED выключен.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_REQUEST_RATE:
+            return self.get_response(request)
+
+        sampler = _get_sampler()
+        ident = threading.get_ident()
+        sampler.add(ident)
+        try:
+            return self.get_response(request)
+        finally:
+            sampler.discard(ident)
@@ -0,0 +1,165 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+LOCAL_BUCKETS_LIMIT = 10000
+
+metrics = Counter()
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """Разбирает строку вида '10/m' в (число запросов, период в секундах)."""
+
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+class TokenBucket:
+    """Корзина токенов: вмещает capacity токенов
+    и пополняется на capacity токенов за period секунд.
+    """
+
+    __slots__ = ('capacity', 'refill_rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, period, tokens=None, updated=None):
+        self.capacity = capacity
+        self.refill_rate = capacity / period
+        self.tokens = capacity if tokens is None else tokens
+        self.updated = time.time() if updated is None else updated
+
+    def _refill(self, now):
+        elapsed = max(now - self.updated, 0)
+        self.tokens = min(
+            self.capacity, self.tokens + elapsed * self.refill_rate
+        )
+        self.updated = now
+
+    def wait_time(self, now):
+        """Сколько секунд ждать до появления токена, не расходуя его."""
+
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.refill_rate
+
+    def take(self, now):
+        """Забирает токен. Возвращает 0 или время ожидания в секундах."""
+
+        wait = self.wait_time(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+
+def _remember_locally(key, bucket):
+    with _local_lock:
+        _local[key] = bucket
+        _local.move_to_end(key)
+        if len(_local) > LOCAL_BUCKETS_LIMIT:
+            _local.popitem(last=False)
+
+
+def hit(scope, ident, rate):
+    """Учитывает запрос в корзине scope/ident.
+    Пока локальная корзина процесса пуста, запрос отклоняется без обращения
+    к кешу, иначе состояние корзины берётся из общего кеша.
+    Возвращает 0 или время ожидания в секундах.
+    """
+
+    key = f'ratelimit:{scope}:{rate}:{ident}'
+    now = time.time()
+    capacity, period = parse_rate(rate)
+
+    bucket = _local.get(key)
+    if bucket is not None:
+        wait = bucket.wait_time(now)
+        if wait:
+            return wait
+
+    state = cache.get(key)
+    bucket = TokenBucket(capacity, period, *(state or ()))
+    wait = bucket.take(now)
+    cache.set(key, (bucket.tokens, bucket.updated), period)
+    _remember_locally(key, bucket)
+
+    return wait
+
+
+def limit_request(request, scope):
+    """Проверяет все лимиты scope из settings.RATELIMITS для запроса.
+    Пользователь запрашивается только для лимитов 'user'.
+    """
+
+    limits = settings.RATELIMITS.get(scope, {})
+    waits = [0]
+    if 'ip' in limits:
+        ident = request.META.get('REMOTE_ADDR', '')
+        waits.append(hit(scope, f'ip:{ident}', limits['ip']))
+    if 'user' in limits and request.user.is_authenticated:
+        waits.append(hit(scope, f'user:{request.user.pk}', limits['user']))
+
+    return max(waits)
+
+
+def stats():
+    """Счётчики процесса по областям лимитов:
+    [(область, пропущено, отклонено), ...].
+    """
+
+    scopes = sorted({scope for scope, _ in metrics})
+    return [
+        (scope, metrics[scope, 'allowed'], metrics[scope, 'limited'])
+        for scope in scopes
+    ]
+
+
+def too_many_requests(wait):
+    response = HttpResponse(
+        'Слишком много запросов, попробуйте позже.',
+        content_type='text/plain; charset=utf-8',
+        status=429,
+    )
+    response['Retry-After'] = str(math.ceil(wait))
+
+    return response
+
+
+def ratelimit(scope, methods=('POST',)):
+    """Декоратор view-функции: ограничивает частоту запросов methods
+    по правилам settings.RATELIMITS[scope] и отвечает 429 при превышении.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not settings.RATELIMIT_ENABLED or request.method not in methods:
+                return view(request, *args, **kwargs)
+
+            wait = limit_request(request, scope)
+            if wait:
+                metrics[scope, 'limited'] += 1
+                logger.warning(
+                    'Превышен лимит %s для %s', scope,
+                    request.META.get('REMOTE_ADDR'),
+                )
+                return too_many_requests(wait)
+
+            metrics[scope, 'allowed'] += 1
+            return view(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,190 @@
+import mimetypes
+import os
+import re
+from email.utils import parsedate_to_datetime
+from wsgiref.headers import Headers
+
+from django.conf import settings
+from django.utils.http import http_date
+
+from .storage import COMPRESSIBLE_EXTENSIONS
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+STATUSES = {
+    200: '200 OK',
+    206: '206 Partial Content',
+    304: '304 Not Modified',
+    405: '405 Method Not Allowed',
+    416: '416 Range Not Satisfiable',
+}
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+class StaticFilesMiddleware:
+    """WSGI-обёртка, которая сама отдаёт статику из STATIC_ROOT
+    и медиафайлы из MEDIA_ROOT: с ETag, Last-Modified, Range,
+    заранее сжатыми вариантами и долгим кешированием файлов с хешем
+    в имени. Остальные запросы и отсутствующие файлы уходят в Django.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.roots = [
+            (settings.STATIC_URL, settings.STATIC_ROOT, True),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT, False),
+        ]
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        for prefix, root, is_static in self.roots:
+            if root and path.startswith(prefix):
+                file_path = self.find_file(root, path[len(prefix):])
+                if file_path is not None:
+                    return self.serve(
+                        environ, start_response, file_path, is_static
+                    )
+
+        return self.application(environ, start_response)
+
+    @staticmethod
+    def find_file(root, name):
+        root = os.path.abspath(root)
+        file_path = os.path.abspath(os.path.join(root, name))
+        if not file_path.startswith(root + os.sep):
+            return None
+        if not os.path.isfile(file_path):
+            return None
+
+        return file_path
+
+    @staticmethod
+    def cache_control(file_path, is_static):
+        if is_static and HASHED_NAME_RE.search(os.path.basename(file_path)):
+            return 'public, max-age=31536000, immutable'
+        if is_static:
+            return f'public, max-age={settings.STATIC_MAX_AGE}'
+
+        return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+    @staticmethod
+    def choose_encoding(environ, file_path):
+        if environ.get('HTTP_RANGE'):
+            return None, file_path
+        accepted = {
+            part.split(';')[0].strip()
+            for part in environ.get('HTTP_ACCEPT_ENCODING', '').split(',')
+        }
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(file_path + suffix):
+                return encoding, file_path + suffix
+
+        return None, file_path
+
+    @staticmethod
+    def not_modified(environ, etag, mtime):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return if_none_match == '*' or etag in (
+                tag.strip() for tag in if_none_match.split(',')
+            )
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+
+        return False
+
+    @staticmethod
+    def parse_range(header, size):
+        """Возвращает (начало, длина) для одиночного диапазона,
+        None для неподдерживаемого заголовка и False для недопустимого.
+        """
+
+        match = RANGE_RE.match(header.strip())
+        if match is None:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return False
+        if not first:
+            length = min(int(last), size)
+            return (size - length, length) if length else False
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start > end:
+            return False
+
+        return start, end - start + 1
+
+    def serve(self, environ, start_response, file_path, is_static):
+        method = environ.get('REQUEST_METHOD')
+        headers = Headers([])
+        if method not in ('GET', 'HEAD'):
+            headers['Allow'] = 'GET, HEAD'
+            start_response(STATUSES[405], headers.items())
+            return []
+
+        encoding, served_path = self.choose_encoding(environ, file_path)
+        stat = os.stat(served_path)
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}'
+        etag += f'-{encoding}"' if encoding else '"'
+
+        content_type, _ = mimetypes.guess_type(file_path)
+        headers['Content-Type'] = content_type or 'application/octet-stream'
+        headers['Cache-Control'] = self.cache_control(file_path, is_static)
+        headers['ETag'] = etag
+        headers['Last-Modified'] = http_date(stat.st_mtime)
+        headers['Accept-Ranges'] = 'bytes'
+        if file_path.endswith(COMPRESSIBLE_EXTENSIONS):
+            headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        if self.not_modified(environ, etag, stat.st_mtime):
+            start_response(STATUSES[304], headers.items())
+            return []
+
+        status, start, length = 200, 0, stat.st_size
+        range_header = environ.get('HTTP_RANGE')
+        if_range = environ.get('HTTP_IF_RANGE')
+        if range_header and (if_range is None or if_range == etag):
+            byte_range = self.parse_range(range_header, stat.st_size)
+            if byte_range is False:
+                headers['Content-Range'] = f'bytes */{stat.st_size}'
+                headers['Content-Length'] = '0'
+                start_response(STATUSES[416], headers.items())
+                return []
+            if byte_range is not None:
+                start, length = byte_range
+                status = 206
+                headers['Content-Range'] = (
+                    f'bytes {start}-{start + length - 1}/{stat.st_size}'
+                )
+
+        headers['Content-Length'] = str(length)
+        start_response(STATUSES[status], headers.items())
+        if method == 'HEAD':
+            return []
+        if status == 200 and 'wsgi.file_wrapper' in environ:
+            return environ['wsgi.file_wrapper'](
+                open(served_path, 'rb'), CHUNK_SIZE
+            )
+
+        return _read_range(served_path, start, length)
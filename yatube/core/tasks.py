@@ -0,0 +1,78 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASKS_WORKERS,
+                thread_name_prefix='yatube-task',
+            )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+    finally:
+        connections.close_all()
+
+
+def defer(func, *args, **kwargs):
+    """Выполняет функцию в фоновом потоке после фиксации транзакции.
+    При BACKGROUND_TASKS_EAGER функция выполняется сразу, в том же потоке.
+    """
+
+    if settings.BACKGROUND_TASKS_EAGER:
+        func(*args, **kwargs)
+        return
+
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs)
+    )
+
+
+class PeriodicTask(threading.Thread):
+    """Фоновый поток, который раз в interval секунд вызывает функцию,
+    пока его не остановят методом stop().
+    """
+
+    def __init__(self, interval, func):
+        super().__init__(name=f'yatube-every-{func.__name__}', daemon=True)
+        self.interval = interval
+        self.func = func
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            _run(self.func, (), {})
+
+    def stop(self):
+        """Останавливает поток и дожидается конца текущего вызова."""
+
+        self.stopped.set()
+        self.join()
+
+
+def every(interval, func):
+    """Запускает функцию в отдельном фоновом потоке раз в interval секунд.
+    Возвращает поток PeriodicTask.
+    """
+
+    task = PeriodicTask(interval, func)
+    task.start()
+
+    return task
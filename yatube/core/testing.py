@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import override_settings
+
+
+class SharedCacheMixin:
+    """Подключает в тестах SHARED_CACHE, общий для процессов: файловый
+    кеш во временном каталоге. У каждого потока свой объект кеша, как
+    у отдельного процесса, а данные общие. other_process() подменяет
+    кеш в памяти процесса, оставляя общий кеш прежним.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shared_cache_dir = tempfile.mkdtemp()
+        cls.shared_caches = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cls.shared_cache_dir,
+            },
+        }
+        cls.shared_cache_settings = override_settings(
+            CACHES=cls.shared_caches, SHARED_CACHE='shared',
+        )
+        cls.shared_cache_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.shared_cache_settings.disable()
+        shutil.rmtree(cls.shared_cache_dir, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        caches['shared'].clear()
+
+    def other_process(self):
+        """Настройки, при которых код работает как в другом процессе:
+        со своим кешем в памяти, но с тем же SHARED_CACHE и базой.
+        """
+
+        return override_settings(CACHES={
+            **self.shared_caches,
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'other-process-{self.id()}',
+            },
+        })
+
+
+class TempDirsMixin:
+    """Направляет настройки-каталоги из temp_dir_settings во временные
+    каталоги системы на время класса тестов и удаляет их после.
+    """
+
+    temp_dir_settings = ()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dirs = {
+            name: tempfile.mkdtemp() for name in cls.temp_dir_settings
+        }
+        cls.temp_dirs_settings = override_settings(**cls.temp_dirs)
+        cls.temp_dirs_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.temp_dirs_settings.disable()
+        for path in cls.temp_dirs.values():
+            shutil.rmtree(path, ignore_errors=True)
@@ -1,10 +1,509 @@
-from django.test import TestCase
+import gzip
+import os
+from collections import Counter
+from http import HTTPStatus
+import shutil
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.shortcuts import render
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from . import cache as shared
+from .mail import send_queued
+from .profiling import _sample, profile_path, write_profile
+from .ratelimit import TokenBucket, _local
+from .static_server import StaticFilesMiddleware
+from .testing import SharedCacheMixin, TempDirsMixin
+from .tracing import load_traces
+from .views import permission_denied, server_error
 
 
 class ViewTestClass(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_error_page(self):
         """Страница 404 отдаёт кастомный шаблон"""
 
         response = self.client.get('/nonexist-page/')
 
         self.assertTemplateUsed(response, 'core/404.html')
+
+    def test_error_page_served_from_cache(self):
+        """Повторная страница 404 не рисуется заново, а адрес в ней
+        экранируется.
+        """
+
+        self.client.get('/nonexist-page/')
+
+        response = self.client.get('/<script>/')
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertTemplateNotUsed(response, 'core/404.html')
+        self.assertContains(
+            response, '&lt;script&gt;', status_code=HTTPStatus.NOT_FOUND
+        )
+
+    def test_error_handlers_status(self):
+        """Обработчики 403 и 500 отдают свои коды ответа."""
+
+        request = RequestFactory().get('/')
+        handlers = (
+            (server_error, (request,), HTTPStatus.INTERNAL_SERVER_ERROR),
+            (permission_denied, (request, None), HTTPStatus.FORBIDDEN),
+        )
+        for handler, args, status in handlers:
+            with self.subTest(handler=handler.__name__):
+                self.assertEqual(handler(*args).status_code, status)
+
+
+class SharedCacheTestClass(SharedCacheMixin, SimpleTestCase):
+    """Проверка версионированного кеша для данных всех процессов."""
+
+    def test_invalidate_during_load(self):
+        """Значение, загруженное до сброса ключа, не остаётся в кеше."""
+
+        def load(idents):
+            shared.invalidate('key')
+            return {1: 'old'}
+
+        self.assertEqual(shared.get_many({'key': 1}, load, 60), {1: 'old'})
+        self.assertEqual(
+            shared.get_many({'key': 1}, lambda idents: {1: 'new'}, 60),
+            {1: 'new'},
+        )
+        self.assertEqual(
+            shared.get_many({'key': 1}, lambda idents: {}, 60), {1: 'new'}
+        )
+
+    def test_process_local_cache_not_used(self):
+        """Кеш в памяти процесса для общих данных не используется."""
+
+        with override_settings(SHARED_CACHE='default'):
+            shared.get_many({'key': 1}, lambda idents: {1: 'old'}, 60)
+            self.assertEqual(
+                shared.get_many({'key': 1}, lambda idents: {1: 'new'}, 60),
+                {1: 'new'},
+            )
+
+
+@override_settings(
+    RATELIMITS={'add_comment': {'user': '2/m'}, 'signup': {'ip': '1/h'}}
+)
+class RateLimitTestClass(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        _local.clear()
+        self.client.force_login(self.user)
+
+    def test_token_bucket_refills(self):
+        """Корзина отдаёт capacity токенов и пополняется со временем."""
+
+        bucket = TokenBucket(2, 60, updated=0)
+
+        self.assertEqual(bucket.take(0), 0)
+        self.assertEqual(bucket.take(0), 0)
+        self.assertEqual(bucket.take(0), 30)
+        self.assertEqual(bucket.take(30), 0)
+
+    def test_write_endpoint_returns_429(self):
+        """При превышении лимита запрос на запись получает 429
+        и заголовок Retry-After, а чтение не ограничивается.
+        """
+
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        statuses = [
+            self.client.post(url, {'text': 'Комментарий'}).status_code
+            for _ in range(3)
+        ]
+        response = self.client.post(url, {'text': 'Комментарий'})
+
+        self.assertEqual(statuses, [302, 302, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 30)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    @override_settings(PROFILING_ENABLED=True)
+    @mock.patch('core.ratelimit.metrics', Counter())
+    def test_metrics_on_profiler_page(self):
+        """Страница профайлера показывает сотрудникам, сколько запросов
+        процесс пропустил и отклонил по каждой области лимитов.
+        """
+
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        for _ in range(3):
+            self.client.post(url, {'text': 'Комментарий'})
+        self.client.force_login(
+            User.objects.create_user(username='Staff', is_staff=True)
+        )
+
+        response = self.client.get(reverse('core:profiler'))
+
+        self.assertEqual(
+            response.context['ratelimits'], [('add_comment', 2, 1)]
+        )
+        self.assertContains(response, '<td>add_comment</td>')
+
+    def test_signup_limited_by_ip(self):
+        """Регистрация ограничивается по IP-адресу."""
+
+        self.client.logout()
+        url = reverse('users:signup')
+        self.client.post(url, {})
+
+        self.assertEqual(self.client.post(url, {}).status_code, 429)
+
+
+@override_settings(
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+)
+class StaticFilesTestClass(TempDirsMixin, SimpleTestCase):
+    temp_dir_settings = ('STATIC_ROOT',)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.css_url = staticfiles_storage.url('css/bootstrap.min.css')
+
+    def request(self, path, **environ):
+        app = StaticFilesMiddleware(lambda environ, start_response: [])
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        environ.setdefault('REQUEST_METHOD', 'GET')
+        body = b''.join(app(dict(environ, PATH_INFO=path), start_response))
+
+        return response['status'], response['headers'], body
+
+    def test_collectstatic_creates_hashed_compressed_files(self):
+        """collectstatic создаёт файлы с хешем в имени и их gzip-копии."""
+
+        hashed = staticfiles_storage.path(
+            staticfiles_storage.stored_name('css/bootstrap.min.css')
+        )
+        self.assertRegex(self.css_url, r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+        with open(hashed, 'rb') as css, gzip.open(hashed + '.gz') as gz:
+            self.assertEqual(css.read(), gz.read())
+
+    def test_hashed_file_cached_forever_and_compressed(self):
+        """Файл с хешем отдаётся сжатым и с долгим кешированием,
+        повторный запрос с ETag получает 304.
+        """
+
+        status, headers, body = self.request(
+            self.css_url, HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+
+        self.assertEqual(status, '200 OK')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(body), int(headers['Content-Length']))
+
+        status, _, body = self.request(
+            self.css_url,
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=headers['ETag'],
+        )
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+
+    def test_range_request(self):
+        """Поддерживаются запросы части файла."""
+
+        status, headers, body = self.request(
+            self.css_url, HTTP_RANGE='bytes=0-9'
+        )
+
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(body, b'@charset "')
+        self.assertTrue(headers['Content-Range'].startswith('bytes 0-9/'))
+        self.assertNotIn('Content-Encoding', headers)
+
+        status, _, _ = self.request(self.css_url, HTTP_RANGE='bytes=9-1')
+        self.assertEqual(status, '416 Range Not Satisfiable')
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    EMAIL_QUEUE_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_QUEUE_MAX_ATTEMPTS=2,
+    BACKGROUND_TASKS_EAGER=True,
+)
+@mock.patch('core.mail._start_worker')
+class QueuedEmailTestClass(TempDirsMixin, TestCase):
+    temp_dir_settings = ('EMAIL_QUEUE_DIR',)
+
+    def setUp(self):
+        shutil.rmtree(settings.EMAIL_QUEUE_DIR, ignore_errors=True)
+        cache.clear()
+
+    def queued(self, *parts):
+        path = os.path.join(settings.EMAIL_QUEUE_DIR, *parts)
+        if not os.path.isdir(path):
+            return []
+        return [name for name in os.listdir(path) if name.endswith('.msg')]
+
+    def test_password_reset_does_not_send_in_request(self, _):
+        """Письмо сброса пароля ставится в очередь, а отправляется
+        обработчиком очереди, даже когда фоновые задачи выполняются сразу.
+        """
+
+        User.objects.create_user(
+            username='TestUser', email='u@example.com', password='pa55word'
+        )
+        self.client.post(
+            reverse('users:password_reset_form'),
+            {'email': 'u@example.com'},
+        )
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(self.queued()), 1)
+
+        self.assertEqual(send_queued(), 1)
+        self.assertEqual(mail.outbox[0].to, ['u@example.com'])
+        self.assertEqual(self.queued(), [])
+
+    def test_failed_message_retried_with_backoff(self, _):
+        """Неотправленное письмо откладывается, а после исчерпания
+        попыток переносится в failed/.
+        """
+
+        mail.send_mail('Тема', 'Текст', None, ['u@example.com'])
+        target = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+
+        with mock.patch(target, side_effect=OSError), self.assertLogs(
+            'core.mail', 'ERROR'
+        ):
+            self.assertEqual(send_queued(), 0)
+            self.assertEqual(len(self.queued()), 1)
+            self.assertEqual(send_queued(), 0)
+
+            with mock.patch('core.mail.time.time', return_value=2 ** 40):
+                self.assertEqual(send_queued(), 0)
+
+        self.assertEqual(self.queued(), [])
+        self.assertEqual(len(self.queued('failed')), 1)
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(
+    TRACING_ENABLED=True,
+    TRACING_SAMPLE_RATE=0,
+    TRACING_SLOW_REQUEST_MS=0,
+)
+class TracingTestClass(TempDirsMixin, TestCase):
+    temp_dir_settings = ('TRACING_DIR', 'MEDIA_ROOT')
+
+    def setUp(self):
+        shutil.rmtree(settings.TRACING_DIR, ignore_errors=True)
+        cache.clear()
+
+    def test_profile_trace(self):
+        """Трасса страницы профиля содержит спаны SQL-запросов, шаблонов
+        карточек и пагинатора и миниатюры.
+        """
+
+        user = User.objects.create_user(username='TestUser')
+        Post.objects.create(
+            author=user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+        self.client.get(reverse('posts:profile', args=(user.username,)))
+
+        trace, = load_traces()
+        self.assertEqual(trace['view'], 'posts:profile')
+        self.assertEqual(trace['status'], 200)
+        self.assertGreater(trace['summary']['sql']['count'], 0)
+        self.assertEqual(trace['summary']['thumbnail']['count'], 1)
+        templates = {
+            span['name'] for span in trace['spans']
+            if span['kind'] == 'template'
+        }
+        self.assertLessEqual(
+            {
+                'posts/profile.html',
+                'posts/includes/post_card.html',
+                'posts/includes/paginator.html',
+            },
+            templates,
+        )
+
+    def test_error_page_does_no_needless_work(self):
+        """Страница 404 для анонима не обращается к базе, а стоимость
+        каждого контекстного процессора видна отдельным спаном.
+        """
+
+        self.client.get('/nonexist-page/')
+
+        trace, = load_traces()
+        self.assertNotIn('sql', trace['summary'])
+        processors = {
+            span['name'] for span in trace['spans']
+            if span['kind'] == 'context_processor'
+        }
+        self.assertLessEqual(
+            set(settings.TEMPLATES[0]['OPTIONS']['context_processors']),
+            processors,
+        )
+
+    def test_lazy_processor_values_traced(self):
+        """Ленивые значения процессоров получают спаны при вычислении
+        в шаблоне, и запросы к базе за ними попадают внутрь этих спанов.
+        """
+
+        user = User.objects.create_user(username='TestUser')
+        self.client.force_login(user)
+        self.client.get(reverse('about:author'))
+
+        trace, = load_traces()
+        spans = {span['id']: span for span in trace['spans']}
+        lazy = {
+            span['name']: span for span in trace['spans']
+            if span.get('lazy')
+        }
+        self.assertIn(
+            'notifications.context_processors.unread_notifications'
+            ':unread_notifications',
+            lazy,
+        )
+        unread = lazy[
+            'notifications.context_processors.unread_notifications'
+            ':unread_notifications'
+        ]
+        self.assertTrue(any(
+            span['kind'] == 'sql' and spans[span['parent']] is unread
+            for span in trace['spans']
+        ))
+
+    @override_settings(TRACING_SLOW_REQUEST_MS=60 * 1000)
+    def test_fast_requests_not_sampled(self):
+        """Быстрые запросы при нулевой доле выборки не сохраняются."""
+
+        self.client.get(reverse('posts:index'))
+
+        self.assertEqual(load_traces(), [])
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilerTestClass(TempDirsMixin, TestCase):
+    temp_dir_settings = ('PROFILING_DIR',)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='Staff', is_staff=True)
+        cls.user = User.objects.create_user(username='TestUser')
+
+    def test_profiler_only_for_staff(self):
+        """Страница профайлера доступна только сотрудникам и только
+        при включённом профайлере.
+        """
+
+        url = reverse('core:profiler')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertEqual(
+                self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+            )
+
+    @override_settings(PROFILING_REQUEST_RATE=1, PROFILING_INTERVAL_MS=1)
+    @mock.patch('core.profiling._sampler', None)
+    def test_sampled_request_written(self):
+        """Выбранный запрос проходит через middleware, а стеки его потока
+        записываются в файл процесса requests-<pid>.folded.
+        """
+
+        def slow_render(*args, **kwargs):
+            time.sleep(0.05)
+            return mock.DEFAULT
+
+        path = profile_path(f'requests-{os.getpid()}.folded')
+        with mock.patch(
+            'posts.views.render', wraps=render, side_effect=slow_render
+        ):
+            response = self.client.get(
+                reverse('posts:profile', args=(self.user.username,))
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        deadline = time.monotonic() + 5
+        content = ''
+        while 'posts.views:profile' not in content:
+            self.assertLess(time.monotonic(), deadline, content)
+            time.sleep(0.01)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as file:
+                    content = file.read()
+        stack, count = content.splitlines()[0].rsplit(' ', 1)
+        self.assertIn('core.profiling:__call__', stack)
+        self.assertGreater(int(count), 0)
+
+    @mock.patch('core.views.capture')
+    def test_capture_and_download(self, capture):
+        """Профиль запускается на заданное время, а записанные стеки
+        скачиваются в формате collapsed stacks.
+        """
+
+        stacks = Counter()
+        done = threading.Event()
+        worker = threading.Thread(target=done.wait)
+        worker.start()
+        _sample(stacks)
+        done.set()
+        worker.join()
+        write_profile('test.folded', stacks)
+        self.client.force_login(self.staff)
+
+        self.client.post(reverse('core:profiler'), {'seconds': 5})
+        response = self.client.get(
+            reverse('core:profiler_file', args=('test.folded',))
+        )
+
+        capture.assert_called_once_with(5)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        line = b''.join(response.streaming_content).decode().splitlines()[0]
+        stack, count = line.rsplit(' ', 1)
+        self.assertIn(';', stack)
+        self.assertGreater(int(count), 0)
+        self.assertEqual(
+            self.client.get(
+                reverse('core:profiler_file', args=('..secret',))
+            ).status_code,
+            HTTPStatus.NOT_FOUND,
+        )
@@ -0,0 +1,280 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Template
+from django.utils.functional import LazyObject, SimpleLazyObject, empty
+from sorl.thumbnail.base import ThumbnailBackend
+
+from .tasks import defer
+
+TRACE_PREFIX = 'trace-'
+SQL_MAX_LENGTH = 500
+
+_current = contextvars.ContextVar('yatube_trace', default=None)
+_counter = itertools.count()
+_install_lock = threading.Lock()
+_original_render = None
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class Trace:
+    """Трасса одного запроса: плоский список спанов, у каждого спана
+    есть ссылка на родителя, смещение от начала запроса и длительность
+    в миллисекундах.
+    """
+
+    def __init__(self, method, path):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.view = None
+        self.status = None
+        self.started = time.time()
+        self.duration = None
+        self.spans = []
+        self._start = time.perf_counter()
+        self._stack = []
+
+    @contextmanager
+    def span(self, kind, name, **attrs):
+        span = {
+            'id': len(self.spans),
+            'parent': self._stack[-1] if self._stack else None,
+            'kind': kind,
+            'name': name,
+            'start': _ms(time.perf_counter() - self._start),
+            **attrs,
+        }
+        self.spans.append(span)
+        self._stack.append(span['id'])
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span['duration'] = _ms(time.perf_counter() - start)
+            self._stack.pop()
+
+    def summary(self):
+        """Число спанов и суммарное время по видам: sql, template и т.д."""
+
+        summary = {}
+        for span in self.spans:
+            kind = summary.setdefault(
+                span['kind'], {'count': 0, 'duration': 0}
+            )
+            kind['count'] += 1
+            kind['duration'] = round(kind['duration'] + span['duration'], 3)
+
+        return summary
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'view': self.view,
+            'status': self.status,
+            'started': self.started,
+            'duration': self.duration,
+            'summary': self.summary(),
+            'spans': self.spans,
+        }
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """Спан текущей трассы; вне трассируемого запроса ничего не делает."""
+
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(kind, name, **attrs) as current:
+        yield current
+
+
+def _trace_sql(execute, sql, params, many, context):
+    with span('sql', sql[:SQL_MAX_LENGTH], many=many):
+        return execute(sql, params, many, context)
+
+
+def _traced_render(self, context):
+    with span('template', self.name or '<string>'):
+        return _original_render(self, context)
+
+
+def _traced_lazy(name, value):
+    """Ленивое значение, которое при первом обращении вычисляется
+    в спане своего контекстного процессора.
+    """
+
+    def setup():
+        with span('context_processor', name, lazy=True):
+            if value._wrapped is empty:
+                value._setup()
+            return value._wrapped
+
+    return SimpleLazyObject(setup)
+
+
+def _traced_processor(processor):
+    """Спан на вызов процессора. Ленивые значения, которые он вернул
+    (пользователь, число уведомлений, год), вычисляются позже, внутри
+    шаблона, поэтому получают свои спаны с именем процессора и ключа.
+    """
+
+    name = f'{processor.__module__}.{processor.__qualname__}'
+
+    @functools.wraps(processor)
+    def wrapper(request):
+        with span('context_processor', name):
+            context = processor(request)
+        if _current.get() is None:
+            return context
+        return {
+            key: _traced_lazy(f'{name}:{key}', value)
+            if isinstance(value, LazyObject) and value._wrapped is empty
+            else value
+            for key, value in context.items()
+        }
+
+    wrapper.traced = True
+    return wrapper
+
+
+def install():
+    """Подменяет Template._render, чтобы каждый шаблон, в том числе
+    подключённый через include, получал свой спан. Так же Django
+    инструментирует шаблоны в тестах. Каждый контекстный процессор
+    тоже получает свой спан.
+    """
+
+    global _original_render
+    with _install_lock:
+        if Template._render is not _traced_render:
+            _original_render = Template._render
+            Template._render = _traced_render
+        for engine in engines.all():
+            if not isinstance(engine, DjangoTemplates):
+                continue
+            processors = engine.engine.template_context_processors
+            engine.engine.template_context_processors = tuple(
+                processor if getattr(processor, 'traced', False)
+                else _traced_processor(processor)
+                for processor in processors
+            )
+
+
+class TracedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который отмечает получение и создание
+    миниатюр спаном thumbnail.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with span('thumbnail', str(file_), geometry=geometry_string):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def _write(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def export(trace):
+    """Записывает трассу в TRACING_DIR по кругу: каждый процесс держит
+    не больше TRACING_BUFFER_SIZE файлов и перезаписывает самые старые.
+    Запись идёт в фоне.
+    """
+
+    slot = next(_counter) % settings.TRACING_BUFFER_SIZE
+    path = os.path.join(
+        settings.TRACING_DIR, f'{TRACE_PREFIX}{os.getpid()}-{slot:04d}.json'
+    )
+    defer(_write, path, trace.as_dict())
+
+
+def load_traces():
+    """Сохранённые трассы, самые новые первыми."""
+
+    try:
+        names = os.listdir(settings.TRACING_DIR)
+    except FileNotFoundError:
+        return []
+    traces = []
+    for name in names:
+        if not name.startswith(TRACE_PREFIX):
+            continue
+        with open(os.path.join(settings.TRACING_DIR, name),
+                  encoding='utf-8') as file:
+            traces.append(json.load(file))
+
+    return sorted(traces, key=lambda trace: trace['started'], reverse=True)
+
+
+def is_sampled(trace):
+    """Сохраняются все медленные запросы и случайная доля остальных."""
+
+    return (
+        trace.duration >= settings.TRACING_SLOW_REQUEST_MS
+        or random.random() < settings.TRACING_SAMPLE_RATE
+    )
+
+
+class TracingMiddleware:
+    """Трассирует запрос: корневой спан view на весь запрос, спаны для
+    каждого SQL-запроса, шаблона, контекстного процессора и миниатюры.
+    Медленные запросы и случайная выборка остальных сохраняются
+    в JSON-файлы, смотреть их можно командой show_traces. Не подключается,
+    если TRACING_ENABLED выключен.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = Trace(request.method, request.path)
+        token = _current.set(trace)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_trace_sql)
+                    )
+                with trace.span('view', request.path) as root:
+                    response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        match = request.resolver_match
+        if match is not None:
+            trace.view = root['name'] = match.view_name
+        trace.status = response.status_code
+        trace.duration = root['duration']
+        if is_sampled(trace):
+            export(trace)
+
+        return response
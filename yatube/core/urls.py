@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', views.profiler, name='profiler'),
+    path('<str:name>/', views.profiler_file, name='profiler_file'),
+]
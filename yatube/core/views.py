@@ -1,33 +1,126 @@
 from http import HTTPStatus
 
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from .forms import CaptureForm
+from .prerender import anonymous_request
+from .profiling import capture, list_profiles, profile_path
+from .ratelimit import stats
+
+ERROR_PAGE_KEY = 'error_page:{}'
+ERROR_PAGE_CACHE_TIME_SEC = 60 * 60
+PATH_PLACEHOLDER = '\x00path\x00'
+
+
+def error_body(template):
+    """Страница ошибки, отрисованная один раз для анонимного посетителя
+    и закешированная. Вместо адреса в ней стоит PATH_PLACEHOLDER.
+    """
+
+    key = ERROR_PAGE_KEY.format(template)
+    body = cache.get(key)
+    if body is None:
+        body = render_to_string(
+            template, {'path': PATH_PLACEHOLDER}, anonymous_request('/')
+        )
+        cache.set(key, body, ERROR_PAGE_CACHE_TIME_SEC)
+
+    return body
+
+
+def error_response(request, template, status, always_cached=False):
+    """Ответ со страницей ошибки из кеша. Посетителю с сессией страница
+    рисуется заново, чтобы шапка показывала его меню, кроме случая
+    always_cached.
+    """
+
+    if not always_cached and settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return render(
+            request, template, {'path': request.path}, status=status
+        )
+    body = error_body(template).replace(
+        PATH_PLACEHOLDER, escape(request.path)
+    )
+
+    return HttpResponse(body, status=status)
 
 
 def page_not_found(request, exception):
     """Функция обработки ошибки 404."""
 
-    template = 'core/404.html'
-    context = {'path': request.path}
-
-    return render(request, template, context, status=HTTPStatus.NOT_FOUND)
+    return error_response(request, 'core/404.html', HTTPStatus.NOT_FOUND)
 
 
 def csrf_failure(request, reason=''):
     """Функция обработки ошибки 403csrf."""
 
-    template = 'core/403csrf.html'
-    return render(request, template)
+    return error_response(request, 'core/403csrf.html', HTTPStatus.FORBIDDEN)
 
 
 def server_error(request):
-    """Функция обработки ошибки 500."""
+    """Функция обработки ошибки 500. Страница всегда берётся из кеша:
+    при сбое отрисовка с базой и сессией может упасть ещё раз.
+    """
 
-    template = 'core/500.html'
-    return render(request, template, HTTPStatus.INTERNAL_SERVER_ERROR)
+    return error_response(
+        request,
+        'core/500.html',
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+        always_cached=True,
+    )
 
 
 def permission_denied(request, exception):
     """Функция обработки ошибки 403."""
 
-    template = 'core/403.html'
-    return render(request, template, HTTPStatus.FORBIDDEN)
+    return error_response(request, 'core/403.html', HTTPStatus.FORBIDDEN)
+
+
+@staff_member_required
+def profiler(request):
+    """Страница профайлера для сотрудников: список профилей процесса,
+    обслужившего запрос, счётчики его лимитов запросов и запуск
+    профилирования всех его потоков.
+    """
+
+    if not settings.PROFILING_ENABLED:
+        raise Http404
+    template = 'core/profiler.html'
+    form = CaptureForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        capture(form.cleaned_data['seconds'])
+        return redirect('core:profiler')
+
+    context = {
+        'form': form,
+        'profiles': list_profiles(),
+        'ratelimits': stats(),
+    }
+
+    return render(request, template, context)
+
+
+@staff_member_required
+def profiler_file(request, name):
+    """Файл профиля в формате collapsed stacks."""
+
+    if not settings.PROFILING_ENABLED:
+        raise Http404
+    try:
+        path = profile_path(name)
+        file = open(path, 'rb')
+    except (ValueError, FileNotFoundError):
+        raise Http404
+
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename=name,
+        content_type='text/plain; charset=utf-8',
+    )
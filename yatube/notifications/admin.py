@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'recipient', 'kind', 'actor', 'created', 'is_read')
+    list_filter = ('kind', 'is_read')
+    list_select_related = ('recipient', 'actor')
+    raw_id_fields = ('recipient', 'actor', 'post')
+    empty_value_display = '-пусто-'
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class NotificationsConfig(AppConfig):
+    """Настройки приложения Notifications"""
+
+    name = 'notifications'
+    verbose_name = 'Уведомления'
+
+    def ready(self):
+        from . import signals  # noqa: F401
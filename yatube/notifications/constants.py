@@ -0,0 +1,4 @@
+DELIVERY_BATCH_SIZE = 1000
+UNREAD_CACHE_TIME_SEC = 60 * 60
+DIGEST_BATCH_SIZE = 500
+DIGEST_MAX_POSTS = 10
@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from .delivery import unread_count
+
+
+def unread_notifications(request):
+    """Число непрочитанных уведомлений для шапки сайта. Считается
+    лениво и берётся из кеша, поэтому шаблон без шапки ничего не платит.
+    """
+
+    def count():
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return 0
+        return unread_count(user)
+
+    return {
+        'unread_notifications': SimpleLazyObject(count),
+    }
@@ -0,0 +1,93 @@
+from core import cache
+from posts.models import Follow, Post
+from .constants import DELIVERY_BATCH_SIZE, UNREAD_CACHE_TIME_SEC
+from .models import Notification
+
+UNREAD_KEY = 'notifications:unread:{}'
+
+
+def unread_count(user):
+    """Число непрочитанных уведомлений из общего кеша; при промахе —
+    один запрос.
+    """
+
+    def load(user_ids):
+        return {user.pk: Notification.objects.filter(
+            recipient=user, is_read=False
+        ).count()}
+
+    return cache.get_many(
+        {UNREAD_KEY.format(user.pk): user.pk}, load, UNREAD_CACHE_TIME_SEC
+    )[user.pk]
+
+
+def mark_read(user, notification_ids):
+    """Отмечает прочитанными только указанные уведомления пользователя:
+    более старые страницы и пришедшие после показа остаются новыми.
+    """
+
+    if Notification.objects.filter(
+        recipient=user, pk__in=notification_ids, is_read=False
+    ).update(is_read=True):
+        cache.invalidate(UNREAD_KEY.format(user.pk))
+
+
+def _create(notifications):
+    Notification.objects.bulk_create(notifications)
+    cache.invalidate(*{
+        UNREAD_KEY.format(notification.recipient_id)
+        for notification in notifications
+    })
+
+
+def deliver_post(post_id, batch_size=DELIVERY_BATCH_SIZE):
+    """Рассылает уведомление о новом посте подписчикам автора.
+    Подписчики выбираются пачками по id подписки, на пачку — одна
+    вставка и один сброс счётчиков в кеше.
+    """
+
+    post = Post.objects.visible().filter(pk=post_id).only('author').first()
+    if post is None:
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    last_id = 0
+    while True:
+        rows = list(
+            followers.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list('pk', 'user_id')[:batch_size]
+        )
+        if not rows:
+            return
+        _create([
+            Notification(
+                recipient_id=user_id,
+                actor_id=post.author_id,
+                post_id=post_id,
+                kind=Notification.POST,
+            )
+            for _, user_id in rows
+        ])
+        last_id = rows[-1][0]
+
+
+def deliver_comments(comments):
+    """Уведомляет авторов постов о комментариях; comments — пары
+    (post_id, author_id). Комментарии к своим постам пропускаются.
+    """
+
+    post_authors = dict(
+        Post.objects.filter(
+            pk__in={post_id for post_id, _ in comments}
+        ).values_list('pk', 'author_id')
+    )
+    _create([
+        Notification(
+            recipient_id=post_authors[post_id],
+            actor_id=author_id,
+            post_id=post_id,
+            kind=Notification.COMMENT,
+        )
+        for post_id, author_id in comments
+        if post_authors.get(post_id, author_id) != author_id
+    ])
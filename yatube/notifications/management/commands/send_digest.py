@@ -0,0 +1,27 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications.constants import DIGEST_BATCH_SIZE
+from notifications.digest import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Рассылает подписчикам дайджест новых постов за период.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Включать посты, опубликованные за это число часов.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DIGEST_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - dt.timedelta(hours=options['hours'])
+        count = send_digests(since, options['batch_size'])
+        self.stdout.write(f'Отправлено дайджестов: {count}')
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.tasks import defer
+from posts.models import Comment, Post
+from posts.signals import comments_flushed, post_published
+from .delivery import deliver_comments, deliver_post
+
+
+@receiver(post_save, sender=Post)
+def notify_followers(sender, instance, created, **kwargs):
+    if created and not instance.is_hidden and instance.is_published:
+        defer(deliver_post, instance.pk)
+
+
+@receiver(post_published)
+def notify_followers_on_publish(sender, post_ids, **kwargs):
+    for post_id in post_ids:
+        deliver_post(post_id)
+
+
+@receiver(post_save, sender=Comment)
+def notify_post_author(sender, instance, created, **kwargs):
+    if created:
+        defer(deliver_comments, [(instance.post_id, instance.author_id)])
+
+
+@receiver(comments_flushed)
+def notify_post_authors(sender, comments, **kwargs):
+    deliver_comments(
+        [(comment.post_id, comment.author_id) for comment in comments]
+    )
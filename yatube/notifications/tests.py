@@ -0,0 +1,259 @@
+import datetime as dt
+import os
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import SharedCacheMixin, TempDirsMixin
+from posts import comment_queue
+from posts.constants import NUMBER_OF_POSTS_ON_PAGE
+from posts.models import Comment, Follow, Post
+from .delivery import deliver_post
+from .digest import send_digests
+from .models import Notification
+
+User = get_user_model()
+
+
+class NotificationTests(SharedCacheMixin, TempDirsMixin, TestCase):
+    """Проверка уведомлений о новых постах и комментариях."""
+
+    temp_dir_settings = ('COMMENTS_QUEUE_DIR',)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.followers = [
+            User.objects.create_user(username=f'Follower{i}')
+            for i in range(3)
+        ]
+        Follow.objects.bulk_create([
+            Follow(user=follower, author=cls.author)
+            for follower in cls.followers
+        ])
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.followers[0])
+
+    def test_followers_notified_in_batches(self):
+        """Новый пост приходит всем подписчикам, по одной вставке
+        на пачку подписчиков.
+        """
+
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(post.notifications.count(), len(self.followers))
+        post.notifications.all().delete()
+
+        with mock.patch.object(
+            Notification.objects,
+            'bulk_create',
+            wraps=Notification.objects.bulk_create,
+        ) as bulk_create:
+            deliver_post(post.pk, batch_size=2)
+
+        self.assertEqual(bulk_create.call_count, 2)
+        self.assertEqual(
+            set(Notification.objects.filter(
+                post=post, kind=Notification.POST
+            ).values_list('recipient', flat=True)),
+            {follower.pk for follower in self.followers},
+        )
+
+    def test_comment_notifies_post_author(self):
+        """Комментарий уведомляет автора поста, но не его самого."""
+
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.author, text='Я')
+        Comment.objects.create(
+            post=post, author=self.followers[0], text='Ответ'
+        )
+
+        self.assertEqual(
+            list(Notification.objects.filter(
+                recipient=self.author
+            ).values_list('kind', 'actor')),
+            [(Notification.COMMENT, self.followers[0].pk)],
+        )
+
+    @mock.patch.object(comment_queue, '_start_flusher')
+    def test_flushed_comments_notify(self, _):
+        """Комментарии из журнала тоже приходят автору поста."""
+
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment_queue.enqueue(post.pk, self.followers[1], 'Из журнала')
+        comment_queue.flush()
+
+        self.assertTrue(Notification.objects.filter(
+            recipient=self.author, kind=Notification.COMMENT
+        ).exists())
+
+    def test_unread_badge_cached_and_reset_by_inbox(self):
+        """Счётчик в шапке берётся из кеша, а просмотр страницы
+        уведомлений отмечает их прочитанными.
+        """
+
+        url = reverse('about:author')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Пост')
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['unread_notifications'], 1)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        response = self.client.get(reverse('notifications:inbox'))
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertFalse(response.context['page_obj'][0].is_read)
+        self.assertEqual(
+            self.client.get(url).context['unread_notifications'], 0
+        )
+        self.assertFalse(
+            Notification.objects.filter(
+                recipient=self.followers[0], is_read=False
+            ).exists()
+        )
+
+    def test_unread_badge_shared_between_processes(self):
+        """Уведомление, созданное и прочитанное в другом процессе, сразу
+        меняет счётчик в шапке этого процесса.
+        """
+
+        def badge():
+            return self.client.get(
+                reverse('about:author')
+            ).context['unread_notifications']
+
+        self.assertEqual(badge(), 0)
+        with self.other_process():
+            Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(badge(), 1)
+
+        with self.other_process():
+            self.client.get(reverse('notifications:inbox'))
+        self.assertEqual(badge(), 0)
+
+    def test_inbox_marks_only_shown_page_read(self):
+        """Страница уведомлений отмечает прочитанными только показанные
+        уведомления, следующая страница остаётся новой.
+        """
+
+        post = Post.objects.create(author=self.author, text='Пост')
+        Notification.objects.filter(recipient=self.followers[0]).delete()
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=self.followers[0],
+                actor=self.author,
+                post=post,
+                kind=Notification.COMMENT,
+            )
+            for _ in range(NUMBER_OF_POSTS_ON_PAGE + 3)
+        ])
+        unread = Notification.objects.filter(
+            recipient=self.followers[0], is_read=False
+        )
+
+        page = self.client.get(reverse('notifications:inbox')).context[
+            'page_obj'
+        ]
+        self.assertEqual(
+            set(unread.values_list('pk', flat=True)),
+            set(Notification.objects.filter(
+                recipient=self.followers[0]
+            ).exclude(pk__in=[n.pk for n in page]).values_list(
+                'pk', flat=True
+            )),
+        )
+        self.assertEqual(unread.count(), 3)
+        self.assertEqual(
+            self.client.get(
+                reverse('about:author')
+            ).context['unread_notifications'],
+            3,
+        )
+
+        self.client.get(reverse('notifications:inbox') + '?page=2')
+        self.assertFalse(unread.exists())
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    EMAIL_QUEUE_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class DigestTests(TempDirsMixin, TestCase):
+    """Проверка дайджеста новых постов для подписчиков."""
+
+    temp_dir_settings = ('EMAIL_QUEUE_DIR',)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(username=f'Author{i}') for i in range(2)
+        ]
+        cls.readers = [
+            User.objects.create_user(
+                username=f'Reader{i}', email=f'reader{i}@example.com'
+            )
+            for i in range(3)
+        ]
+        User.objects.create_user(username='NoEmail')
+        Follow.objects.bulk_create([
+            Follow(user=cls.readers[0], author=cls.authors[0]),
+            Follow(user=cls.readers[0], author=cls.authors[1]),
+            Follow(user=cls.readers[1], author=cls.authors[1]),
+            Follow(user=cls.readers[2], author=cls.authors[0]),
+            Follow(
+                user=User.objects.get(username='NoEmail'),
+                author=cls.authors[0],
+            ),
+        ])
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+
+    def test_digest_per_reader(self):
+        """Каждый подписчик с почтой получает одно письмо с постами
+        своих авторов, на пачку пользователей — два запроса.
+        """
+
+        since = timezone.now() - dt.timedelta(days=1)
+        with self.assertNumQueries(4):
+            sent = send_digests(since, batch_size=2)
+
+        self.assertEqual(sent, 3)
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertIn('Пост Author0', bodies['reader0@example.com'])
+        self.assertIn('Пост Author1', bodies['reader0@example.com'])
+        self.assertNotIn('Пост Author0', bodies['reader1@example.com'])
+        self.assertIn('/posts/', bodies['reader2@example.com'])
+
+    def test_no_new_posts(self):
+        """Без новых постов дайджесты не отправляются."""
+
+        self.assertEqual(send_digests(timezone.now()), 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_command_delivers_digests(self):
+        """Команда отправляет дайджесты сама, а не оставляет их
+        в очереди исходящей почты.
+        """
+
+        out = StringIO()
+        with mock.patch('core.mail._start_worker') as start_worker:
+            call_command('send_digest', stdout=out)
+
+        self.assertIn('Отправлено дайджестов: 3', out.getvalue())
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f'reader{i}@example.com' for i in range(3)],
+        )
+        self.assertEqual(os.listdir(settings.EMAIL_QUEUE_DIR), [])
+        start_worker.assert_not_called()
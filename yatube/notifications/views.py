@@ -0,0 +1,28 @@
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from posts.utils import get_page
+from .delivery import mark_read
+
+
+@login_required
+def inbox(request):
+    """Страница уведомлений. Показанные уведомления отмечаются
+    прочитанными, новые при этом остаются выделенными.
+    """
+
+    template = 'notifications/inbox.html'
+    notifications = request.user.notifications.select_related(
+        'actor', 'post'
+    )
+    page_obj = get_page(request, notifications)
+    page_obj.object_list = list(page_obj.object_list)
+    mark_read(
+        request.user,
+        [notification.pk for notification in page_obj.object_list],
+    )
+    context = {
+        'page_obj': page_obj,
+    }
+
+    return render(request, template, context)
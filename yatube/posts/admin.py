@@ -1,43 +1,260 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.forms.models import ModelChoiceIterator
+from django.utils.html import format_html
 
-from .models import Group, Post, Follow, Comment
+from core.paginator import EstimatedCountPaginator
+from core.tasks import defer
+from .models import (
+    ArchivedPost, ArchivedPostRevision, Comment, Follow, Group, Post,
+    PostRevision, PostSignature,
+)
+from .moderation import (
+    delete_comments, delete_posts, move_posts, set_hidden,
+)
+
+
+class SharedChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        choices = self.field.shared_choices
+        if not choices:
+            choices.extend(super().__iter__())
+        return iter(choices)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class SharedChoicesField(forms.ModelChoiceField):
+    """Поле выбора, которое читает варианты из базы один раз для всех
+    своих копий: в list_editable каждая строка получает копию поля.
+    """
+
+    iterator = SharedChoiceIterator
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shared_choices = []
+
+
+class ModerationActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+        help_text='Для переноса постов; пусто — убрать из групп',
+    )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Общие настройки списков для больших таблиц: связанные объекты
+    выбираются одним запросом, общее число строк оценивается,
+    а не считается, и фильтры не грузят списки всех пользователей.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class HideableAdmin(LargeTableAdmin):
+    """Действия мягкого удаления: скрыть и снова показать записи."""
+
+    def hide(self, request, queryset):
+        defer(set_hidden, queryset, True)
+        self.message_user(request, 'Скрытие запущено в фоне.')
+
+    hide.short_description = 'Скрыть выбранные записи'
+
+    def unhide(self, request, queryset):
+        defer(set_hidden, queryset, False)
+        self.message_user(request, 'Восстановление запущено в фоне.')
+
+    unhide.short_description = 'Снова показать выбранные записи'
+
+
+class PostRevisionInline(admin.TabularInline):
+    """История правок поста, только для чтения."""
+
+    model = PostRevision
+    fields = ('version', 'created', 'diff',)
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(HideableAdmin):
     """Класс для настройки отображения данных о постах
     в интерфейсе администратора.
+    Поиск по «#число» ищет пост по id, по «@имя» — посты автора,
+    оба варианта используют индексы. Остальное, в том числе просто
+    число, ищется в тексте.
     """
 
-    list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
+    list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'is_hidden',)
+    readonly_fields = ('version', 'updated_at',)
+    inlines = (PostRevisionInline,)
+    list_select_related = ('author', 'group',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', 'is_hidden',)
     list_editable = ('group',)
-    empty_value_display = '-пусто-'
+    autocomplete_fields = ('author',)
+    action_form = ModerationActionForm
+    actions = ('hide', 'unhide', 'delete_in_batches', 'move_to_group',)
+
+    def delete_in_batches(self, request, queryset):
+        defer(delete_posts, queryset)
+        self.message_user(request, 'Удаление постов запущено в фоне.')
+
+    delete_in_batches.short_description = (
+        'Удалить выбранные посты пачками в фоне'
+    )
+
+    def move_to_group(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            self.message_user(
+                request, 'Выберите существующую группу.', messages.ERROR
+            )
+            return
+        group = form.cleaned_data['group']
+        defer(move_posts, queryset, group)
+        self.message_user(
+            request,
+            f'Перенос постов в группу «{group or "-пусто-"}» запущен в фоне.',
+        )
+
+    move_to_group.short_description = (
+        'Перенести выбранные посты в группу пачками в фоне'
+    )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['form_class'] = SharedChoicesField
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.startswith('#') and search_term[1:].isdigit():
+            return queryset.filter(pk=int(search_term[1:])), False
+        if search_term.startswith('@'):
+            return queryset.filter(author__username=search_term[1:]), False
+
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     """Класс для настройки отображения данных о подписках
     в интерфейсе администратора.
     """
 
     list_display = ('pk', 'author', 'user',)
-    search_fields = ('author', 'user',)
-    list_filter = ('author', 'user',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('author', 'user',)
+    search_fields = ('=author__username', '=user__username',)
+    autocomplete_fields = ('author', 'user',)
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
-    """Класс для настройки отображения данных о подписках
+class CommentAdmin(HideableAdmin):
+    """Класс для настройки отображения данных о комментариях
     в интерфейсе администратора.
     """
 
-    list_display = ('pk', 'post', 'author', 'text', 'pub_date',)
-    search_fields = ('text', 'author', 'post',)
-    list_filter = ('author',)
-    empty_value_display = '-пусто-'
+    list_display = ('pk', 'post', 'author', 'text', 'pub_date', 'is_hidden',)
+    list_select_related = ('post', 'author',)
+    search_fields = ('text', '=author__username',)
+    list_filter = ('pub_date', 'is_hidden',)
+    autocomplete_fields = ('post', 'author',)
+    actions = ('hide', 'unhide', 'delete_in_batches',)
+
+    def delete_in_batches(self, request, queryset):
+        defer(delete_comments, queryset)
+        self.message_user(request, 'Удаление комментариев запущено в фоне.')
+
+    delete_in_batches.short_description = (
+        'Удалить выбранные комментарии пачками в фоне'
+    )
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    """Класс для настройки отображения данных о сообществах
+    в интерфейсе администратора.
+    """
+
+    list_display = ('pk', 'title', 'slug',)
+    search_fields = ('title', 'slug',)
+    prepopulated_fields = {'slug': ('title',)}
+
+
+@admin.register(ArchivedPost)
+class ArchivedPostAdmin(LargeTableAdmin):
+    """Класс для просмотра архивных постов в интерфейсе администратора."""
+
+    list_display = ('pk', 'text', 'pub_date', 'author_id', 'archived_at',)
+    search_fields = ('text',)
+    list_filter = ('pub_date',)
+
+
+@admin.register(ArchivedPostRevision)
+class ArchivedPostRevisionAdmin(LargeTableAdmin):
+    """История правок архивных постов, только для просмотра."""
+
+    list_display = ('post_id', 'version', 'created',)
+    search_fields = ('=post_id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PostSignature)
+class DuplicateClusterAdmin(LargeTableAdmin):
+    """Кластеры почти одинаковых постов: посты одного кластера идут
+    подряд, ссылка на кластер показывает только его посты. Выбранные
+    посты можно скрыть одним действием.
+    """
+
+    list_display = ('cluster_link', 'post', 'author', 'text',)
+    list_select_related = ('post__author',)
+    ordering = ('cluster', 'post',)
+    actions = ('hide_posts',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(cluster__isnull=False)
+
+    def has_add_permission(self, request):
+        return False
+
+    def cluster_link(self, obj):
+        return format_html('<a href="?cluster={0}">{0}</a>', obj.cluster)
+
+    cluster_link.short_description = 'Кластер'
+
+    def author(self, obj):
+        return obj.post.author
+
+    author.short_description = 'Автор'
+
+    def text(self, obj):
+        return obj.post.text
+
+    text.short_description = 'Текст'
 
+    def hide_posts(self, request, queryset):
+        posts = Post.objects.filter(
+            pk__in=list(queryset.values_list('post_id', flat=True))
+        )
+        defer(set_hidden, posts, True)
+        self.message_user(request, 'Скрытие постов запущено в фоне.')
 
-admin.site.register(Group)
+    hide_posts.short_description = 'Скрыть выбранные посты'
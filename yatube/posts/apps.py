@@ -6,3 +6,6 @@ class PostsConfig(AppConfig):
 
     name = 'posts'
     verbose_name = 'Управление постами блога'
+
+    def ready(self):
+        from . import signals  # noqa: F401
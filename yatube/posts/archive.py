@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from . import prerender
+from .cache import drop_heads
+from .constants import MODERATION_BATCH_SIZE
+from .models import (
+    ArchivedComment, ArchivedPost, ArchivedPostRevision, Comment, Group,
+    LikeCounter, Post, PostRevision, User,
+)
+from .moderation import delete_cascade, iter_id_batches
+
+POST_FIELDS = (
+    'id', 'author_id', 'group_id', 'text', 'pub_date', 'image', 'is_hidden',
+)
+COMMENT_FIELDS = (
+    'id', 'post_id', 'author_id', 'text', 'pub_date', 'is_hidden', 'path',
+)
+REVISION_FIELDS = ('id', 'post_id', 'version', 'created', 'diff')
+
+
+def archive_posts(cutoff, batch_size=MODERATION_BATCH_SIZE):
+    """Переносит посты старше cutoff вместе с комментариями и историей
+    правок в архив, от отметок «нравится» остаётся их число. Сначала
+    пачка копируется в архив, затем удаляется из рабочих таблиц,
+    поэтому прерванный перенос можно безопасно запустить повторно.
+    Сами отметки и уведомления о постах удаляются.
+    """
+
+    archive_db = settings.POSTS_ARCHIVE_DATABASE
+    archived = 0
+    queryset = Post.objects.filter(pub_date__lt=cutoff)
+    for ids in iter_id_batches(queryset, batch_size):
+        posts = list(Post.objects.filter(pk__in=ids).values(*POST_FIELDS))
+        like_counts = dict(
+            LikeCounter.objects.filter(post_id__in=ids)
+            .values_list('post_id')
+            .annotate(total=Sum('count'))
+            .order_by()
+        )
+        comments = Comment.objects.filter(post_id__in=ids).values(
+            *COMMENT_FIELDS
+        )
+        revisions = PostRevision.objects.filter(post_id__in=ids).values(
+            *REVISION_FIELDS
+        )
+        with transaction.atomic(using=archive_db):
+            ArchivedPost.objects.bulk_create(
+                [
+                    ArchivedPost(
+                        **post, like_count=like_counts.get(post['id'], 0)
+                    )
+                    for post in posts
+                ],
+                ignore_conflicts=True,
+            )
+            ArchivedComment.objects.bulk_create(
+                [ArchivedComment(**comment) for comment in comments],
+                ignore_conflicts=True,
+            )
+            ArchivedPostRevision.objects.bulk_create(
+                [ArchivedPostRevision(**revision) for revision in revisions],
+                ignore_conflicts=True,
+            )
+        with transaction.atomic():
+            archived += delete_cascade(Post, ids)
+        group_ids = {post['group_id'] for post in posts}
+        author_ids = {post['author_id'] for post in posts}
+        drop_heads(group_ids, author_ids)
+        prerender.refresh(
+            post_ids=ids, author_ids=author_ids, group_ids=group_ids
+        )
+
+    return archived
+
+
+def attach_related(posts, author=None):
+    """Подставляет архивным постам и комментариям авторов и группы,
+    загруженных одним запросом на модель вместо запроса на объект.
+    """
+
+    if author is None:
+        users = User.objects.in_bulk({post.author_id for post in posts})
+    else:
+        users = {author.pk: author}
+    group_ids = {getattr(post, 'group_id', None) for post in posts}
+    groups = Group.objects.in_bulk(group_ids - {None})
+    for post in posts:
+        post._author = users.get(post.author_id)
+        if getattr(post, 'group_id', None) is not None:
+            post._group = groups.get(post.group_id)
+
+    return posts
+
+
+def get_archived_post(post_id):
+    """Архивный пост и его комментарии или (None, None)."""
+
+    post = ArchivedPost.objects.filter(pk=post_id, is_hidden=False).first()
+    if post is None:
+        return None, None
+    attach_related([post])
+    comments = attach_related(
+        list(ArchivedComment.objects.filter(post_id=post_id, is_hidden=False))
+    )
+
+    return post, comments
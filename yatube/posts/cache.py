@@ -0,0 +1,188 @@
+from urllib.parse import quote
+
+from django.db.models import Count, Q
+from django.http import Http404
+
+from core import cache as shared
+
+from .constants import (
+    FEED_HEAD_CACHE_TIME_SEC, FEED_HEAD_SIZE, MISSING_CACHE_TIME_SEC,
+)
+from .models import Group, Post, User
+
+HEAD_KEY = 'feed_head:{}'
+GROUP_LIST_KEY = 'group_list'
+SYNDICATION_KEY = 'syndication:{}:{}:{}'
+SYNDICATION_FORMATS = ('rss', 'atom', 'json')
+MISSING_KEY = 'missing:{}:{}'
+
+
+def _head_scopes(group_ids=(), author_ids=()):
+    scopes = ['index']
+    scopes += [f'group:{pk}' for pk in set(group_ids) if pk is not None]
+    scopes += [f'author:{pk}' for pk in set(author_ids) if pk is not None]
+
+    return scopes
+
+
+def get_head(scope, queryset):
+    """Голова ленты: id последних постов и их общее число.
+    Хранится в общем кеше, при промахе собирается одним запросом к базе.
+    """
+
+    def load(scopes):
+        ids = list(queryset.values_list('id', flat=True)[:FEED_HEAD_SIZE])
+        count = len(ids)
+        if count == FEED_HEAD_SIZE:
+            count = queryset.count()
+        return {scope: {'ids': ids, 'count': count}}
+
+    return shared.get_many(
+        {HEAD_KEY.format(scope): scope}, load, FEED_HEAD_CACHE_TIME_SEC
+    )[scope]
+
+
+def get_index_head():
+    return get_head('index', Post.objects.visible())
+
+
+def get_group_head(group):
+    return get_head(f'group:{group.pk}', group.posts.visible())
+
+
+def get_author_head(author):
+    return get_head(f'author:{author.pk}', author.posts.visible())
+
+
+def syndication_key(kind, ident, feed_format):
+    """Ключ готового тела ленты, например ('group', slug, 'atom')."""
+
+    return SYNDICATION_KEY.format(kind, quote(ident), feed_format)
+
+
+def drop_syndication(group_ids=(), author_ids=(), slugs=()):
+    """Сбрасывает во всех процессах готовые RSS/Atom/JSON-ленты: общую,
+    а также ленты указанных сообществ (по id или слагу) и авторов. Слаги
+    и имена выбираются одним запросом на модель.
+    """
+
+    idents = [('index', '')] + [('group', slug) for slug in slugs]
+    group_ids = set(group_ids) - {None}
+    author_ids = set(author_ids) - {None}
+    if group_ids:
+        idents += [
+            ('group', slug) for slug in Group.objects.filter(
+                pk__in=group_ids
+            ).values_list('slug', flat=True)
+        ]
+    if author_ids:
+        idents += [
+            ('author', username) for username in User.objects.filter(
+                pk__in=author_ids
+            ).values_list('username', flat=True)
+        ]
+    shared.invalidate(*[
+        syndication_key(kind, ident, feed_format)
+        for kind, ident in idents
+        for feed_format in SYNDICATION_FORMATS
+    ])
+
+
+def push_to_heads(post):
+    """Сбрасывает во всех процессах головы общей ленты, ленты сообщества
+    и ленты автора нового поста. Голову не дописывают на месте: без
+    атомарного обновления в кеше два одновременных поста затёрли бы
+    друг друга. Следующий читатель соберёт её одним запросом.
+    """
+
+    if post.is_hidden or not post.is_published:
+        return
+    keys = [
+        HEAD_KEY.format(scope)
+        for scope in _head_scopes([post.group_id], [post.author_id])
+    ]
+    if post.group_id is not None:
+        keys.append(GROUP_LIST_KEY)
+    shared.invalidate(*keys)
+    drop_syndication([post.group_id], [post.author_id])
+
+
+def drop_heads(group_ids=(), author_ids=()):
+    """Сбрасывает голову общей ленты, головы лент указанных сообществ
+    и авторов, список сообществ и готовые ленты для подписчиков.
+    """
+
+    shared.invalidate(*[
+        HEAD_KEY.format(scope)
+        for scope in _head_scopes(group_ids, author_ids)
+    ], GROUP_LIST_KEY)
+    drop_syndication(group_ids, author_ids)
+
+
+def get_group_list():
+    """Список сообществ с числом постов в каждом из общего кеша."""
+
+    def load(keys):
+        return {GROUP_LIST_KEY: list(
+            Group.objects.annotate(posts_count=Count(
+                'posts',
+                filter=Q(posts__is_hidden=False, posts__is_published=True),
+            ))
+            .order_by('title')
+        )}
+
+    return shared.get_many(
+        {GROUP_LIST_KEY: GROUP_LIST_KEY}, load, FEED_HEAD_CACHE_TIME_SEC
+    )[GROUP_LIST_KEY]
+
+
+def _missing_key(kind, ident):
+    return MISSING_KEY.format(kind, quote(str(ident)))
+
+
+def is_missing(kind, ident):
+    """Недавно запрошенный и не найденный объект: профиль, сообщество
+    или пост. Отметки лежат в общем кеше, поэтому повторные запросы
+    сканеров к любому процессу отвечают 404 без базы.
+    """
+
+    key = _missing_key(kind, ident)
+
+    return bool(shared.get_many({key: ident}, lambda idents: {}, 0))
+
+
+def remember_missing(kind, ident, exists):
+    """Отмечает объект отсутствующим, если exists() ложно, и возвращает
+    True; иначе — False. Поколение отметки читается до запроса к базе,
+    поэтому объект, созданный в это время в другом процессе, не
+    останется отмеченным.
+    """
+
+    def load(idents):
+        return {} if exists() else {ident: True}
+
+    key = _missing_key(kind, ident)
+
+    return bool(shared.get_many({key: ident}, load, MISSING_CACHE_TIME_SEC))
+
+
+def forget_missing(kind, *idents):
+    shared.invalidate(*[_missing_key(kind, ident) for ident in idents])
+
+
+def get_or_404(kind, queryset, **lookup):
+    """get_object_or_404 с отрицательным кешем по единственному полю
+    lookup. Отметку сбрасывают сигналы при создании объекта.
+    """
+
+    ident, = lookup.values()
+    found = []
+
+    def exists():
+        found.extend(queryset.filter(**lookup)[:1])
+        return bool(found)
+
+    if remember_missing(kind, ident, exists):
+        raise Http404
+
+    return found[0]
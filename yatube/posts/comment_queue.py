@@ -0,0 +1,223 @@
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.tasks import every
+from . import prerender
+from .constants import COMMENTS_FLUSH_BATCH_SIZE
+from .models import Comment, CommentQueueBatch, Post
+from .signals import comments_flushed
+
+# Временный путь строк пачки до записи настоящего; в путях только цифры
+# и точки, так что с ними он не совпадёт.
+QUEUE_PATH_PREFIX = 'queue:'
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _log_path(suffix=''):
+    return os.path.join(settings.COMMENTS_QUEUE_DIR, 'comments.log' + suffix)
+
+
+@contextmanager
+def _file_lock(suffix, blocking=True):
+    """Межпроцессная блокировка на отдельном lock-файле."""
+
+    os.makedirs(settings.COMMENTS_QUEUE_DIR, exist_ok=True)
+    with open(_log_path(suffix), 'a') as lock:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = every(settings.COMMENTS_FLUSH_INTERVAL_SEC, flush)
+
+
+def stop_flusher():
+    """Останавливает фоновый сброс журнала, если он запущен, и дожидается
+    конца текущего сброса.
+    """
+
+    global _flusher
+    with _flusher_lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stop()
+
+
+def enqueue(post_id, author, text, parent_id=None):
+    """Записывает проверенный комментарий в журнал на диске.
+    До записи в базу комментарий виден автору как ожидающий.
+    """
+
+    entry = {
+        'uid': uuid.uuid4().hex,
+        'post_id': post_id,
+        'author_id': author.pk,
+        'text': text,
+        'parent_id': parent_id,
+        'pub_date': timezone.now().isoformat(),
+    }
+    with _file_lock('.lock'):
+        with open(_log_path(), 'a', encoding='utf-8') as log:
+            log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            log.flush()
+            os.fsync(log.fileno())
+
+    if settings.BACKGROUND_TASKS_EAGER:
+        flush()
+    else:
+        _start_flusher()
+
+    return entry
+
+
+def _pending_entries():
+    """Записи журнала, ещё не записанные в базу, прямо из файлов: журнал
+    общий для всех процессов. Пачка в обработке пропускается, если она
+    уже записана (есть отметка CommentQueueBatch) или её файл удалён
+    после записи. Вызывать после чтения комментариев из базы: так
+    записанный между чтениями комментарий не покажется дважды.
+    """
+
+    with _file_lock('.lock'):
+        processing = _read_entries(_log_path('.processing'))
+        queued = _read_entries(_log_path())
+    if processing and (
+        CommentQueueBatch.objects.filter(uid=processing[0]['uid']).exists()
+        or not os.path.exists(_log_path('.processing'))
+    ):
+        processing = []
+
+    return processing + queued
+
+
+def pending_comments(post_id, user):
+    """Ещё не записанные в базу комментарии пользователя к посту."""
+
+    if not user.is_authenticated:
+        return []
+
+    return [
+        Comment(
+            post_id=post_id,
+            author=user,
+            text=entry['text'],
+            parent_id=entry.get('parent_id'),
+        )
+        for entry in _pending_entries()
+        if entry['post_id'] == post_id and entry['author_id'] == user.pk
+    ]
+
+
+def _read_entries(path):
+    try:
+        with open(path, encoding='utf-8') as log:
+            return [json.loads(line) for line in log if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _write(entries, batch_size):
+    """Записывает комментарии журнала одной транзакцией вместе с отметкой
+    о пачке (uid её первой записи). Пачку, отмеченную раньше, повторно
+    не вставляет.
+    """
+
+    batch = entries[0]['uid']
+    if CommentQueueBatch.objects.filter(uid=batch).exists():
+        return []
+    existing = set(
+        Post.objects.filter(
+            pk__in={entry['post_id'] for entry in entries}
+        ).values_list('pk', flat=True)
+    )
+    parents = set(
+        Comment.objects.filter(
+            pk__in={entry.get('parent_id') for entry in entries} - {None}
+        ).values_list('pk', flat=True)
+    )
+    entries = [entry for entry in entries if entry['post_id'] in existing]
+    # bulk_create на SQLite не возвращает id, поэтому строки пачки
+    # до записи путей помечены временным путём с номером записи.
+    marker = f'{QUEUE_PATH_PREFIX}{batch}:'
+    comments = [
+        Comment(
+            post_id=entry['post_id'],
+            author_id=entry['author_id'],
+            text=entry['text'],
+            parent_id=(
+                entry.get('parent_id')
+                if entry.get('parent_id') in parents else None
+            ),
+            path=f'{marker}{index}',
+        )
+        for index, entry in enumerate(entries)
+    ]
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        new_ids = dict(
+            Comment.objects.filter(path__startswith=marker).values_list(
+                'path', 'pk'
+            )
+        )
+        for comment, entry in zip(comments, entries):
+            comment.pk = new_ids[comment.path]
+            comment.path = ''
+            # bulk_create ставит pub_date по auto_now_add.
+            comment.pub_date = parse_datetime(entry['pub_date'])
+        Comment.objects.bulk_update(
+            comments, ['path', 'pub_date'], batch_size=batch_size
+        )
+        Comment.objects.fill_paths()
+        CommentQueueBatch.objects.create(uid=batch)
+
+    return comments
+
+
+def flush(batch_size=COMMENTS_FLUSH_BATCH_SIZE):
+    """Переносит накопленные комментарии из журнала в базу пачками
+    с датами из журнала. Возвращает число записанных комментариев.
+    """
+
+    processing = _log_path('.processing')
+    with _file_lock('.flush.lock', blocking=False) as acquired:
+        if not acquired:
+            return 0
+
+        with _file_lock('.lock'):
+            if not os.path.exists(processing):
+                if not os.path.exists(_log_path()):
+                    return 0
+                os.replace(_log_path(), processing)
+
+        entries = _read_entries(processing)
+        comments = _write(entries, batch_size) if entries else []
+        os.remove(processing)
+        if entries:
+            CommentQueueBatch.objects.filter(uid=entries[0]['uid']).delete()
+
+    comments_flushed.send(sender=Comment, comments=comments)
+    prerender.refresh(post_ids={comment.post_id for comment in comments})
+
+    return len(comments)
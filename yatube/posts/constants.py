@@ -2,3 +2,27 @@ NUMBER_OF_POSTS_ON_PAGE = 10
 MAX_LENGHT_OF_RETURN_TEXT = 15
 NUMBER_OF_TEST_POSTS = 13
 CASH_TIME_SEC = 20
+FEED_HEAD_SIZE = 100
+FEED_HEAD_CACHE_TIME_SEC = 60 * 60 * 24
+COMMENTS_FLUSH_BATCH_SIZE = 500
+MODERATION_BATCH_SIZE = 1000
+FEED_ITEMS_COUNT = 20
+FEED_CACHE_TIME_SEC = 60 * 60
+PUBLISH_BATCH_SIZE = 500
+MISSING_CACHE_TIME_SEC = 60 * 10
+GRAPH_CACHE_TIME_SEC = 60 * 60 * 24
+SUGGESTIONS_COUNT = 5
+SUGGESTIONS_FANOUT = 500
+RECOMMENDATIONS_COUNT = 10
+RECOMMENDATIONS_BATCH_SIZE = 500
+RECOMMENDATIONS_GROUP_WEIGHT = 0.5
+DUPLICATE_PERMUTATIONS = 64
+DUPLICATE_BANDS = 16
+DUPLICATE_SHINGLE_SIZE = 3
+DUPLICATE_MIN_WORDS = 8
+DUPLICATE_THRESHOLD = 0.8
+DUPLICATE_CACHE_TIME_SEC = 60 * 60 * 24
+COMMENTS_MAX_DEPTH = 8
+COMMENT_PATH_LENGTH = 100
+LIKE_COUNTER_SHARDS = 8
+LIKE_COUNT_CACHE_TIME_SEC = 60 * 60
@@ -0,0 +1,293 @@
+import hashlib
+import re
+import zlib
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from .constants import (
+    DUPLICATE_BANDS, DUPLICATE_CACHE_TIME_SEC, DUPLICATE_MIN_WORDS,
+    DUPLICATE_PERMUTATIONS, DUPLICATE_SHINGLE_SIZE, DUPLICATE_THRESHOLD,
+    MODERATION_BATCH_SIZE,
+)
+from .models import Post, PostSignature, SignatureBucket
+from .moderation import iter_id_batches
+
+BUCKET_KEY = 'duplicates:bucket:{}'
+SIGNATURE_KEY = 'duplicates:signature:{}'
+WORD_RE = re.compile(r'\w+')
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+BAND_ROWS = DUPLICATE_PERMUTATIONS // DUPLICATE_BANDS
+
+# Параметры хеш-функций (a * x + b) mod p. RandomState с фиксированным
+# зерном даёт одинаковые значения во всех процессах и версиях numpy.
+_random = np.random.RandomState(1)
+_A = _random.randint(
+    1, MERSENNE_PRIME, DUPLICATE_PERMUTATIONS, dtype=np.uint64
+)
+_B = _random.randint(
+    0, MERSENNE_PRIME, DUPLICATE_PERMUTATIONS, dtype=np.uint64
+)
+
+
+def shingles(text):
+    """Хеши шинглов текста: перекрывающихся троек слов в нижнем
+    регистре. Тексты короче DUPLICATE_MIN_WORDS слов не проверяются:
+    короткие посты вроде «Привет» законно повторяются.
+    """
+
+    words = WORD_RE.findall(text.lower())
+    if len(words) < DUPLICATE_MIN_WORDS:
+        return np.empty(0, dtype=np.uint64)
+    size = DUPLICATE_SHINGLE_SIZE
+
+    return np.unique(np.fromiter(
+        (
+            zlib.crc32(' '.join(words[start:start + size]).encode())
+            for start in range(len(words) - size + 1)
+        ),
+        dtype=np.uint64,
+    ))
+
+
+def signature(text):
+    """MinHash-подпись текста: DUPLICATE_PERMUTATIONS 32-битных
+    минимумов, доля совпадающих позиций двух подписей оценивает
+    сходство Жаккара их шинглов. Для коротких текстов — None.
+    """
+
+    hashes = shingles(text)
+    if not len(hashes):
+        return None
+    values = (np.outer(hashes, _A) + _B) % MERSENNE_PRIME
+
+    return (values.min(axis=0) & MAX_HASH).astype(np.uint32)
+
+
+def buckets(sig):
+    """Ключи корзин LSH: по одному на каждую из DUPLICATE_BANDS полос."""
+
+    keys = []
+    for band in range(DUPLICATE_BANDS):
+        rows = sig[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+        digest = hashlib.blake2b(
+            bytes([band]) + rows.tobytes(), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+
+    return keys
+
+
+def _bucket_members(bucket_keys):
+    """id постов из корзин: из кеша одним get_many, недостающие
+    корзины — одним запросом к базе.
+    """
+
+    keys = {BUCKET_KEY.format(bucket): bucket for bucket in bucket_keys}
+    found = cache.get_many(keys)
+    members = set()
+    for ids in found.values():
+        members.update(ids)
+    missing = [bucket for key, bucket in keys.items() if key not in found]
+    if missing:
+        loaded = {bucket: array('i') for bucket in missing}
+        rows = SignatureBucket.objects.filter(
+            bucket__in=missing
+        ).values_list('bucket', 'signature_id')
+        for bucket, post_id in rows:
+            loaded[bucket].append(post_id)
+        cache.set_many({
+            BUCKET_KEY.format(bucket): ids for bucket, ids in loaded.items()
+        }, DUPLICATE_CACHE_TIME_SEC)
+        for ids in loaded.values():
+            members.update(ids)
+
+    return members
+
+
+def _signatures(post_ids):
+    """Подписи постов {id: массив}: из кеша, недостающие — из базы."""
+
+    keys = {SIGNATURE_KEY.format(pk): pk for pk in post_ids}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [pk for pk in keys.values() if pk not in found]
+    if missing:
+        loaded = {
+            pk: bytes(value) for pk, value in PostSignature.objects.filter(
+                post_id__in=missing
+            ).values_list('post_id', 'signature')
+        }
+        cache.set_many({
+            SIGNATURE_KEY.format(pk): value for pk, value in loaded.items()
+        }, DUPLICATE_CACHE_TIME_SEC)
+        found.update(loaded)
+
+    return {
+        pk: np.frombuffer(value, dtype=np.uint32)
+        for pk, value in found.items()
+    }
+
+
+def similar(sig, exclude=None):
+    """Посты, подписи которых совпадают с sig не меньше чем на
+    DUPLICATE_THRESHOLD: {id: оценка сходства}.
+    """
+
+    candidates = _bucket_members(buckets(sig))
+    candidates.discard(exclude)
+    matches = {}
+    for pk, other in _signatures(candidates).items():
+        score = float(np.mean(other == sig))
+        if score >= DUPLICATE_THRESHOLD:
+            matches[pk] = score
+
+    return matches
+
+
+def find_duplicate(text, exclude=None):
+    """id существующего поста, почти совпадающего с текстом, или None.
+    Обычно обходится чтениями из кеша; база нужна только чтобы
+    убедиться, что найденные посты не удалены.
+    """
+
+    sig = signature(text)
+    if sig is None:
+        return None
+    matches = similar(sig, exclude)
+    if not matches:
+        return None
+    existing = Post.objects.filter(pk__in=matches).values_list(
+        'pk', flat=True
+    )
+
+    return max(existing, key=matches.get, default=None)
+
+
+def index_post(post_id):
+    """Пересчитывает подпись поста, его корзины и кластер."""
+
+    text = Post.objects.filter(pk=post_id).values_list(
+        'text', flat=True
+    ).first()
+    if text is None:
+        return
+    sig = signature(text)
+    stored = PostSignature.objects.filter(post_id=post_id).values_list(
+        'signature', flat=True
+    ).first()
+    if (None if sig is None else sig.tobytes()) == (
+        None if stored is None else bytes(stored)
+    ):
+        return
+
+    old_buckets = list(SignatureBucket.objects.filter(
+        signature_id=post_id
+    ).values_list('bucket', flat=True))
+    new_buckets = []
+    with transaction.atomic():
+        PostSignature.objects.filter(post_id=post_id).delete()
+        if sig is not None:
+            new_buckets = buckets(sig)
+            matches = similar(sig, exclude=post_id)
+            cluster = None
+            if matches:
+                clusters = PostSignature.objects.filter(
+                    post_id__in=matches, cluster__isnull=False
+                ).values_list('cluster', flat=True)
+                cluster = min(post_id, *matches, *clusters)
+                PostSignature.objects.filter(
+                    post_id__in=matches, cluster=None
+                ).update(cluster=cluster)
+            PostSignature.objects.create(
+                post_id=post_id, signature=sig.tobytes(), cluster=cluster
+            )
+            SignatureBucket.objects.bulk_create([
+                SignatureBucket(signature_id=post_id, bucket=bucket)
+                for bucket in new_buckets
+            ])
+    cache.delete_many([
+        BUCKET_KEY.format(bucket) for bucket in {*old_buckets, *new_buckets}
+    ] + [SIGNATURE_KEY.format(post_id)])
+
+
+def _cluster_all():
+    """Размечает кластеры всего индекса: посты из общей корзины, чьи
+    подписи достаточно похожи, объединяются в систему непересекающихся
+    множеств с корнем в наименьшем id. Возвращает число кластеров.
+    """
+
+    parent = {}
+
+    def find(pk):
+        while parent.get(pk, pk) != pk:
+            parent[pk] = parent.get(parent[pk], parent[pk])
+            pk = parent[pk]
+        return pk
+
+    rows = SignatureBucket.objects.order_by('bucket').values_list(
+        'bucket', 'signature_id'
+    ).iterator()
+    for _, group in groupby(rows, key=itemgetter(0)):
+        ids = sorted(post_id for _, post_id in group)
+        if len(ids) < 2:
+            continue
+        sigs = _signatures(ids)
+        first = ids[0]
+        for pk in ids[1:]:
+            if np.mean(sigs[pk] == sigs[first]) < DUPLICATE_THRESHOLD:
+                continue
+            roots = sorted((find(first), find(pk)))
+            if roots[0] != roots[1]:
+                parent[roots[1]] = roots[0]
+
+    clusters = {}
+    for pk in list(parent):
+        root = find(pk)
+        clusters.setdefault(root, {root}).add(pk)
+    PostSignature.objects.update(cluster=None)
+    for root, members in clusters.items():
+        PostSignature.objects.filter(post_id__in=members).update(cluster=root)
+
+    return len(clusters)
+
+
+def backfill(batch_size=MODERATION_BATCH_SIZE):
+    """Строит индекс заново для всех постов пачками по batch_size
+    и размечает кластеры. Возвращает (число подписей, число кластеров).
+    """
+
+    indexed = 0
+    for model in (SignatureBucket, PostSignature):
+        queryset = model.objects.all()
+        queryset._raw_delete(queryset.db)
+
+    for ids in iter_id_batches(Post.objects.all(), batch_size):
+        signatures, rows = [], []
+        for pk, text in Post.objects.filter(pk__in=ids).values_list(
+            'pk', 'text'
+        ):
+            sig = signature(text)
+            if sig is None:
+                continue
+            signatures.append(
+                PostSignature(post_id=pk, signature=sig.tobytes())
+            )
+            rows += [
+                SignatureBucket(signature_id=pk, bucket=bucket)
+                for bucket in buckets(sig)
+            ]
+        with transaction.atomic():
+            PostSignature.objects.bulk_create(signatures)
+            SignatureBucket.objects.bulk_create(rows)
+        cache.delete_many(
+            [BUCKET_KEY.format(row.bucket) for row in rows]
+            + [SIGNATURE_KEY.format(pk) for pk in ids]
+        )
+        indexed += len(signatures)
+
+    return indexed, _cluster_all()
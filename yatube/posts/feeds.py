@@ -0,0 +1,209 @@
+import hashlib
+import json
+import time
+
+from django.contrib.syndication.views import Feed
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.feedgenerator import (
+    Atom1Feed, Rss201rev2Feed, SyndicationFeed,
+)
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from core import cache
+
+from .cache import (
+    get_author_head, get_group_head, get_index_head, get_or_404,
+    syndication_key,
+)
+from .constants import FEED_CACHE_TIME_SEC, FEED_ITEMS_COUNT
+from users.cache import get_user_or_404
+from .models import Group, Post
+
+
+class JSONFeed(SyndicationFeed):
+    """Лента в формате JSON Feed 1.1."""
+
+    content_type = 'application/feed+json; charset=utf-8'
+
+    def write(self, outfile, encoding):
+        feed = {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': self.feed['title'],
+            'home_page_url': self.feed['link'],
+            'description': self.feed['description'],
+            'language': self.feed['language'],
+            'items': [self.item_json(item) for item in self.items],
+        }
+        outfile.write(json.dumps(feed, ensure_ascii=False))
+
+    @staticmethod
+    def item_json(item):
+        return {
+            'id': item['unique_id'] or item['link'],
+            'url': item['link'],
+            'title': item['title'],
+            'content_text': item['description'],
+            'date_published': item['pubdate'].isoformat(),
+            'authors': [{'name': item['author_name']}],
+            'tags': item['categories'],
+        }
+
+
+FEED_TYPES = {
+    'rss': Rss201rev2Feed,
+    'atom': Atom1Feed,
+    'json': JSONFeed,
+}
+
+
+class PostsFeed(Feed):
+    """Общая лента последних постов для агрегаторов.
+    Посты берутся по id из закешированной головы ленты, а готовое тело
+    хранится в общем кеше до следующего изменения ленты, поэтому опрос
+    ленты стоит одного чтения из кеша. Поддерживаются ETag и If-Modified-Since.
+    """
+
+    kind = 'index'
+    lookup = None
+    title = 'Последние обновления на сайте'
+    description = 'Новые записи Yatube'
+
+    def __init__(self, feed_format):
+        self.feed_format = feed_format
+        self.feed_type = FEED_TYPES[feed_format]
+
+    def __call__(self, request, *args, **kwargs):
+        key = syndication_key(
+            self.kind, kwargs.get(self.lookup, ''), self.feed_format
+        )
+        entry = cache.get_many(
+            {key: key},
+            lambda keys: {key: self.render_entry(request, *args, **kwargs)},
+            FEED_CACHE_TIME_SEC,
+        )[key]
+
+        response = HttpResponse(
+            entry['body'], content_type=entry['content_type']
+        )
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+
+        return get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+            response=response,
+        )
+
+    def render_entry(self, request, *args, **kwargs):
+        """Готовое тело ленты с ETag и временем отрисовки для кеша."""
+
+        response = super().__call__(request, *args, **kwargs)
+
+        return {
+            'body': response.content,
+            'content_type': response['Content-Type'],
+            'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+            'last_modified': int(time.time()),
+        }
+
+    def get_head(self, obj):
+        return get_index_head()
+
+    def link(self, obj):
+        return reverse('posts:index')
+
+    def items(self, obj):
+        ids = self.get_head(obj)['ids'][:FEED_ITEMS_COUNT]
+        posts = Post.objects.visible().select_related(
+            'author', 'group'
+        ).in_bulk(ids)
+
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def item_title(self, item):
+        return Truncator(item.text).chars(60)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', kwargs={'post_id': item.pk})
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class GroupPostsFeed(PostsFeed):
+    """Лента последних постов сообщества."""
+
+    kind = 'group'
+    lookup = 'slug'
+
+    def get_object(self, request, slug):
+        return get_or_404('group', Group.objects, slug=slug)
+
+    def get_head(self, obj):
+        return get_group_head(obj)
+
+    def title(self, obj):
+        return f'Записи сообщества {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_list', kwargs={'slug': obj.slug})
+
+
+class AuthorPostsFeed(PostsFeed):
+    """Лента последних постов автора."""
+
+    kind = 'author'
+    lookup = 'username'
+
+    def get_object(self, request, username):
+        return get_user_or_404(username)
+
+    def get_head(self, obj):
+        return get_author_head(obj)
+
+    def title(self, obj):
+        return f'Записи пользователя {obj.get_full_name() or obj.username}'
+
+    def description(self, obj):
+        return self.title(obj)
+
+    def link(self, obj):
+        return reverse('posts:profile', kwargs={'username': obj.username})
+
+
+def feed_view(feed_class):
+    """Представление, отдающее ленту в формате из адреса: rss, atom
+    или json.
+    """
+
+    feeds = {
+        feed_format: feed_class(feed_format) for feed_format in FEED_TYPES
+    }
+
+    def view(request, feed_format, **kwargs):
+        if feed_format not in feeds:
+            raise Http404
+        return feeds[feed_format](request, **kwargs)
+
+    return view
+
+
+index_feed = feed_view(PostsFeed)
+group_feed = feed_view(GroupPostsFeed)
+author_feed = feed_view(AuthorPostsFeed)
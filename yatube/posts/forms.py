@@ -1,19 +1,137 @@
 from django import forms
+from django.db import transaction
+from django.utils import timezone
 
+from .duplicates import find_duplicate
 from .models import Post, Comment
 
+VERSION_CONFLICT_MESSAGE = (
+    'Пост изменили, пока вы его редактировали. '
+    'Обновите страницу и внесите правку ещё раз.'
+)
+DUPLICATE_MESSAGE = 'Почти такой же пост уже опубликован.'
+
+
+class VersionConflict(Exception):
+    """Пост успели изменить после того, как его открыли для правки."""
+
 
 class PostForm(forms.ModelForm):
-    """Форма создания поста."""
+    """Форма создания поста.
+    При правке версия, с которой начали редактирование, приходит
+    скрытым полем version. Если пост за это время изменили, форма
+    не проходит проверку, а при гонке между проверкой и записью
+    save() выбрасывает VersionConflict. Текст, почти совпадающий
+    с уже опубликованным постом, не принимается.
+    """
 
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expected_version = self.instance.version
+        version = self.data.get('version')
+        if self.instance.pk is not None and version:
+            try:
+                self.expected_version = int(version)
+            except ValueError:
+                pass
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.expected_version != self.instance.version:
+            raise forms.ValidationError(
+                VERSION_CONFLICT_MESSAGE, code='version_conflict'
+            )
+        text = cleaned_data.get('text')
+        if text and find_duplicate(text, exclude=self.instance.pk):
+            self.add_error(
+                'text',
+                forms.ValidationError(DUPLICATE_MESSAGE, code='duplicate'),
+            )
+
+        return cleaned_data
+
+    def save(self, commit=True):
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+
+        with transaction.atomic():
+            claimed = Post.objects.filter(
+                pk=self.instance.pk, version=self.expected_version
+            ).update(version=self.expected_version + 1)
+            if not claimed:
+                raise VersionConflict
+            self.instance.version = self.expected_version
+            return super().save()
+
+
+class ScheduleForm(forms.Form):
+    """Время отложенной публикации нового поста. Отдельная форма,
+    чтобы не менять набор полей PostForm.
+    """
+
+    publish_at = forms.DateTimeField(
+        label='Опубликовать позже',
+        required=False,
+        input_formats=['%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M'],
+        widget=forms.DateTimeInput(
+            attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'
+        ),
+        help_text='Оставьте пустым, чтобы опубликовать пост сразу',
+    )
+
+    def clean_publish_at(self):
+        publish_at = self.cleaned_data['publish_at']
+        if publish_at is not None and publish_at <= timezone.now():
+            raise forms.ValidationError(
+                'Время публикации должно быть в будущем.'
+            )
+
+        return publish_at
+
+    def schedule(self, post):
+        """Откладывает публикацию поста, если время указано."""
+
+        publish_at = self.cleaned_data['publish_at']
+        if publish_at is not None:
+            post.publish_at = publish_at
+            post.is_published = False
+
 
 class CommentForm(forms.ModelForm):
-    """Форма создания комментария к посту."""
+    """Форма создания комментария к посту.
+    Ответ на комментарий передаёт его id скрытым полем parent (вне
+    набора полей формы); ответы глубже COMMENTS_MAX_DEPTH прикрепляются
+    к предку на этой глубине. После проверки id родителя — в parent_id.
+    """
 
     class Meta:
         model = Comment
         fields = ('text',)
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.post = post
+        self.parent_id = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        parent = self.data.get('parent')
+        if not parent or self.post is None:
+            return cleaned_data
+        path = None
+        if parent.isdigit():
+            path = Comment.objects.visible().filter(
+                pk=int(parent), post=self.post
+            ).values_list('path', flat=True).first()
+        if path is None:
+            raise forms.ValidationError(
+                'Комментарий, на который вы отвечаете, не найден.',
+                code='parent',
+            )
+        self.parent_id = Comment.reply_parent_id(path)
+
+        return cleaned_data
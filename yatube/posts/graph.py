@@ -0,0 +1,144 @@
+from array import array
+from collections import Counter
+
+from core import cache
+from .constants import (
+    GRAPH_CACHE_TIME_SEC, SUGGESTIONS_COUNT, SUGGESTIONS_FANOUT,
+)
+from .models import Follow, Recommendation, User
+
+FOLLOWING_KEY = 'graph:following:{}'
+FOLLOWERS_KEY = 'graph:followers:{}'
+
+# Направления графа: ключ кеша, поле пользователя и поле соседа в Follow.
+FOLLOWING = (FOLLOWING_KEY, 'user_id', 'author_id')
+FOLLOWERS = (FOLLOWERS_KEY, 'author_id', 'user_id')
+
+
+def _adjacency(direction, user_ids):
+    """Списки смежности пользователей user_ids: отсортированные массивы
+    id ('i', 4 байта на связь). Берутся из общего кеша одним get_many,
+    недостающие собираются одним запросом к базе.
+    """
+
+    key_template, field, other = direction
+
+    def load(missing):
+        loaded = {pk: array('i') for pk in missing}
+        rows = Follow.objects.filter(
+            **{f'{field}__in': missing}
+        ).order_by(field, other).values_list(field, other).distinct()
+        for pk, other_id in rows:
+            loaded[pk].append(other_id)
+        return loaded
+
+    return cache.get_many(
+        {key_template.format(pk): pk for pk in user_ids},
+        load,
+        GRAPH_CACHE_TIME_SEC,
+    )
+
+
+def _count(direction, user_id):
+    """Число соседей пользователя. Без общего кеша список смежности
+    не сохраняется, поэтому хватает COUNT по индексу.
+    """
+
+    if not cache.is_enabled():
+        _, field, other = direction
+        return Follow.objects.filter(
+            **{field: user_id}
+        ).values(other).distinct().count()
+
+    return len(_adjacency(direction, [user_id])[user_id])
+
+
+def following(user_id):
+    """id авторов, на которых подписан пользователь, по возрастанию."""
+
+    return _adjacency(FOLLOWING, [user_id])[user_id]
+
+
+def followers(user_id):
+    """id подписчиков пользователя по возрастанию."""
+
+    return _adjacency(FOLLOWERS, [user_id])[user_id]
+
+
+def following_count(user_id):
+    return _count(FOLLOWING, user_id)
+
+
+def followers_count(user_id):
+    return _count(FOLLOWERS, user_id)
+
+
+def mutual(user_id):
+    """id пользователей, с которыми подписка взаимная."""
+
+    return sorted(set(following(user_id)).intersection(followers(user_id)))
+
+
+def common_following(user_id, other_id):
+    """id авторов, на которых подписаны оба пользователя."""
+
+    adjacency = _adjacency(FOLLOWING, [user_id, other_id])
+
+    return sorted(
+        set(adjacency[user_id]).intersection(adjacency[other_id])
+    )
+
+
+def suggestions(user_id, limit=SUGGESTIONS_COUNT):
+    """Авторы, на которых чаще всего подписаны те, на кого подписан
+    пользователь, кроме него самого и уже отслеживаемых. Учитываются
+    подписки не больше чем SUGGESTIONS_FANOUT авторов.
+    """
+
+    own = following(user_id)
+    skip = set(own)
+    skip.add(user_id)
+    counts = Counter()
+    for ids in _adjacency(FOLLOWING, own[:SUGGESTIONS_FANOUT]).values():
+        counts.update(pk for pk in ids if pk not in skip)
+
+    return [pk for pk, _ in counts.most_common(limit)]
+
+
+def recommended_authors(user, limit=SUGGESTIONS_COUNT):
+    """Авторы для блока рекомендаций: сначала посчитанные командой
+    recommend_authors (один запрос по индексу), затем, если их нет,
+    подписки подписок из графа, затем самые популярные авторы.
+    Авторы, на которых пользователь уже подписан, пропускаются.
+    """
+
+    skip = set(following(user.pk))
+    skip.add(user.pk)
+    stored = [
+        recommendation.author for recommendation in
+        Recommendation.objects.filter(user=user).select_related('author')
+        if recommendation.author_id not in skip
+    ]
+    if stored:
+        return stored[:limit]
+
+    ids = suggestions(user.pk, limit)
+    if ids:
+        users = User.objects.in_bulk(ids)
+        return [users[pk] for pk in ids if pk in users]
+
+    return [
+        recommendation.author for recommendation in
+        Recommendation.objects.filter(user=None).select_related('author')
+        if recommendation.author_id not in skip
+    ][:limit]
+
+
+def forget(user_id, author_id):
+    """Сбрасывает списки смежности обоих концов изменившейся подписки
+    во всех процессах, следующий запрос соберёт их заново.
+    """
+
+    cache.invalidate(
+        FOLLOWING_KEY.format(user_id), FOLLOWERS_KEY.format(author_id),
+    )
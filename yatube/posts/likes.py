@@ -0,0 +1,150 @@
+import random
+import re
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.template.loader import get_template
+
+from core import cache
+
+from . import prerender
+from .constants import LIKE_COUNT_CACHE_TIME_SEC, LIKE_COUNTER_SHARDS
+from .models import Like, LikeCounter, Post
+
+COUNT_KEY = 'likes:count:{}'
+MARKER_RE = re.compile(r'<!-- like:(\d+) -->')
+
+
+def _add(post_id, delta):
+    """Прибавляет delta к случайному счётчику поста."""
+
+    shard = random.randrange(LIKE_COUNTER_SHARDS)
+    counter = LikeCounter.objects.filter(post_id=post_id, shard=shard)
+    if counter.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            LikeCounter.objects.create(
+                post_id=post_id, shard=shard, count=delta
+            )
+    except IntegrityError:
+        counter.update(count=F('count') + delta)
+
+
+def counts(post_ids):
+    """Число отметок постов {id: число}: из общего кеша одним get_many,
+    недостающие — одним запросом суммы по счётчикам.
+    """
+
+    def load(missing):
+        loaded = dict.fromkeys(missing, 0)
+        loaded.update(
+            LikeCounter.objects.filter(post_id__in=missing)
+            .values_list('post_id')
+            .annotate(total=Sum('count'))
+            .order_by()
+        )
+        return loaded
+
+    return cache.get_many(
+        {COUNT_KEY.format(pk): pk for pk in post_ids},
+        load,
+        LIKE_COUNT_CACHE_TIME_SEC,
+    )
+
+
+def set_liked(user, post, liked):
+    """Ставит или снимает отметку пользователя на пост. Повтор запроса
+    с тем же состоянием ничего не меняет. Изменение перерисовывает
+    заранее отрисованные страницы, где видно число отметок поста.
+    Возвращает число отметок.
+    """
+
+    post_id = post.pk
+    with transaction.atomic():
+        if liked:
+            try:
+                with transaction.atomic():
+                    Like.objects.create(user=user, post_id=post_id)
+                delta = 1
+            except IntegrityError:
+                delta = 0
+        else:
+            delta = -Like.objects.filter(
+                user=user, post_id=post_id
+            ).delete()[0]
+        if delta:
+            _add(post_id, delta)
+
+    if delta:
+        cache.invalidate(COUNT_KEY.format(post_id))
+        prerender.refresh(
+            post_ids=[post_id],
+            author_ids=[post.author_id],
+            group_ids=[post.group_id],
+        )
+
+    return counts([post_id])[post_id]
+
+
+def attach(posts, user):
+    """Проставляет постам страницы like_count и liked двумя запросами
+    на страницу, а не запросом на карточку; счётчики обычно берутся
+    из кеша. Архивным постам отметки не ставятся, их число отметок
+    хранится в архиве.
+    """
+
+    posts = list(posts)
+    ids = [post.pk for post in posts if isinstance(post, Post)]
+    totals = counts(ids)
+    liked = set()
+    if user.is_authenticated and ids:
+        liked = set(Like.objects.filter(
+            user=user, post_id__in=ids
+        ).values_list('post_id', flat=True))
+    for post in posts:
+        if isinstance(post, Post):
+            post.like_count = totals.get(post.pk)
+            post.liked = post.pk in liked
+
+    return posts
+
+
+def _fill(request, response):
+    content = response.content.decode(response.charset)
+    ids = [int(pk) for pk in MARKER_RE.findall(content)]
+    if not ids:
+        return response
+    request.likes_deferred = False
+    template = get_template('posts/includes/like_state.html')
+    context = {'user': request.user, 'request': request}
+    blocks = {
+        post.pk: template.render({**context, 'post': post})
+        for post in attach([Post(pk=pk) for pk in ids], request.user)
+    }
+    response.content = MARKER_RE.sub(
+        lambda match: blocks[int(match[1])], content
+    )
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = len(response.content)
+
+    return response
+
+
+def deferred(view):
+    """Декоратор страницы под cache_page: карточки рисуют вместо
+    состояния отметки (кнопки с числом) метку, а состояние для текущего
+    пользователя подставляется в готовую, в том числе взятую из кеша,
+    страницу при каждом запросе. Форма с CSRF-токеном остаётся в кеше.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.likes_deferred = True
+        response = view(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+        return _fill(request, response)
+
+    return wrapper
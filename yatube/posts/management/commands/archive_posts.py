@@ -0,0 +1,32 @@
+import datetime as dt
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.archive import archive_posts
+from posts.constants import MODERATION_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые посты, их комментарии и историю правок в архив. '
+        'От отметок «нравится» в архиве остаётся только их число, '
+        'уведомления о перенесённых постах удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.POSTS_ARCHIVE_AFTER_DAYS,
+            help='Архивировать посты старше этого числа дней.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=MODERATION_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - dt.timedelta(days=options['days'])
+        count = archive_posts(cutoff, options['batch_size'])
+        self.stdout.write(f'Перенесено в архив постов: {count}')
@@ -0,0 +1,93 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import resolve
+
+from posts.models import Group, Post
+from posts.prerender import page
+from posts.utils import get_page
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время отрисовки шаблонов страниц со списками постов '
+        'на данных из базы. Выборки делаются один раз до замеров, '
+        'так что в результат входят только шаблоны и запросы из них. '
+        'Для сравнения с продакшен-профилем (кешированный загрузчик '
+        'шаблонов) запустите с YATUBE_DEBUG=0 после collectstatic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--cold-cache',
+            action='store_true',
+            help='Очищать кеш перед каждой отрисовкой (без кеша фрагментов).',
+        )
+
+    def request(self, path):
+        request = RequestFactory().get(path)
+        request.user = AnonymousUser()
+        request.resolver_match = resolve(path)
+        return request
+
+    def page_obj(self, path, posts):
+        request = self.request(path)
+        page_obj = get_page(request, posts)
+        page_obj.object_list = list(page_obj.object_list)
+        return request, page_obj
+
+    def pages(self):
+        """Страницы со списками: (имя, шаблон, запрос, контекст)."""
+
+        posts = Post.objects.visible().select_related('group', 'author')
+        request, page_obj = self.page_obj(page('index'), posts)
+        yield 'index', 'posts/index.html', request, {'page_obj': page_obj}
+        yield 'follow', 'posts/follow.html', request, {'page_obj': page_obj}
+
+        group = Group.objects.filter(posts__isnull=False).first()
+        if group is not None:
+            request, page_obj = self.page_obj(
+                page('group_list', slug=group.slug), group.posts.visible()
+            )
+            yield 'group_list', 'posts/group_list.html', request, {
+                'group': group, 'page_obj': page_obj,
+            }
+
+        post = posts.first()
+        if post is not None:
+            author = post.author
+            request, page_obj = self.page_obj(
+                page('profile', username=author.username),
+                author.posts.visible().select_related('group'),
+            )
+            yield 'profile', 'posts/profile.html', request, {
+                'author': author, 'page_obj': page_obj,
+            }
+
+    def handle(self, *args, **options):
+        engine = engines['django'].engine
+        self.stdout.write(
+            'Загрузчики: ' + ', '.join(
+                type(loader).__module__ for loader in engine.template_loaders
+            )
+        )
+        for name, template, request, context in self.pages():
+            timings = []
+            for _ in range(options['repeat']):
+                if options['cold_cache']:
+                    cache.clear()
+                start = time.perf_counter()
+                render_to_string(template, context, request)
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{name:<12} медиана {statistics.median(timings):8.2f} мс  '
+                f'мин {min(timings):8.2f} мс  '
+                f'({len(context["page_obj"])} постов)'
+            )
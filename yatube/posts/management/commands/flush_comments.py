@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.comment_queue import flush
+
+
+class Command(BaseCommand):
+    help = 'Записывает в базу комментарии из журнала отложенной записи.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а сбрасывать журнал периодически.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = flush()
+            if count:
+                self.stdout.write(f'Записано комментариев: {count}')
+            if not options['loop']:
+                break
+            time.sleep(settings.COMMENTS_FLUSH_INTERVAL_SEC)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.constants import MODERATION_BATCH_SIZE
+from posts.duplicates import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит заново индекс почти одинаковых постов для всех постов '
+        'и размечает кластеры похожих.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=MODERATION_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        indexed, clusters = backfill(options['batch_size'])
+        self.stdout.write(
+            f'Проиндексировано постов: {indexed}, кластеров: {clusters}'
+        )
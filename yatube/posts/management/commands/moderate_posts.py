@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from posts.constants import MODERATION_BATCH_SIZE
+from posts.models import Group, Post
+from posts.moderation import delete_posts, move_posts
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовая модерация постов: удаление или перенос в группу '
+        'по автору, периоду публикации и тексту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', action='append', default=[],
+                            help='Имя автора; можно указать несколько раз.')
+        parser.add_argument('--since', help='Дата ГГГГ-ММ-ДД, включительно.')
+        parser.add_argument('--until', help='Дата ГГГГ-ММ-ДД, включительно.')
+        parser.add_argument('--contains', help='Подстрока текста поста.')
+        parser.add_argument('--regex', help='Регулярное выражение для текста.')
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument('--delete', action='store_true')
+        action.add_argument('--move-to', metavar='SLUG',
+                            help='Slug группы; пустая строка — без группы.')
+        parser.add_argument('--batch-size', type=int,
+                            default=MODERATION_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать число найденных постов.')
+
+    def get_queryset(self, options):
+        queryset = Post.objects.all()
+        if options['author']:
+            queryset = queryset.filter(author__username__in=options['author'])
+        for option, lookup in (('since', 'gte'), ('until', 'lte')):
+            if options[option]:
+                day = parse_date(options[option])
+                if day is None:
+                    raise CommandError(f'Неверная дата: {options[option]}')
+                queryset = queryset.filter(
+                    **{f'pub_date__date__{lookup}': day}
+                )
+        if options['contains']:
+            queryset = queryset.filter(text__icontains=options['contains'])
+        if options['regex']:
+            queryset = queryset.filter(text__iregex=options['regex'])
+
+        return queryset
+
+    def handle(self, *args, **options):
+        queryset = self.get_queryset(options)
+        if options['dry_run']:
+            self.stdout.write(f'Найдено постов: {queryset.count()}')
+            return
+
+        if options['delete']:
+            count = delete_posts(queryset, options['batch_size'])
+            self.stdout.write(f'Удалено постов: {count}')
+            return
+
+        group = None
+        if options['move_to']:
+            try:
+                group = Group.objects.get(slug=options['move_to'])
+            except Group.DoesNotExist:
+                raise CommandError(f'Нет группы {options["move_to"]}')
+        count = move_posts(queryset, group, options['batch_size'])
+        self.stdout.write(f'Перенесено постов: {count}')
@@ -0,0 +1,24 @@
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.prerender import write_page
+from posts.prerender import all_pages
+
+
+class Command(BaseCommand):
+    help = 'Выгружает публичные страницы в PRERENDER_ROOT статическим HTML.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее выгруженные страницы перед выгрузкой.',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            shutil.rmtree(settings.PRERENDER_ROOT, ignore_errors=True)
+        count = sum(write_page(path) for path in all_pages())
+        self.stdout.write(f'Выгружено страниц: {count}')
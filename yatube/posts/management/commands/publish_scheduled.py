@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.constants import PUBLISH_BATCH_SIZE
+from posts.publishing import publish_due
+
+
+class Command(BaseCommand):
+    help = 'Публикует запланированные посты, время которых наступило.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а публиковать посты периодически.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=PUBLISH_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = publish_due(options['batch_size'])
+            if count:
+                self.stdout.write(f'Опубликовано постов: {count}')
+            if not options['loop']:
+                break
+            time.sleep(settings.POSTS_PUBLISH_INTERVAL_SEC)
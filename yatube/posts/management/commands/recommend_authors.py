@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.constants import RECOMMENDATIONS_BATCH_SIZE, RECOMMENDATIONS_COUNT
+from posts.recommendations import compute
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации авторов по подпискам и сообществам. '
+        'Запускается по расписанию, например раз в сутки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=RECOMMENDATIONS_COUNT
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECOMMENDATIONS_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = compute(options['top_k'], options['batch_size'])
+        self.stdout.write(
+            f'Рекомендации посчитаны для {count} пользователей '
+            f'за {time.monotonic() - started:.1f} с'
+        )
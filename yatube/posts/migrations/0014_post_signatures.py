@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-19 18:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSignature',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('signature', models.BinaryField(verbose_name='Подпись')),
+                ('cluster', models.IntegerField(db_index=True, help_text='id первого поста группы похожих', null=True, verbose_name='Кластер')),
+            ],
+            options={
+                'verbose_name': 'Похожие посты',
+                'verbose_name_plural': 'Похожие посты',
+            },
+        ),
+        migrations.CreateModel(
+            name='SignatureBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, verbose_name='Корзина')),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='posts.PostSignature', verbose_name='Подпись')),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-19 18:27
+
+from django.db import migrations, models, router
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_paths(apps, schema_editor):
+    """Существующие комментарии плоские: путь каждого — его id."""
+
+    db_alias = schema_editor.connection.alias
+    for name in ('Comment', 'ArchivedComment'):
+        model = apps.get_model('posts', name)
+        if not router.allow_migrate_model(db_alias, model):
+            continue
+        last_id = 0
+        while True:
+            ids = list(
+                model.objects.using(db_alias).filter(pk__gt=last_id)
+                .order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            model.objects.using(db_alias).bulk_update(
+                [model(pk=pk, path=f'{pk:010d}') for pk in ids], ['path']
+            )
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_signatures'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='archivedcomment',
+            options={'ordering': ['path', 'id'], 'verbose_name': 'Архивный комментарий', 'verbose_name_plural': 'Архивные комментарии'},
+        ),
+        migrations.AddField(
+            model_name='archivedcomment',
+            name='path',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на комментарий'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100, verbose_name='Путь в ветке'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
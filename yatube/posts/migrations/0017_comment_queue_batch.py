@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_likes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentQueueBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uid', models.CharField(max_length=32, unique=True, verbose_name='Пачка')),
+            ],
+            options={
+                'verbose_name': 'Пачка журнала комментариев',
+                'verbose_name_plural': 'Пачки журнала комментариев',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_comment_queue_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPostRevision',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('post_id', models.IntegerField(db_index=True, verbose_name='Пост')),
+                ('version', models.PositiveIntegerField(verbose_name='Версия')),
+                ('created', models.DateTimeField(verbose_name='Дата правки')),
+                ('diff', models.TextField(verbose_name='Изменения')),
+            ],
+            options={
+                'verbose_name': 'Правка архивного поста',
+                'verbose_name_plural': 'Правки архивных постов',
+                'ordering': ['-version'],
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='like_count',
+            field=models.IntegerField(default=0, verbose_name='Отметок «нравится»'),
+        ),
+    ]
@@ -1,12 +1,32 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
-from .constants import MAX_LENGHT_OF_RETURN_TEXT
-from core.models import TextAndPubDateModel
+from .constants import (
+    COMMENT_PATH_LENGTH, COMMENTS_MAX_DEPTH, MAX_LENGHT_OF_RETURN_TEXT,
+)
+from core.models import TextAndPubDateModel, VisibleQuerySet
 
 User = get_user_model()
 
 
+class PostQuerySet(VisibleQuerySet):
+    def visible(self):
+        """Только опубликованные и не скрытые модератором посты."""
+
+        return super().visible().filter(is_published=True)
+
+    def due(self, now):
+        """Запланированные посты, время публикации которых наступило,
+        в порядке этого времени.
+        """
+
+        return self.filter(
+            is_published=False, publish_at__lte=now
+        ).order_by('publish_at')
+
+
 class Post(TextAndPubDateModel):
     """Модель Post используется для хранения постов в блоге.
     У пользователя есть возможность публиковать посты в общей ленте
@@ -33,15 +53,123 @@ class Post(TextAndPubDateModel):
         upload_to='posts/',
         blank=True
     )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    is_published = models.BooleanField(
+        'Опубликован',
+        default=True,
+    )
+    publish_at = models.DateTimeField(
+        'Время публикации',
+        blank=True,
+        null=True,
+        help_text='Для отложенной публикации',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['is_hidden', 'is_published', '-pub_date'],
+                name='post_published_pub_date_idx',
+            ),
+            models.Index(
+                fields=['publish_at'],
+                name='post_scheduled_idx',
+                condition=models.Q(is_published=False),
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:MAX_LENGHT_OF_RETURN_TEXT]
 
+    def save(self, *args, **kwargs):
+        """Каждое сохранение существующего поста увеличивает версию:
+        по ней проверяются параллельные правки и строятся ключи кеша.
+        """
+
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, 'version', 'updated_at'
+                }
+        super().save(*args, **kwargs)
+
+
+class PostRevision(models.Model):
+    """Правка текста поста: построчный diff от предыдущей версии."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='revisions',
+        verbose_name='Пост',
+    )
+    version = models.PositiveIntegerField('Версия')
+    created = models.DateTimeField('Дата правки', auto_now_add=True)
+    diff = models.TextField('Изменения')
+
+    class Meta:
+        ordering = ['-version']
+        verbose_name = 'Правка поста'
+        verbose_name_plural = 'Правки постов'
+
+    def __str__(self):
+        return f'{self.post_id} v{self.version}'
+
+
+class PostSignature(models.Model):
+    """MinHash-подпись текста поста для поиска почти одинаковых постов.
+    Похожие посты объединяются в кластер с id самого раннего из них.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Пост',
+    )
+    signature = models.BinaryField('Подпись')
+    cluster = models.IntegerField(
+        'Кластер',
+        null=True,
+        db_index=True,
+        help_text='id первого поста группы похожих',
+    )
+
+    class Meta:
+        verbose_name = 'Похожие посты'
+        verbose_name_plural = 'Похожие посты'
+
+    def __str__(self):
+        return str(self.post_id)
+
+
+class SignatureBucket(models.Model):
+    """Корзина LSH: полоса подписи, по которой ищутся кандидаты."""
+
+    signature = models.ForeignKey(
+        PostSignature,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+        verbose_name='Подпись',
+    )
+    bucket = models.BigIntegerField('Корзина', db_index=True)
+
 
 class Group(models.Model):
     """Модель Group для сообществ. Сообщества создаются администратором сайта,
@@ -65,8 +193,58 @@ class Group(models.Model):
         return self.title
 
 
+def comment_path(parent_path, pk):
+    """Материализованный путь комментария: id всех предков и его
+    собственный, дополненные нулями до одной ширины и разделённые
+    точками. Сортировка по пути даёт ветки в порядке обхода в глубину.
+    """
+
+    segment = f'{pk:010d}'
+    return f'{parent_path}.{segment}' if parent_path else segment
+
+
+class CommentQuerySet(VisibleQuerySet):
+    def fill_paths(self):
+        """Проставляет пути комментариям, записанным без save(),
+        например через bulk_create. Родитель всегда старше ответа,
+        поэтому обход по id видит его путь раньше.
+        """
+
+        paths = {}
+        rows = self.filter(path='').order_by('pk').values_list(
+            'pk', 'parent_id', 'parent__path'
+        )
+        for pk, parent_id, parent_path in rows:
+            paths[pk] = comment_path(paths.get(parent_id, parent_path), pk)
+        Comment.objects.bulk_update(
+            [Comment(pk=pk, path=path) for pk, path in paths.items()],
+            ['path'],
+        )
+
+        return len(paths)
+
+
 class Comment(TextAndPubDateModel):
-    """Комментирование постов."""
+    """Комментирование постов. Ответы образуют ветки: путь хранит id
+    всех предков, поэтому ветка любой глубины выбирается одним запросом
+    по диапазону путей.
+    """
+
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies',
+        verbose_name='Ответ на комментарий',
+    )
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=COMMENT_PATH_LENGTH,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -81,6 +259,50 @@ class Comment(TextAndPubDateModel):
         verbose_name='Автор комментария',
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    @property
+    def depth(self):
+        return self.path.count('.')
+
+    @staticmethod
+    def reply_parent_id(parent_path):
+        """id комментария, к которому прикрепить ответ: сам родитель
+        или, если ветка уже достигла COMMENTS_MAX_DEPTH, его предок.
+        """
+
+        segments = parent_path.split('.')
+        return int(segments[min(len(segments), COMMENTS_MAX_DEPTH - 1) - 1])
+
+
+@receiver(post_save, sender=Comment)
+def write_comment_path(sender, instance, **kwargs):
+    """Путь включает id, поэтому пишется сразу после вставки. Обработчик
+    подключается при импорте моделей, раньше обработчиков из signals.py,
+    и они уже видят готовый путь.
+    """
+
+    if not instance.path:
+        parent_path = instance.parent.path if instance.parent_id else ''
+        instance.path = comment_path(parent_path, instance.pk)
+        Comment.objects.filter(pk=instance.pk).update(path=instance.path)
+
+
+class CommentQueueBatch(models.Model):
+    """Пачка журнала комментариев, уже записанная в базу. Пишется в той
+    же транзакции, что и комментарии, поэтому сбой до удаления файла
+    пачки не приводит к повторной вставке.
+    """
+
+    uid = models.CharField('Пачка', max_length=32, unique=True)
+
+    class Meta:
+        verbose_name = 'Пачка журнала комментариев'
+        verbose_name_plural = 'Пачки журнала комментариев'
+
+    def __str__(self):
+        return self.uid
+
 
 class Follow(models.Model):
     """Подписки на авторов."""
@@ -98,3 +320,178 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор, на которого подписываются',
     )
+
+
+class Like(models.Model):
+    """Отметка «нравится» пользователя на посте."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name='Пост',
+    )
+    created = models.DateTimeField('Дата отметки', auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_like'
+            ),
+        ]
+        verbose_name = 'Отметка «нравится»'
+        verbose_name_plural = 'Отметки «нравится»'
+
+
+class LikeCounter(models.Model):
+    """Один из LIKE_COUNTER_SHARDS счётчиков отметок поста. Отметки
+    попадают в случайный счётчик, поэтому параллельные отметки
+    популярного поста не ждут блокировки одной строки.
+    """
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+        verbose_name='Пост',
+    )
+    shard = models.PositiveSmallIntegerField('Номер счётчика')
+    count = models.IntegerField('Отметок', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'shard'], name='unique_like_counter_shard'
+            ),
+        ]
+
+
+class Recommendation(models.Model):
+    """Автор, рекомендованный пользователю командой recommend_authors.
+    Строки без пользователя — самые популярные авторы для тех, кому
+    персональных рекомендаций нет.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='recommendations',
+        verbose_name='Пользователь',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор',
+    )
+    score = models.FloatField('Оценка')
+    computed_at = models.DateTimeField('Дата расчёта')
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='recommendation_user_score_idx',
+            ),
+        ]
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+
+
+class ArchivedPost(models.Model):
+    """Пост, перенесённый в архив командой archive_posts.
+    Сохраняет id исходного поста; автор и группа хранятся как id,
+    чтобы архив мог лежать в отдельной базе.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    author_id = models.IntegerField('Автор', db_index=True)
+    group_id = models.IntegerField('Группа', blank=True, null=True)
+    text = models.TextField('Текст')
+    pub_date = models.DateTimeField('Дата создания', db_index=True)
+    image = models.ImageField('Картинка', upload_to='posts/', blank=True)
+    is_hidden = models.BooleanField('Скрыто модератором', default=False)
+    like_count = models.IntegerField('Отметок «нравится»', default=0)
+    archived_at = models.DateTimeField('Дата архивации', auto_now_add=True)
+
+    is_archived = True
+    liked = False
+    _author = None
+    _group = None
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+    def __str__(self):
+        return self.text[:MAX_LENGHT_OF_RETURN_TEXT]
+
+    @property
+    def author(self):
+        if self._author is None:
+            self._author = User.objects.get(pk=self.author_id)
+        return self._author
+
+    @property
+    def group(self):
+        if self._group is None and self.group_id is not None:
+            self._group = Group.objects.filter(pk=self.group_id).first()
+        return self._group
+
+
+class ArchivedComment(models.Model):
+    """Комментарий архивного поста."""
+
+    id = models.IntegerField(primary_key=True)
+    post_id = models.IntegerField('Пост', db_index=True)
+    author_id = models.IntegerField('Автор комментария')
+    text = models.TextField('Текст')
+    pub_date = models.DateTimeField('Дата создания')
+    is_hidden = models.BooleanField('Скрыто модератором', default=False)
+    path = models.CharField(
+        'Путь в ветке', max_length=COMMENT_PATH_LENGTH, blank=True
+    )
+
+    _author = None
+
+    class Meta:
+        ordering = ['path', 'id']
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+
+    @property
+    def author(self):
+        if self._author is None:
+            self._author = User.objects.get(pk=self.author_id)
+        return self._author
+
+    @property
+    def depth(self):
+        return self.path.count('.')
+
+
+class ArchivedPostRevision(models.Model):
+    """Правка архивного поста, перенесённая из PostRevision."""
+
+    id = models.IntegerField(primary_key=True)
+    post_id = models.IntegerField('Пост', db_index=True)
+    version = models.PositiveIntegerField('Версия')
+    created = models.DateTimeField('Дата правки')
+    diff = models.TextField('Изменения')
+
+    class Meta:
+        ordering = ['-version']
+        verbose_name = 'Правка архивного поста'
+        verbose_name_plural = 'Правки архивных постов'
+
+    def __str__(self):
+        return f'{self.post_id} v{self.version}'
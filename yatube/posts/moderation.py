@@ -0,0 +1,144 @@
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import prerender
+from .cache import drop_heads
+from .constants import MODERATION_BATCH_SIZE
+from .models import Comment, Post
+
+
+def iter_id_batches(queryset, batch_size=MODERATION_BATCH_SIZE):
+    """Отдаёт id объектов выборки пачками по возрастанию id."""
+
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def delete_cascade(model, ids):
+    """Удаляет объекты и всё, что на них ссылается, набором
+    DELETE/UPDATE ... WHERE id IN (...), без загрузки объектов и сигналов.
+    Возвращает число удалённых объектов model.
+    """
+
+    if not ids:
+        return 0
+    for relation in model._meta.related_objects:
+        if not relation.on_delete or relation.many_to_many:
+            continue
+        related = relation.related_model._base_manager.filter(
+            **{f'{relation.field.name}__in': ids}
+        )
+        if relation.on_delete is models.CASCADE:
+            delete_cascade(
+                relation.related_model,
+                list(related.values_list('pk', flat=True)),
+            )
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+
+    queryset = model._base_manager.filter(pk__in=ids)
+    return queryset._raw_delete(queryset.db)
+
+
+def _bump_version():
+    """Поля для UPDATE пачки постов: массовая правка тоже меняет версию,
+    иначе открытая форма правки и кеш по версии её не заметят.
+    """
+
+    return {'version': models.F('version') + 1, 'updated_at': timezone.now()}
+
+
+def _posts_changed(post_ids, rows):
+    """Сбрасывает кеш лент и перерисовывает страницы после изменения
+    пачки постов; rows — пары (group_id, author_id) этих постов.
+    """
+
+    group_ids = {group_id for group_id, _ in rows}
+    author_ids = {author_id for _, author_id in rows} - {None}
+    drop_heads(group_ids, author_ids)
+    prerender.refresh(
+        post_ids=post_ids, author_ids=author_ids, group_ids=group_ids
+    )
+
+
+def delete_posts(queryset, batch_size=MODERATION_BATCH_SIZE):
+    """Удаляет посты выборки вместе с комментариями пачками.
+    Кеш лент сбрасывается один раз на пачку.
+    """
+
+    deleted = 0
+    for ids in iter_id_batches(queryset, batch_size):
+        with transaction.atomic():
+            rows = list(
+                Post.objects.filter(pk__in=ids)
+                .values_list('group_id', 'author_id')
+            )
+            deleted += delete_cascade(Post, ids)
+        _posts_changed(ids, rows)
+
+    return deleted
+
+
+def move_posts(queryset, group, batch_size=MODERATION_BATCH_SIZE):
+    """Переносит посты выборки в группу group (None — убрать из групп)."""
+
+    moved = 0
+    new_group_id = group.pk if group else None
+    for ids in iter_id_batches(queryset, batch_size):
+        with transaction.atomic():
+            batch = Post.objects.filter(pk__in=ids)
+            rows = list(batch.values_list('group_id', 'author_id'))
+            moved += batch.update(group=group, **_bump_version())
+        _posts_changed(ids, rows + [(new_group_id, None)])
+
+    return moved
+
+
+def delete_comments(queryset, batch_size=MODERATION_BATCH_SIZE):
+    """Удаляет комментарии выборки пачками."""
+
+    deleted = 0
+    for ids in iter_id_batches(queryset, batch_size):
+        with transaction.atomic():
+            post_ids = set(
+                Comment.objects.filter(pk__in=ids)
+                .values_list('post_id', flat=True)
+            )
+            deleted += delete_cascade(Comment, ids)
+        prerender.refresh(post_ids=post_ids)
+
+    return deleted
+
+
+def set_hidden(queryset, hidden=True, batch_size=MODERATION_BATCH_SIZE):
+    """Скрывает (или снова показывает) посты или комментарии выборки
+    без удаления: одна UPDATE на пачку, без каскадов.
+    """
+
+    model = queryset.model
+    changed = 0
+    for ids in iter_id_batches(queryset.exclude(is_hidden=hidden), batch_size):
+        batch = model.objects.filter(pk__in=ids)
+        if model is Post:
+            rows = list(batch.values_list('group_id', 'author_id'))
+        else:
+            post_ids = set(batch.values_list('post_id', flat=True))
+        changes = {'is_hidden': hidden}
+        if model is Post:
+            changes.update(_bump_version())
+        changed += batch.update(**changes)
+        if model is Post:
+            _posts_changed(ids, rows)
+        else:
+            prerender.refresh(post_ids=post_ids)
+
+    return changed
@@ -0,0 +1,85 @@
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.urls import NoReverseMatch, reverse
+
+from core.prerender import write_pages
+from core.tasks import defer
+from .models import ArchivedPost, Group, Post, User
+
+
+def page(name, **kwargs):
+    """Адрес страницы в том виде, в каком он приходит в request.path_info."""
+
+    return unquote(reverse(f'posts:{name}', kwargs=kwargs))
+
+
+def affected_pages(post_ids=(), author_ids=(), group_ids=(), slugs=()):
+    """Публичные страницы, на которых видны указанные посты, авторы
+    и сообщества: главная, страницы постов, профили и ленты сообществ.
+    Имена и слаги выбираются одним запросом на модель.
+    """
+
+    paths = [page('post_detail', post_id=post_id) for post_id in post_ids]
+    if author_ids or group_ids or slugs:
+        paths.append(page('index'))
+    usernames = User.objects.filter(
+        pk__in=set(author_ids)
+    ).values_list('username', flat=True)
+    paths += [page('profile', username=username) for username in usernames]
+    slugs = set(slugs) | set(Group.objects.filter(
+        pk__in=set(group_ids) - {None}
+    ).values_list('slug', flat=True))
+    for slug in slugs:
+        try:
+            paths.append(page('group_list', slug=slug))
+        except NoReverseMatch:
+            continue
+
+    return paths
+
+
+def _refresh(*args):
+    write_pages(affected_pages(*args))
+
+
+def refresh(post_ids=(), author_ids=(), group_ids=(), slugs=()):
+    """Перерисовывает в фоне только страницы, затронутые изменением:
+    страницы постов post_ids, а если меняются авторы или сообщества,
+    то ещё главную, профили и ленты сообществ (по id или по слагу).
+    Ничего не делает, если PRERENDER_ENABLED выключен.
+    """
+
+    if not settings.PRERENDER_ENABLED:
+        return
+    defer(
+        _refresh,
+        list(post_ids),
+        list(author_ids),
+        list(group_ids),
+        list(slugs),
+    )
+
+
+def all_pages():
+    """Все публичные страницы для полной выгрузки сайта."""
+
+    yield page('index')
+    for slug in Group.objects.values_list('slug', flat=True).iterator():
+        yield page('group_list', slug=slug)
+    usernames = (
+        Post.objects.visible()
+        .order_by()
+        .values_list('author__username', flat=True)
+        .distinct()
+    )
+    for username in usernames.iterator():
+        yield page('profile', username=username)
+    for post_id in Post.objects.visible().values_list(
+        'pk', flat=True
+    ).iterator():
+        yield page('post_detail', post_id=post_id)
+    for post_id in ArchivedPost.objects.filter(is_hidden=False).values_list(
+        'pk', flat=True
+    ).iterator():
+        yield page('post_detail', post_id=post_id)
@@ -0,0 +1,67 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.tasks import every
+from . import prerender
+from .cache import drop_heads
+from .constants import PUBLISH_BATCH_SIZE
+from .models import Post
+from .signals import post_published
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Запускает в процессе фоновый поток, который раз в
+    POSTS_PUBLISH_INTERVAL_SEC публикует наступившие посты.
+    """
+
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = every(settings.POSTS_PUBLISH_INTERVAL_SEC, publish_due)
+
+
+def publish_due(batch_size=PUBLISH_BATCH_SIZE, now=None):
+    """Публикует запланированные посты, время которых наступило, пачками
+    по времени публикации. Посты выбираются по частичному индексу
+    неопубликованных постов, строки пачки блокируются, так что несколько
+    обработчиков не публикуют один пост дважды. Дата публикации поста
+    становится запланированным временем. На пачку — один сброс кеша лент
+    и одна рассылка сигнала post_published. Возвращает число постов.
+    """
+
+    now = now or timezone.now()
+    published = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Post.objects.due(now)
+                .select_for_update(skip_locked=True)
+                .values_list('pk', 'group_id', 'author_id')[:batch_size]
+            )
+            if not rows:
+                return published
+            ids = [pk for pk, _, _ in rows]
+            Post.objects.filter(pk__in=ids).update(
+                is_published=True,
+                pub_date=F('publish_at'),
+                version=F('version') + 1,
+                updated_at=now,
+            )
+
+        group_ids = {group_id for _, group_id, _ in rows}
+        author_ids = {author_id for _, _, author_id in rows}
+        drop_heads(group_ids, author_ids)
+        prerender.refresh(
+            post_ids=ids, author_ids=author_ids, group_ids=group_ids
+        )
+        post_published.send(sender=Post, post_ids=ids)
+        published += len(ids)
+        if len(ids) < batch_size:
+            return published
@@ -0,0 +1,133 @@
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .constants import (
+    RECOMMENDATIONS_BATCH_SIZE, RECOMMENDATIONS_COUNT,
+    RECOMMENDATIONS_GROUP_WEIGHT,
+)
+from .models import Follow, Post, Recommendation
+
+CHUNK_SIZE = 10000
+
+
+def _pairs(queryset, *fields):
+    """Пары id из базы как массив n×2 без промежуточных объектов."""
+
+    rows = queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64)
+
+    return flat.reshape(-1, 2)
+
+
+def _matrix(pairs, shape):
+    """Разреженная матрица смежности из пар: повторы схлопываются в 1."""
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (pairs[:, 0], pairs[:, 1])),
+        shape=shape,
+    )
+    matrix.data[:] = 1
+
+    return matrix
+
+
+def _top(indices, scores, exclude, top_k):
+    """top_k кандидатов по убыванию оценки, кроме id из exclude."""
+
+    keep = ~np.isin(indices, exclude)
+    indices, scores = indices[keep], scores[keep]
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k)[:top_k]
+        indices, scores = indices[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+
+    return indices[order], scores[order]
+
+
+def compute(top_k=RECOMMENDATIONS_COUNT,
+            batch_size=RECOMMENDATIONS_BATCH_SIZE):
+    """Пересчитывает рекомендации авторов для всех пользователей.
+
+    Подписки и сообщества, в которых пишут авторы, загружаются в
+    разреженные матрицы, индексом служит сам id. Оценка кандидата —
+    число авторов пользователя, которые на него подписаны, плюс с весом
+    RECOMMENDATIONS_GROUP_WEIGHT пересечение по сообществам: сообщества
+    авторов пользователя и его собственных постов, где каждое сообщество
+    делит вес поровну между своими авторами. Пользователи считаются
+    пачками по batch_size строк матрицы, рекомендации пачки заменяются
+    в одной транзакции. Возвращает число пользователей с рекомендациями.
+    """
+
+    computed_at = timezone.now()
+    follows = _pairs(Follow.objects.order_by(), 'user_id', 'author_id')
+    groups = _pairs(
+        Post.objects.visible().exclude(group=None).order_by().distinct(),
+        'author_id', 'group_id',
+    )
+    size = int(np.concatenate([follows.ravel(), groups[:, 0], [0]]).max()) + 1
+    group_count = int(groups[:, 1].max(initial=0)) + 1
+
+    following = _matrix(follows, (size, size))
+    membership = _matrix(groups, (size, group_count))
+    group_sizes = np.asarray(membership.sum(axis=0)).ravel()
+    group_sizes[group_sizes == 0] = 1
+    group_authors = (
+        membership @ sparse.diags(1 / group_sizes)
+    ).T.tocsr() * RECOMMENDATIONS_GROUP_WEIGHT
+
+    popular = np.bincount(follows[:, 1], minlength=size).astype(np.float32)
+    _save(None, *_top(
+        np.flatnonzero(popular), popular[popular > 0], [], top_k
+    ), computed_at)
+
+    user_ids = np.unique(np.concatenate([follows[:, 0], groups[:, 0]]))
+    processed = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        rows = following[batch]
+        affinity = rows @ membership + membership[batch]
+        scores = (rows @ following + affinity @ group_authors).tocsr()
+
+        recommendations = []
+        for row, user_id in enumerate(batch):
+            begin, end = scores.indptr[row], scores.indptr[row + 1]
+            exclude = np.append(
+                rows.indices[rows.indptr[row]:rows.indptr[row + 1]], user_id
+            )
+            authors, values = _top(
+                scores.indices[begin:end], scores.data[begin:end],
+                exclude, top_k,
+            )
+            recommendations += _build(user_id, authors, values, computed_at)
+            processed += bool(len(authors))
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=batch.tolist()).delete()
+            Recommendation.objects.bulk_create(recommendations)
+
+    Recommendation.objects.filter(computed_at__lt=computed_at).delete()
+
+    return processed
+
+
+def _build(user_id, authors, scores, computed_at):
+    return [
+        Recommendation(
+            user_id=None if user_id is None else int(user_id),
+            author_id=int(author_id),
+            score=float(score),
+            computed_at=computed_at,
+        )
+        for author_id, score in zip(authors, scores)
+    ]
+
+
+def _save(user_id, authors, scores, computed_at):
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id=user_id).delete()
+        Recommendation.objects.bulk_create(
+            _build(user_id, authors, scores, computed_at)
+        )
@@ -0,0 +1,34 @@
+from django.conf import settings
+
+ARCHIVE_MODELS = {
+    'archivedpost', 'archivedcomment', 'archivedpostrevision',
+}
+
+
+def _is_archive(model):
+    return (
+        model._meta.app_label == 'posts'
+        and model._meta.model_name in ARCHIVE_MODELS
+    )
+
+
+class ArchiveRouter:
+    """Направляет архивные модели в базу POSTS_ARCHIVE_DATABASE.
+    По умолчанию это основная база, но архив можно вынести
+    в отдельный файл SQLite, добавив его в DATABASES.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _is_archive(model):
+            return settings.POSTS_ARCHIVE_DATABASE
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        archive_db = settings.POSTS_ARCHIVE_DATABASE
+        if app_label == 'posts' and model_name in ARCHIVE_MODELS:
+            return db == archive_db
+        if archive_db != 'default' and db == archive_db:
+            return False
+        return None
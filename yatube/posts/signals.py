@@ -0,0 +1,126 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+
+from core.tasks import defer
+from . import duplicates, graph, prerender
+from .cache import (
+    drop_heads, drop_syndication, forget_missing, push_to_heads,
+)
+from .models import Comment, Follow, Group, Post, PostRevision
+from .utils import text_diff
+
+# Отправляется после записи пачки комментариев из журнала
+# (bulk_create не вызывает post_save).
+comments_flushed = Signal(providing_args=['comments'])
+
+# Отправляется после публикации пачки запланированных постов.
+post_published = Signal(providing_args=['post_ids'])
+
+
+def _feed_state(post):
+    return (
+        post.__dict__.get('group_id'),
+        post.__dict__.get('is_hidden'),
+        post.__dict__.get('is_published'),
+    )
+
+
+@receiver(post_init, sender=Post)
+def remember_feed_state(sender, instance, **kwargs):
+    """Запоминает группу, видимость и публикацию поста на момент
+    загрузки, чтобы при сохранении понять, затронуты ли головы лент.
+    """
+
+    instance._loaded_feed_state = _feed_state(instance)
+    instance._loaded_text = instance.__dict__.get('text')
+
+
+@receiver(post_save, sender=Post)
+def save_revision(sender, instance, created, **kwargs):
+    """Сохраняет diff текста поста при каждой правке, которая его
+    меняет. Полный текст хранится только в самом посте.
+    """
+
+    old_text = instance._loaded_text
+    instance._loaded_text = instance.text
+    if created or old_text is None or old_text == instance.text:
+        return
+    PostRevision.objects.create(
+        post=instance,
+        version=instance.version,
+        diff=text_diff(old_text, instance.text),
+    )
+
+
+@receiver(post_save, sender=Post)
+def update_heads(sender, instance, created, **kwargs):
+    """Поддерживает головы лент в актуальном состоянии при создании
+    поста, смене его группы (в том числе из админки) и скрытии
+    модератором. Любая правка сбрасывает готовые ленты для подписчиков
+    и перерисовывает затронутые страницы.
+    """
+
+    group_ids = [instance._loaded_feed_state[0], instance.group_id]
+    if created:
+        push_to_heads(instance)
+        forget_missing('post', instance.pk)
+    elif instance._loaded_feed_state != _feed_state(instance):
+        drop_heads(group_ids, [instance.author_id])
+    else:
+        drop_syndication(group_ids, [instance.author_id])
+    prerender.refresh(
+        post_ids=[instance.pk],
+        author_ids=[instance.author_id],
+        group_ids=group_ids,
+    )
+    instance._loaded_feed_state = _feed_state(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_signature(sender, instance, **kwargs):
+    """Обновляет индекс почти одинаковых постов в фоне."""
+
+    defer(duplicates.index_post, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def drop_heads_on_post_delete(sender, instance, **kwargs):
+    drop_heads([instance.group_id], [instance.author_id])
+    prerender.refresh(
+        post_ids=[instance.pk],
+        author_ids=[instance.author_id],
+        group_ids=[instance.group_id],
+    )
+
+
+@receiver(post_init, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._loaded_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def drop_heads_on_group_change(sender, instance, **kwargs):
+    slugs = {instance.slug, instance._loaded_slug} - {None}
+    drop_heads([instance.pk])
+    forget_missing('group', *slugs)
+    drop_syndication(slugs=slugs)
+    prerender.refresh(slugs=slugs)
+    instance._loaded_slug = instance.slug
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_post_page(sender, instance, **kwargs):
+    prerender.refresh(post_ids=[instance.post_id])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def update_graph(sender, instance, **kwargs):
+    """Сбрасывает графы подписок обоих пользователей и перерисовывает
+    их профили со счётчиками подписчиков и подписок.
+    """
+
+    graph.forget(instance.user_id, instance.author_id)
+    prerender.refresh(author_ids=[instance.user_id, instance.author_id])
@@ -0,0 +1,233 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import paginator as paginator_module
+from core.paginator import EstimatedCountPaginator
+from ..models import Comment, Group, Post, User
+
+
+class AdminChangelistTests(TestCase):
+    """Проверка списков постов и комментариев в админке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='pass',
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count, prefix='author'):
+        for i in range(count):
+            author = User.objects.create_user(username=f'{prefix}_{i}')
+            post = Post.objects.create(
+                author=author,
+                text=f'Пост {i}',
+                group=self.group,
+            )
+            Comment.objects.create(post=post, author=author, text='Коммент')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк на странице."""
+
+        urls = (
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_follow_changelist'),
+        )
+        self.create_posts(2)
+        self.client.get(urls[0])
+        few = [self.count_queries(url) for url in urls]
+        self.create_posts(5, prefix='more')
+
+        self.assertEqual([self.count_queries(url) for url in urls], few)
+
+    def test_search_by_id_and_author(self):
+        """Поиск по «#id» и по «@имя» автора находит нужные посты,
+        а просто число ищется в тексте.
+        """
+
+        self.create_posts(3)
+        post = Post.objects.get(text='Пост 1')
+        number = Post.objects.create(author=self.admin, text='2024')
+        url = reverse('admin:posts_post_changelist')
+
+        by_id = self.client.get(url, {'q': f'#{post.pk}'})
+        by_author = self.client.get(url, {'q': '@author_1'})
+        by_text = self.client.get(url, {'q': '2024'})
+
+        self.assertEqual(list(by_id.context['cl'].result_list), [post])
+        self.assertEqual(list(by_author.context['cl'].result_list), [post])
+        self.assertEqual(list(by_text.context['cl'].result_list), [number])
+
+    def test_exact_count_for_small_table(self):
+        """Для выборки без фильтров маленькой таблицы
+        пагинатор возвращает точное число строк.
+        """
+
+        self.create_posts(3)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+
+        self.assertEqual(paginator.count, 3)
+
+    def test_estimated_count_for_large_table(self):
+        """Для большой таблицы без фильтров пагинатор берёт оценку
+        СУБД без COUNT(*), а для отфильтрованной выборки считает точно.
+        """
+
+        self.create_posts(3)
+        Post.objects.get(text='Пост 1').delete()
+
+        with mock.patch.object(paginator_module, 'ESTIMATE_THRESHOLD', 1):
+            paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+            with CaptureQueriesContext(connection) as queries:
+                estimate = paginator.count
+            exact = EstimatedCountPaginator(
+                Post.objects.filter(group=self.group), 10
+            ).count
+
+        self.assertEqual(estimate, 3)
+        self.assertEqual(exact, 2)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+
+class ModerationTests(TestCase):
+    """Проверка массовой модерации постов и комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='pass',
+        )
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(5):
+            post = Post.objects.create(
+                author=cls.spammer,
+                text=f'Купите слона {i}',
+                group=cls.group,
+            )
+            Comment.objects.create(post=post, author=cls.author, text='?')
+        cls.post = Post.objects.create(author=cls.author, text='Обычный пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_admin_delete_in_batches(self):
+        """Действие админки удаляет посты вместе с комментариями."""
+
+        spam = Post.objects.filter(author=self.spammer)
+        self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'delete_in_batches',
+                '_selected_action': list(spam.values_list('pk', flat=True)),
+            },
+        )
+
+        self.assertEqual(list(Post.objects.all()), [self.post])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_admin_move_to_group(self):
+        """Действие админки переносит посты в выбранную группу
+        и обновляет ленту группы.
+        """
+
+        group_url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.client.get(group_url)
+        self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'move_to_group',
+                '_selected_action': [self.post.pk],
+                'group': self.group.pk,
+            },
+        )
+
+        self.assertEqual(Post.objects.get(pk=self.post.pk).group, self.group)
+        self.assertIn(
+            self.post, self.client.get(group_url).context['page_obj']
+        )
+
+    def test_admin_move_to_unknown_group(self):
+        """Несуществующая или некорректная группа не переносит посты,
+        а действие сообщает об ошибке.
+        """
+
+        post = Post.objects.filter(author=self.spammer).first()
+        model_admin = admin.site._registry[Post]
+        for group in ('0', 'abc'):
+            with self.subTest(group=group):
+                data = {
+                    'action': 'move_to_group',
+                    '_selected_action': [post.pk],
+                    'group': group,
+                }
+                self.client.post(
+                    reverse('admin:posts_post_changelist'), data
+                )
+                request = RequestFactory().post('/', data)
+                request.user = self.admin
+                with mock.patch.object(
+                    model_admin, 'message_user'
+                ) as message_user, mock.patch('posts.admin.defer') as defer:
+                    model_admin.move_to_group(
+                        request, Post.objects.filter(pk=post.pk)
+                    )
+
+                defer.assert_not_called()
+                message_user.assert_called_once_with(
+                    request, 'Выберите существующую группу.', messages.ERROR
+                )
+                self.assertEqual(
+                    Post.objects.get(pk=post.pk).group, self.group
+                )
+
+    def test_moderate_posts_command(self):
+        """Команда удаляет посты по автору и тексту пачками."""
+
+        call_command(
+            'moderate_posts',
+            '--author', 'spammer',
+            '--contains', 'слона',
+            '--delete',
+            '--batch-size', '2',
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(list(Post.objects.all()), [self.post])
+        self.assertFalse(Comment.objects.exists())
@@ -0,0 +1,126 @@
+import json
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.testing import SharedCacheMixin
+from ..models import Group, Post, User
+
+
+class FeedTests(SharedCacheMixin, TestCase):
+    """Проверка RSS/Atom/JSON-лент для агрегаторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.feeds = {
+            'index': reverse('posts:index_feed', args=('rss',)),
+            'group': reverse(
+                'posts:group_feed', args=(self.group.slug, 'atom')
+            ),
+            'author': reverse(
+                'posts:author_feed', args=(self.user.username, 'json')
+            ),
+        }
+
+    def test_feeds_content(self):
+        """Ленты всех форматов содержат посты своей области."""
+
+        for kind, url in self.feeds.items():
+            with self.subTest(kind=kind):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn(self.post.text, response.content.decode())
+
+        items = json.loads(
+            self.client.get(self.feeds['author']).content
+        )['items']
+        self.assertEqual(items[0]['tags'], [self.group.title])
+
+    def test_unknown_feed(self):
+        """Неизвестный формат и несуществующее сообщество дают 404."""
+
+        urls = (
+            reverse('posts:index_feed', args=('xml',)),
+            reverse('posts:group_feed', args=('no-such-group', 'rss')),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_cached_feed_and_conditional_get(self):
+        """Повторный опрос не обращается к базе, а клиент с актуальным
+        ETag или датой получает 304.
+        """
+
+        response = self.client.get(self.feeds['group'])
+
+        with self.assertNumQueries(0):
+            self.client.get(self.feeds['group'])
+
+        for header, value in (
+            ('HTTP_IF_NONE_MATCH', response['ETag']),
+            ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(
+                    self.client.get(
+                        self.feeds['group'], **{header: value}
+                    ).status_code,
+                    HTTPStatus.NOT_MODIFIED,
+                )
+
+    def test_feeds_updated_on_change(self):
+        """Новый пост и правка поста сразу видны во всех лентах."""
+
+        for url in self.feeds.values():
+            self.client.get(url)
+
+        new_post = Post.objects.create(
+            author=self.user,
+            text='Новый пост',
+            group=self.group,
+        )
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+
+        for kind, url in self.feeds.items():
+            with self.subTest(kind=kind):
+                content = self.client.get(url).content.decode()
+                self.assertIn(new_post.text, content)
+                self.assertIn(self.post.text, content)
+
+    def test_feeds_shared_between_processes(self):
+        """Пост, созданный в другом процессе, сразу виден в лентах."""
+
+        for url in self.feeds.values():
+            self.client.get(url)
+        with self.other_process():
+            new_post = Post.objects.create(
+                author=self.user,
+                text='Пост из другого процесса',
+                group=self.group,
+            )
+
+        for kind, url in self.feeds.items():
+            with self.subTest(kind=kind):
+                self.assertIn(
+                    new_post.text, self.client.get(url).content.decode()
+                )
@@ -1,15 +1,30 @@
+import datetime as dt
 import shutil
 import tempfile
+import threading
+from http import HTTPStatus
+from unittest import mock
 
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models.fields.files import FileField, ImageFieldFile
 from django.core.cache import cache
-
-from ..forms import PostForm
-from ..models import Group, Post, User, Comment
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+
+from core.testing import TempDirsMixin
+from .. import comment_queue
+from ..constants import COMMENTS_MAX_DEPTH
+from ..forms import DUPLICATE_MESSAGE, PostForm, VersionConflict
+from ..models import (
+    Comment, CommentQueueBatch, Group, Post, PostSignature, User,
+)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -145,6 +160,64 @@ class PostFormTests(TestCase):
             ).exists()
         )
 
+    def test_edit_keeps_revisions(self):
+        """Правка текста увеличивает версию поста и сохраняет diff
+        в истории правок.
+        """
+
+        url = reverse('posts:post_edit', kwargs={'post_id': self.post.id})
+        self.authorized_client_1.post(url, data={
+            'text': 'Новый текст',
+            'version': self.post.version,
+        })
+
+        post = Post.objects.get(pk=self.post.pk)
+        revision = post.revisions.get()
+        self.assertEqual(post.version, self.post.version + 1)
+        self.assertEqual(revision.version, post.version)
+        self.assertIn(f'-{self.post.text}', revision.diff)
+        self.assertIn('+Новый текст', revision.diff)
+
+    def test_edit_from_stale_version(self):
+        """Правка, начатая со старой версии, не затирает более новую:
+        форма возвращается с ошибкой, пост не меняется.
+        """
+
+        url = reverse('posts:post_edit', kwargs={'post_id': self.post.id})
+        stale_version = self.post.version
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Чужая правка', version=stale_version + 1
+        )
+
+        response = self.authorized_client_1.post(url, data={
+            'text': 'Моя правка',
+            'version': stale_version,
+        })
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).text, 'Чужая правка'
+        )
+
+    def test_concurrent_save_conflict(self):
+        """Если пост изменили между проверкой формы и записью,
+        save() выбрасывает VersionConflict и ничего не пишет.
+        """
+
+        post = Post.objects.get(pk=self.post.pk)
+        form = PostForm(
+            {'text': 'Моя правка', 'version': post.version}, instance=post
+        )
+        self.assertTrue(form.is_valid())
+        Post.objects.filter(pk=post.pk).update(version=post.version + 1)
+
+        with self.assertRaises(VersionConflict):
+            form.save()
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).text, self.post.text
+        )
+
 
 class CommentFormTests(TestCase):
     """Проверка формы отправки комментария."""
@@ -202,3 +275,391 @@ class CommentFormTests(TestCase):
         self.assertEqual(added_comment[0].text, form_data['text'])
         self.assertEqual(added_comment[0].post.id, self.post.id)
         self.assertEqual(added_comment[0].author, self.user)
+
+
+class CommentThreadTests(TestCase):
+    """Проверка веток комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.add_comment_url = reverse('posts:add_comment', args=(cls.post.id,))
+        cls.post_detail_url = reverse(
+            'posts:post_detail', args=(cls.post.id,)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def reply(self, parent, text):
+        data = {'text': text}
+        if parent is not None:
+            data['parent'] = parent.id
+        self.client.post(self.add_comment_url, data=data)
+        return Comment.objects.latest('id')
+
+    def test_reply_builds_path(self):
+        """Ответ получает путь через предков, а ответы глубже
+        COMMENTS_MAX_DEPTH прикрепляются к предку на этой глубине.
+        """
+
+        comment = self.reply(None, 'Корень')
+        chain = [comment]
+        for level in range(COMMENTS_MAX_DEPTH + 1):
+            chain.append(self.reply(chain[-1], f'Ответ {level}'))
+
+        self.assertEqual(chain[1].parent, chain[0])
+        self.assertEqual(
+            chain[2].path, '.'.join(f'{c.id:010d}' for c in chain[:3])
+        )
+        self.assertEqual(
+            [c.depth for c in chain],
+            list(range(COMMENTS_MAX_DEPTH)) + [COMMENTS_MAX_DEPTH - 1] * 2,
+        )
+
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        response = self.client.post(
+            reverse('posts:add_comment', args=(other_post.id,)),
+            data={'text': 'Чужая ветка', 'parent': comment.id},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertFalse(
+            Comment.objects.filter(text='Чужая ветка').exists()
+        )
+
+    def test_path_ready_in_post_save(self):
+        """Обработчики post_save видят уже записанный путь."""
+
+        paths = []
+
+        def remember_path(sender, instance, **kwargs):
+            paths.append((instance.path, Comment.objects.filter(
+                pk=instance.pk
+            ).values_list('path', flat=True).get()))
+
+        post_save.connect(remember_path, sender=Comment)
+        try:
+            comment = self.reply(None, 'Корень')
+        finally:
+            post_save.disconnect(remember_path, sender=Comment)
+
+        self.assertEqual(paths, [(comment.path, comment.path)])
+        self.assertTrue(comment.path)
+
+    def test_threads_load_in_constant_queries(self):
+        """Страница веток выбирается одним и тем же числом запросов при
+        любой глубине, корни получают число ответов.
+        """
+
+        def page_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.post_detail_url)
+            return response, len(queries)
+
+        root = self.reply(None, 'Первый')
+        self.reply(root, 'Ответ')
+        second = self.reply(None, 'Второй')
+        _, shallow = page_queries()
+
+        parent = root
+        for level in range(COMMENTS_MAX_DEPTH):
+            parent = self.reply(parent, f'Глубже {level}')
+        response, deep = page_queries()
+
+        self.assertEqual(shallow, deep)
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments][:3],
+            ['Первый', 'Ответ', 'Глубже 0'],
+        )
+        self.assertEqual(comments[-1], second)
+        self.assertEqual(comments[0].reply_count, COMMENTS_MAX_DEPTH + 1)
+        self.assertEqual(comments[-1].reply_count, 0)
+
+    def test_write_behind_reply(self):
+        """Ответ из журнала получает путь после записи пачкой."""
+
+        queue_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, queue_dir, ignore_errors=True)
+        write_behind = self.settings(
+            COMMENTS_WRITE_BEHIND=True, COMMENTS_QUEUE_DIR=queue_dir
+        )
+        write_behind.enable()
+        self.addCleanup(write_behind.disable)
+        self.addCleanup(comment_queue.stop_flusher)
+        root = self.reply(None, 'Корень')
+        reply = self.reply(root, 'Ответ')
+
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.path, f'{root.path}.{reply.id:010d}')
+
+
+@override_settings(COMMENTS_WRITE_BEHIND=True)
+class WriteBehindCommentTests(TempDirsMixin, TestCase):
+    """Проверка отложенной записи комментариев."""
+
+    temp_dir_settings = ('COMMENTS_QUEUE_DIR',)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='Author')
+        cls.authorized_client = Client()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.authorized_client.force_login(cls.user)
+        cls.other_client = Client()
+        cls.other_client.force_login(cls.author)
+
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+        )
+        cls.add_comment_url = reverse(
+            'posts:add_comment',
+            kwargs={'post_id': cls.post.id}
+        )
+        cls.post_detail_url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': cls.post.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(comment_queue.stop_flusher)
+
+    def test_eager_mode_writes_comment_at_once(self):
+        """Без фонового потока комментарий сразу попадает в базу."""
+
+        with self.settings(BACKGROUND_TASKS_EAGER=True):
+            self.authorized_client.post(
+                self.add_comment_url,
+                data={'text': 'Комментарий'},
+            )
+
+        self.assertTrue(
+            Comment.objects.filter(
+                post=self.post,
+                author=self.user,
+                text='Комментарий',
+            ).exists()
+        )
+
+    @mock.patch.object(comment_queue, '_start_flusher')
+    def test_pending_comment_visible_to_author_until_flush(self, _):
+        """До сброса журнала комментарий виден только его автору,
+        после сброса он записан в базу.
+        """
+
+        with self.settings(BACKGROUND_TASKS_EAGER=False):
+            self.authorized_client.post(
+                self.add_comment_url,
+                data={'text': 'Отложенный комментарий'},
+            )
+
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+        own = self.authorized_client.get(self.post_detail_url)
+        other = self.other_client.get(self.post_detail_url)
+        self.assertEqual(
+            [comment.text for comment in own.context['comments']],
+            ['Отложенный комментарий'],
+        )
+        self.assertEqual(len(other.context['comments']), 0)
+
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(
+            Comment.objects.get(post=self.post).text,
+            'Отложенный комментарий',
+        )
+        self.assertEqual(
+            comment_queue.pending_comments(self.post.id, self.user),
+            [],
+        )
+
+    @mock.patch.object(comment_queue, '_start_flusher')
+    def test_flush_keeps_date_and_is_idempotent(self, _):
+        """Комментарий получает дату из журнала, а сбой после записи
+        пачки, но до удаления файла, не приводит к повторной вставке.
+        """
+
+        written = timezone.now() - dt.timedelta(hours=1)
+        with self.settings(BACKGROUND_TASKS_EAGER=False), mock.patch.object(
+            comment_queue.timezone, 'now', return_value=written
+        ):
+            comment_queue.enqueue(self.post.id, self.user, 'Из журнала')
+
+        with mock.patch.object(
+            comment_queue.os, 'remove', side_effect=OSError
+        ), self.assertRaises(OSError):
+            comment_queue.flush()
+        self.assertEqual(
+            comment_queue.pending_comments(self.post.id, self.user), []
+        )
+        self.assertEqual(comment_queue.flush(), 0)
+
+        comment = Comment.objects.get(post=self.post)
+        self.assertEqual(comment.pub_date, written)
+        self.assertFalse(CommentQueueBatch.objects.exists())
+
+    @mock.patch.object(comment_queue, '_start_flusher')
+    def test_pending_comments_read_from_journal(self, _):
+        """Ожидающие комментарии берутся из общего журнала: одновременные
+        записи не теряются, их видит любой процесс, а после сброса
+        они перестают быть ожидающими.
+        """
+
+        def write(worker):
+            for i in range(5):
+                comment_queue.enqueue(
+                    self.post.id, self.user, f'Поток {worker} {i}'
+                )
+
+        with self.settings(BACKGROUND_TASKS_EAGER=False):
+            workers = [
+                threading.Thread(target=write, args=(worker,))
+                for worker in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        cache.clear()
+
+        self.assertEqual(
+            len(comment_queue.pending_comments(self.post.id, self.user)), 20
+        )
+        self.assertEqual(
+            comment_queue.pending_comments(self.post.id, self.author), []
+        )
+        self.assertEqual(comment_queue.flush(), 20)
+        self.assertEqual(
+            comment_queue.pending_comments(self.post.id, self.user), []
+        )
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 20)
+
+    @mock.patch.object(comment_queue, '_start_flusher')
+    def test_flush_dates_with_foreign_pathless_rows(self, _):
+        """Даты из журнала достаются своим комментариям, даже если
+        в базе есть чужие строки без пути.
+        """
+
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, text='Чужой')
+        ])
+        written = timezone.now() - dt.timedelta(hours=2)
+        with self.settings(BACKGROUND_TASKS_EAGER=False):
+            for hours, text in ((0, 'Старый'), (1, 'Новый')):
+                with mock.patch.object(
+                    comment_queue.timezone, 'now',
+                    return_value=written + dt.timedelta(hours=hours),
+                ):
+                    comment_queue.enqueue(self.post.id, self.user, text)
+
+        self.assertEqual(comment_queue.flush(), 2)
+        dates = dict(
+            Comment.objects.filter(author=self.user).values_list(
+                'text', 'pub_date'
+            )
+        )
+        self.assertEqual(dates, {
+            'Старый': written,
+            'Новый': written + dt.timedelta(hours=1),
+        })
+        self.assertFalse(Comment.objects.filter(path='').exists())
+
+    @override_settings(
+        BACKGROUND_TASKS_EAGER=False, COMMENTS_FLUSH_INTERVAL_SEC=60
+    )
+    def test_stop_flusher(self):
+        """Остановленный фоновый сброс больше не работает с журналом,
+        а следующая запись в журнал запускает его заново.
+        """
+
+        comment_queue.enqueue(self.post.id, self.user, 'Первый')
+        flusher = comment_queue._flusher
+        self.assertTrue(flusher.is_alive())
+
+        comment_queue.stop_flusher()
+
+        self.assertFalse(flusher.is_alive())
+        self.assertIsNone(comment_queue._flusher)
+        comment_queue.enqueue(self.post.id, self.user, 'Второй')
+        self.assertIsNot(comment_queue._flusher, flusher)
+        self.assertEqual(comment_queue.flush(), 2)
+
+
+class DuplicatePostTests(TestCase):
+    """Проверка поиска почти одинаковых постов."""
+
+    SPAM = (
+        'Только сегодня уникальное предложение для всех читателей блога: '
+        'купите наш чудесный крем и помолодейте на десять лет за неделю'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.user = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.original = Post.objects.create(
+            author=self.spammer, text=self.SPAM
+        )
+
+    def test_near_duplicate_rejected(self):
+        """Почти такой же текст форма не принимает, а правка самого
+        поста и непохожий текст проходят проверку.
+        """
+
+        for text, valid in (
+            (self.SPAM.upper() + '!!!', False),
+            (self.SPAM.replace('неделю', 'месяц'), False),
+            ('Совсем другой текст о путешествии по горам Кавказа '
+             'с друзьями прошлым летом', True),
+        ):
+            with self.subTest(text=text):
+                form = PostForm(data={'text': text})
+                self.assertEqual(form.is_valid(), valid)
+                if not valid:
+                    self.assertEqual(form.errors['text'], [DUPLICATE_MESSAGE])
+
+        form = PostForm(
+            data={'text': self.SPAM, 'version': self.original.version},
+            instance=self.original,
+        )
+        self.assertTrue(form.is_valid())
+
+        response = self.client.post(
+            reverse('posts:post_create'), data={'text': self.SPAM}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(Post.objects.filter(text=self.SPAM).count(), 1)
+
+    def test_backfill_builds_clusters(self):
+        """Команда строит индекс заново и собирает похожие посты
+        в кластер с id самого раннего поста.
+        """
+
+        copy = Post.objects.create(author=self.user, text=self.SPAM + '.')
+        PostSignature.objects.all().delete()
+
+        out = StringIO()
+        call_command('index_duplicates', stdout=out)
+        self.assertIn('кластеров: 1', out.getvalue())
+        self.assertEqual(
+            set(PostSignature.objects.values_list('post', 'cluster')),
+            {(self.original.pk, self.original.pk),
+             (copy.pk, self.original.pk)},
+        )
+
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(
+            reverse('admin:posts_postsignature_changelist')
+        )
+        self.assertContains(response, f'?cluster={self.original.pk}')
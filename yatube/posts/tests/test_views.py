@@ -1,17 +1,36 @@
+import datetime as dt
 import shutil
+import sys
 import tempfile
 from http import HTTPStatus
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.db.models.fields.files import FileField, ImageFieldFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-
-from ..constants import NUMBER_OF_POSTS_ON_PAGE, NUMBER_OF_TEST_POSTS
-from ..models import Group, Post, User, Follow, Comment
+from django.utils import timezone
+
+from core.testing import SharedCacheMixin, TempDirsMixin
+from notifications.delivery import deliver_comments
+from .. import graph, likes
+from ..archive import archive_posts
+from ..constants import (
+    LIKE_COUNTER_SHARDS, NUMBER_OF_POSTS_ON_PAGE, NUMBER_OF_TEST_POSTS,
+)
+from ..models import (
+    ArchivedPost, ArchivedPostRevision, Comment, Follow, Group, Like,
+    LikeCounter, Post, PostRevision, Recommendation, User,
+)
+from ..publishing import publish_due
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -380,6 +399,36 @@ class PostPagesTests(TestCase):
             'Кеш не работает, новый пост не появляется на странице'
         )
 
+    def test_post_detail_etag(self):
+        """Страница поста отдаёт ETag: без изменений клиент получает 304,
+        после правки поста, нового комментария или уведомления для шапки —
+        новую страницу.
+        """
+
+        url = self.PAGES_REVERSE['post_detail']
+        etag = self.authorized_client_1.get(url)['ETag']
+        self.assertEqual(
+            self.authorized_client_1.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+
+        changes = (
+            lambda: Post.objects.get(pk=self.post_1.pk).save(),
+            lambda: Comment.objects.create(
+                post=self.post_1, author=self.user_2, text='Ещё комментарий'
+            ),
+            lambda: deliver_comments([(self.post_1.pk, self.user_2.pk)]),
+        )
+        for change in changes:
+            change()
+            response = self.authorized_client_1.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            etag = response['ETag']
+
 
 class FollowTests(TestCase):
     """Проверка функций подписки/отписки. """
@@ -626,3 +675,862 @@ class PaginatorViewsTest(TestCase):
                     len(response.context['page_obj']),
                     NUMBER_OF_TEST_POSTS - NUMBER_OF_POSTS_ON_PAGE,
                 )
+
+
+class GroupFeedTests(SharedCacheMixin, TestCase):
+    """Проверка списка сообществ и закешированных лент сообществ."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+        cls.group_1 = Group.objects.create(
+            title='Тестовая группа1',
+            slug='test-slug1',
+            description='Тестовое описание1',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа2',
+            slug='test-slug2',
+            description='Тестовое описание2',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group_1,
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def group_page(self, group):
+        return self.client.get(
+            reverse('posts:group_list', kwargs={'slug': group.slug})
+        ).context['page_obj']
+
+    def test_group_index_context(self):
+        """На странице сообществ у каждой группы указано число постов."""
+
+        response = self.client.get(reverse('posts:group_index'))
+        counts = {
+            group.slug: group.posts_count
+            for group in response.context['groups']
+        }
+
+        self.assertEqual(
+            counts,
+            {self.group_1.slug: 1, self.group_2.slug: 0},
+        )
+
+    def test_group_head_updates_on_create(self):
+        """Новый пост сразу попадает в закешированную ленту сообщества."""
+
+        self.group_page(self.group_1)
+        new_post = Post.objects.create(
+            author=self.user,
+            text='Новый пост',
+            group=self.group_1,
+        )
+
+        page_obj = self.group_page(self.group_1)
+        self.assertEqual(list(page_obj), [new_post, self.post])
+        self.assertEqual(page_obj.paginator.count, 2)
+
+    def test_group_head_updates_on_group_change(self):
+        """После переноса поста в другую группу ленты обеих групп
+        обновляются.
+        """
+
+        self.group_page(self.group_1)
+        self.group_page(self.group_2)
+
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': self.post.text, 'group': self.group_2.id},
+        )
+
+        self.assertNotIn(self.post, self.group_page(self.group_1))
+        self.assertIn(self.post, self.group_page(self.group_2))
+
+    def test_heads_shared_between_processes(self):
+        """Пост, созданный в другом процессе, сразу виден в ленте
+        сообщества и в списке сообществ этого процесса.
+        """
+
+        self.group_page(self.group_1)
+        self.client.get(reverse('posts:group_index'))
+        with self.other_process():
+            new_post = Post.objects.create(
+                author=self.user,
+                text='Пост из другого процесса',
+                group=self.group_1,
+            )
+
+        page_obj = self.group_page(self.group_1)
+        self.assertEqual(list(page_obj), [new_post, self.post])
+        groups = self.client.get(
+            reverse('posts:group_index')
+        ).context['groups']
+        self.assertEqual(groups[0].posts_count, 2)
+
+
+class SoftDeleteAndArchiveTests(TestCase):
+    """Проверка скрытия постов и архивации старых постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.old_post = Post.objects.create(
+            author=cls.user,
+            text='Старый пост',
+            group=cls.group,
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.old_post,
+            author=cls.user,
+            text='Старый комментарий',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hidden_post_not_shown(self):
+        """Скрытый пост пропадает из лент, а его страница отдаёт 404."""
+
+        post = Post.objects.create(
+            author=self.user,
+            text='Спам',
+            group=self.group,
+        )
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            self.client.get(url)
+        post.is_hidden = True
+        post.save()
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotIn(
+                    post, self.client.get(url).context['page_obj']
+                )
+        cache.clear()
+        self.assertNotIn(
+            post, self.client.get(reverse('posts:index')).context['page_obj']
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_archived_post_served_from_archive(self):
+        """После архивации пост и его комментарии доступны на странице
+        поста и в профиле после живых постов.
+        """
+
+        archive_posts(timezone.now() + dt.timedelta(seconds=1))
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.old_post.id})
+        )
+        self.assertTrue(response.context['is_archived'])
+        self.assertEqual(response.context['post'].text, self.old_post.text)
+        self.assertEqual(response.context['post'].group, self.group)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [self.comment.text],
+        )
+
+        page_obj = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        ).context['page_obj']
+        self.assertEqual(
+            [post.id for post in page_obj],
+            [new_post.id, self.old_post.id],
+        )
+        self.assertEqual(page_obj[1].author, self.user)
+
+    def test_archive_keeps_likes_and_revisions(self):
+        """Архив сохраняет историю правок поста и число его отметок;
+        архивный пост показывает это число без кнопки отметки.
+        """
+
+        post = Post.objects.create(author=self.user, text='Первая версия')
+        post.text = 'Вторая версия'
+        post.save()
+        revision = PostRevision.objects.values(
+            'id', 'version', 'created', 'diff'
+        ).get(post=post)
+        readers = [
+            User.objects.create_user(username=f'Reader{i}') for i in range(2)
+        ]
+        for reader in readers:
+            likes.set_liked(reader, post, True)
+
+        archive_posts(timezone.now() + dt.timedelta(seconds=1))
+
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(ArchivedPost.objects.get(pk=post.pk).like_count, 2)
+        self.assertEqual(
+            list(ArchivedPostRevision.objects.filter(post_id=post.pk).values(
+                'id', 'version', 'created', 'diff'
+            )),
+            [revision],
+        )
+        self.client.force_login(readers[0])
+        urls = (
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '♥ 2')
+                self.assertNotContains(
+                    response, reverse('posts:post_like', args=(post.pk,))
+                )
+
+
+@override_settings(PRERENDER_ENABLED=True)
+class PrerenderTests(TempDirsMixin, TestCase):
+    """Проверка заранее отрисованных страниц для анонимных посетителей."""
+
+    temp_dir_settings = ('PRERENDER_ROOT',)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            group=self.group,
+        )
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_pages_written_and_served(self):
+        """Новый пост сразу попадает на все публичные страницы на диске,
+        и анонимный посетитель получает их без вызова представлений.
+        """
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIsNone(response.context)
+                self.assertIn(self.post.text, response.content.decode())
+
+    def test_authorized_user_gets_view(self):
+        """Авторизованному пользователю страница рисуется как обычно."""
+
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(self.urls[-1])
+
+        self.assertIsNotNone(response.context)
+        self.assertIn('form', response.context)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304."""
+
+        etag = self.client.get(self.urls[0])['ETag']
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_follow_refreshes_profiles(self):
+        """Подписка перерисовывает профили обоих пользователей
+        с новыми счётчиками.
+        """
+
+        follower = User.objects.create_user(username='Follower')
+        Follow.objects.create(user=follower, author=self.user)
+
+        profile = self.client.get(self.urls[2]).content.decode()
+        self.assertIn('Всего подписчиков: 1', profile)
+        self.assertIn(
+            'Всего подписок: 1',
+            self.client.get(
+                reverse('posts:profile', args=(follower.username,))
+            ).content.decode(),
+        )
+
+    def test_like_refreshes_pages(self):
+        """Отметка «нравится» перерисовывает страницы с постом, и аноним
+        видит новое число отметок.
+        """
+
+        liker = Client()
+        liker.force_login(self.user)
+        liker.post(reverse('posts:post_like', args=(self.post.id,)))
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNone(response.context)
+                self.assertContains(response, '♥ 1')
+
+    def test_incremental_updates(self):
+        """Комментарий перерисовывает страницу поста, а удалённый пост
+        пропадает с диска и из лент.
+        """
+
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий'
+        )
+        self.assertIn(
+            'Новый комментарий',
+            self.client.get(self.urls[-1]).content.decode(),
+        )
+
+        self.post.delete()
+
+        response = self.client.get(self.urls[-1])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        for url in self.urls[:-1]:
+            with self.subTest(url=url):
+                self.assertNotIn(
+                    self.post.text, self.client.get(url).content.decode()
+                )
+
+
+class ScheduledPublishingTests(TestCase):
+    """Проверка отложенной публикации постов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='TestReader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_scheduled_post_published_when_due(self):
+        """Запланированный пост не виден до публикации, затем попадает
+        в ленты с датой публикации из расписания, а подписчики получают
+        уведомление.
+        """
+
+        publish_at = timezone.now() + dt.timedelta(hours=1)
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост по расписанию',
+            'publish_at': publish_at.strftime('%Y-%m-%d %H:%M'),
+        })
+        post = Post.objects.get(text='Пост по расписанию')
+        profile_url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+
+        response = self.client.get(profile_url)
+        self.assertNotIn(post, response.context['page_obj'])
+        self.assertIn(post, response.context['scheduled'])
+        self.assertEqual(publish_due(), 0)
+        self.assertFalse(self.reader.notifications.exists())
+
+        self.assertEqual(publish_due(now=publish_at), 1)
+
+        post.refresh_from_db()
+        self.assertEqual(post.pub_date, post.publish_at)
+        self.assertIn(
+            post, self.client.get(profile_url).context['page_obj']
+        )
+        self.assertEqual(self.reader.notifications.get().post, post)
+
+    def test_profile_count_hides_scheduled(self):
+        """Число постов на странице автора не учитывает запланированные
+        и скрытые посты.
+        """
+
+        Post.objects.create(author=self.user, text='Опубликованный')
+        Post.objects.create(
+            author=self.user, text='Запланированный', is_published=False,
+            publish_at=timezone.now() + dt.timedelta(hours=1),
+        )
+        Post.objects.create(author=self.user, text='Скрытый', is_hidden=True)
+
+        self.client.logout()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        )
+
+        self.assertContains(response, 'Всего постов: 1 ')
+
+    def test_post_detail_count_hides_scheduled(self):
+        """Число постов автора на странице поста не учитывает
+        запланированные и скрытые посты.
+        """
+
+        post = Post.objects.create(author=self.user, text='Опубликованный')
+        Post.objects.create(
+            author=self.user, text='Запланированный', is_published=False,
+            publish_at=timezone.now() + dt.timedelta(hours=1),
+        )
+        Post.objects.create(author=self.user, text='Скрытый', is_hidden=True)
+
+        self.client.logout()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+
+        self.assertContains(response, 'Всего постов автора: 1\n')
+
+    def test_wsgi_starts_publish_worker(self):
+        """Поток публикации запускается при загрузке WSGI-приложения,
+        а не только после создания нового запланированного поста.
+        """
+
+        for enabled in (True, False):
+            with self.subTest(enabled=enabled), self.settings(
+                POSTS_PUBLISH_WORKER=enabled
+            ), mock.patch('posts.publishing.start_worker') as start_worker:
+                sys.modules.pop('yatube.wsgi', None)
+                import_module('yatube.wsgi')
+                self.assertEqual(start_worker.called, enabled)
+
+    def test_publish_time_in_past(self):
+        """Время публикации в прошлом не принимается."""
+
+        response = self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост в прошлое',
+            'publish_at': '2000-01-01 00:00',
+        })
+
+        self.assertTrue(response.context['schedule_form'].errors)
+        self.assertFalse(Post.objects.filter(text='Пост в прошлое').exists())
+
+
+class TemplateBenchmarkTests(TestCase):
+    """Проверка команды замера отрисовки шаблонов."""
+
+    def test_bench_templates(self):
+        """Команда выводит время отрисовки каждой страницы со списком."""
+
+        user = User.objects.create_user(username='TestUser')
+        group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        Post.objects.create(author=user, text='Тестовый пост', group=group)
+        out = StringIO()
+
+        call_command('bench_templates', repeat=2, cold_cache=True, stdout=out)
+
+        for name in ('index', 'follow', 'group_list', 'profile'):
+            with self.subTest(name=name):
+                self.assertIn(name, out.getvalue())
+
+
+class MissingObjectsTests(SharedCacheMixin, TestCase):
+    """Проверка отрицательного кеша несуществующих страниц."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_repeated_missing_pages_skip_database(self):
+        """Повторный запрос несуществующего профиля, сообщества или поста
+        отвечает 404 без запросов к базе, а появившийся объект сразу
+        становится доступен.
+        """
+
+        urls = {
+            'profile': reverse('posts:profile', args=('ghost',)),
+            'group': reverse('posts:group_list', args=('ghost',)),
+            'post': reverse('posts:post_detail', args=(1000,)),
+        }
+        for kind, url in urls.items():
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+                )
+                with self.assertNumQueries(0):
+                    self.assertEqual(
+                        self.client.get(url).status_code,
+                        HTTPStatus.NOT_FOUND,
+                    )
+
+        user = User.objects.create_user(username='ghost')
+        Group.objects.create(title='Призраки', slug='ghost', description='-')
+        Post.objects.create(id=1000, author=user, text='Пост-призрак')
+
+        for kind, url in urls.items():
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.OK
+                )
+
+    def test_created_in_other_process(self):
+        """Объект, созданный в другом процессе, сразу доступен в этом,
+        даже если его отсутствие уже было запомнено.
+        """
+
+        urls = {
+            'profile': reverse('posts:profile', args=('ghost',)),
+            'group': reverse('posts:group_list', args=('ghost',)),
+            'post': reverse('posts:post_detail', args=(1000,)),
+        }
+        for url in urls.values():
+            self.client.get(url)
+        with self.other_process():
+            user = User.objects.create_user(username='ghost')
+            Group.objects.create(
+                title='Призраки', slug='ghost', description='-'
+            )
+            Post.objects.create(id=1000, author=user, text='Пост-призрак')
+
+        for kind, url in urls.items():
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.OK
+                )
+
+
+class SocialGraphTests(SharedCacheMixin, TestCase):
+    """Проверка списков подписчиков, подписок и рекомендаций авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(5)
+        ]
+        me, friend, other, popular, unknown = cls.users
+        Follow.objects.bulk_create([
+            Follow(user=me, author=friend),
+            Follow(user=me, author=other),
+            Follow(user=friend, author=me),
+            Follow(user=friend, author=popular),
+            Follow(user=friend, author=other),
+            Follow(user=other, author=popular),
+            Follow(user=other, author=unknown),
+        ])
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.me, self.friend, self.other, self.popular, _ = self.users
+        self.client.force_login(self.me)
+
+    def test_graph_queries(self):
+        """Граф отдаёт подписки, подписчиков, взаимные подписки
+        и рекомендации; повторные запросы не обращаются к базе.
+        """
+
+        self.assertEqual(
+            list(graph.following(self.me.pk)),
+            [self.friend.pk, self.other.pk],
+        )
+        self.assertEqual(list(graph.followers(self.me.pk)), [self.friend.pk])
+        self.assertEqual(graph.mutual(self.me.pk), [self.friend.pk])
+        self.assertEqual(
+            graph.common_following(self.friend.pk, self.other.pk),
+            [self.popular.pk],
+        )
+        self.assertEqual(graph.suggestions(self.me.pk)[0], self.popular.pk)
+        with self.assertNumQueries(0):
+            graph.suggestions(self.me.pk)
+
+    def test_profile_counts(self):
+        """Профиль показывает число подписчиков и подписок; без общего
+        кеша они считаются через COUNT, а не загрузкой списков.
+        """
+
+        url = reverse('posts:profile', args=(self.friend.username,))
+        for shared, count_queries in (('shared', 0), ('default', 2)):
+            with self.subTest(shared=shared), override_settings(
+                SHARED_CACHE=shared
+            ), CaptureQueriesContext(connection) as queries:
+                context = self.client.get(url).context
+                self.assertEqual(context['followers_count'], 1)
+                self.assertEqual(context['following_count'], 3)
+                self.assertEqual(count_queries, sum(
+                    'COUNT' in query['sql'] and 'posts_follow' in query['sql']
+                    for query in queries
+                ))
+
+    def test_graph_updated_on_follow(self):
+        """Подписка и отписка сразу видны в графе."""
+
+        graph.following(self.me.pk)
+        graph.followers(self.popular.pk)
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.popular.username,))
+        )
+        self.assertIn(self.popular.pk, graph.following(self.me.pk))
+        self.assertIn(self.me.pk, graph.followers(self.popular.pk))
+        self.assertNotIn(self.popular.pk, graph.suggestions(self.me.pk))
+
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.popular.username,))
+        )
+        self.assertNotIn(self.popular.pk, graph.following(self.me.pk))
+        self.assertNotIn(self.me.pk, graph.followers(self.popular.pk))
+
+    def test_follow_state_read_from_database(self):
+        """Кнопка подписки показывает подписку, сделанную в другом
+        процессе, даже если граф в кеше ещё старый.
+        """
+
+        url = reverse('posts:profile', args=(self.popular.username,))
+        self.assertFalse(self.client.get(url).context['following'])
+        Follow.objects.bulk_create([Follow(user=self.me, author=self.popular)])
+
+        self.assertTrue(self.client.get(url).context['following'])
+
+    def test_user_list_pages(self):
+        """Страницы подписчиков, подписок и общих подписок показывают
+        нужных пользователей, а лента подписок — рекомендации.
+        """
+
+        pages = {
+            'followers': (self.me, [self.friend]),
+            'following': (self.me, [self.friend, self.other]),
+            'common_following': (self.friend, [self.other]),
+        }
+        for name, (author, expected) in pages.items():
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse(f'posts:{name}', args=(author.username,))
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(
+                    list(response.context['page_obj']), expected
+                )
+
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'][0], self.popular)
+
+
+class RecommendationTests(TestCase):
+    """Проверка пакетного расчёта рекомендаций авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.me, cls.friend, cls.popular, cls.neighbour, cls.newbie = [
+            User.objects.create_user(username=name) for name in (
+                'me', 'friend', 'popular', 'neighbour', 'newbie',
+            )
+        ]
+        group = Group.objects.create(
+            title='Сообщество', slug='community', description='-'
+        )
+        Post.objects.create(author=cls.me, text='Мой пост', group=group)
+        Post.objects.create(
+            author=cls.neighbour, text='Пост соседа', group=group
+        )
+        Follow.objects.bulk_create([
+            Follow(user=cls.me, author=cls.friend),
+            Follow(user=cls.friend, author=cls.popular),
+            Follow(user=cls.neighbour, author=cls.popular),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_recommendations_computed(self):
+        """Команда рекомендует подписки подписок и соседей по
+        сообществам, а новичкам — популярных авторов.
+        """
+
+        out = StringIO()
+        call_command('recommend_authors', stdout=out)
+        self.assertIn('Рекомендации посчитаны', out.getvalue())
+
+        self.assertEqual(
+            list(Recommendation.objects.filter(
+                user=self.me
+            ).values_list('author', flat=True)),
+            [self.popular.pk, self.neighbour.pk],
+        )
+        self.assertEqual(
+            Recommendation.objects.filter(user=None).first().author,
+            self.popular,
+        )
+
+        for user, expected in (
+            (self.me, [self.popular, self.neighbour]),
+            (self.newbie, [self.popular, self.friend]),
+        ):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                response = self.client.get(reverse('posts:follow_index'))
+                self.assertEqual(response.context['suggestions'], expected)
+
+    def test_followed_author_not_recommended(self):
+        """Автор, на которого подписались после расчёта, пропадает
+        из рекомендаций, а повторный расчёт их обновляет.
+        """
+
+        call_command('recommend_authors', stdout=StringIO())
+        Follow.objects.create(user=self.me, author=self.popular)
+        self.assertEqual(
+            graph.recommended_authors(self.me), [self.neighbour]
+        )
+
+        call_command('recommend_authors', stdout=StringIO())
+        self.assertFalse(Recommendation.objects.filter(
+            user=self.me, author=self.popular
+        ).exists())
+
+
+class LikeTests(TestCase):
+    """Проверка отметок «нравится» и шардированных счётчиков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.like_url = reverse('posts:post_like', args=(cls.post.id,))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_like_is_idempotent(self):
+        """Повторная отметка и повторное снятие ничего не меняют."""
+
+        index_url = reverse('posts:index')
+        for liked, expected in (('1', 1), ('1', 1), ('0', 0), ('0', 0)):
+            with self.subTest(liked=liked):
+                response = self.client.post(
+                    self.like_url, data={'liked': liked, 'next': index_url}
+                )
+                self.assertRedirects(response, index_url)
+                self.assertEqual(Like.objects.count(), expected)
+                self.assertEqual(
+                    sum(LikeCounter.objects.values_list('count', flat=True)),
+                    expected,
+                )
+
+        response = self.client.post(
+            self.like_url,
+            data={'liked': '1', 'next': 'https://evil.example/'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json(), {'liked': True, 'count': 1})
+
+    def test_cached_index_shows_current_like(self):
+        """Главная под cache_page после отметки и её снятия показывает
+        текущее состояние кнопки, а число запросов не растёт с числом
+        карточек.
+        """
+
+        index_url = reverse('posts:index')
+        self.client.get(index_url)
+        for liked, button, count in (('1', 'btn-primary', 1),
+                                     ('0', 'btn-light', 0)):
+            with self.subTest(liked=liked):
+                response = self.client.post(
+                    self.like_url,
+                    data={'liked': liked, 'next': index_url},
+                    follow=True,
+                )
+                self.assertTemplateNotUsed(response, 'posts/index.html')
+                content = response.content.decode()
+                self.assertIn(button, content)
+                self.assertIn(f'♥ {count}', content)
+                self.assertIn(
+                    f'name="liked" value="{1 - count}"', content
+                )
+                self.assertNotIn('<!-- like:', content)
+
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(index_url)
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Пост {number}')
+            for number in range(5)
+        ])
+        cache.clear()
+        self.client.get(index_url)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(index_url)
+        self.assertEqual(len(single), len(many))
+
+    def test_counters_sharded(self):
+        """Отметки разных пользователей расходятся по нескольким строкам
+        счётчиков, а сумма сходится с числом отметок.
+        """
+
+        users = [
+            User.objects.create_user(username=f'fan{number}')
+            for number in range(30)
+        ]
+        for user in users:
+            self.client.force_login(user)
+            self.client.post(self.like_url, data={'liked': '1'})
+
+        counters = LikeCounter.objects.filter(post=self.post)
+        self.assertLessEqual(counters.count(), LIKE_COUNTER_SHARDS)
+        self.assertGreater(counters.count(), 1)
+        self.assertEqual(
+            sum(counters.values_list('count', flat=True)), len(users)
+        )
+
+    def test_cards_show_counts_without_per_card_queries(self):
+        """Число запросов на странице постов не зависит от числа
+        карточек, а страница поста после отметки не отдаёт 304.
+        """
+
+        def index_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse('posts:profile', args=(self.user.username,))
+                )
+            return response, len(queries)
+
+        self.client.post(self.like_url, data={'liked': '1'})
+        _, single = index_queries()
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Пост {number}')
+            for number in range(5)
+        ])
+        response, many = index_queries()
+
+        self.assertEqual(single, many)
+        counts = {
+            post.pk: (post.like_count, post.liked)
+            for post in response.context['page_obj']
+        }
+        self.assertEqual(counts[self.post.pk], (1, True))
+
+        detail_url = reverse('posts:post_detail', args=(self.post.id,))
+        etag = self.client.get(detail_url)['ETag']
+        self.client.post(self.like_url, data={'liked': '0'})
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.OK,
+        )
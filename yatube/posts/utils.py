@@ -1,4 +1,7 @@
+import difflib
+
 from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
 from .constants import NUMBER_OF_POSTS_ON_PAGE
 
@@ -11,3 +14,152 @@ def get_page(request, post_list):
     page_obj = paginator.get_page(page_number)
 
     return page_obj
+
+
+class CachedFeed:
+    """Список постов для пагинатора поверх закешированной головы ленты.
+    Страницы, попадающие в голову, собираются по id одним запросом,
+    более глубокие страницы берутся из базы обычной выборкой.
+    """
+
+    def __init__(self, head, queryset):
+        self.ids = head['ids']
+        self.total = head['count']
+        self.queryset = queryset
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        start = key.start or 0
+        stop = self.total if key.stop is None else key.stop
+        if stop <= len(self.ids):
+            ids = self.ids[start:stop]
+            posts = self.queryset.in_bulk(ids)
+            return [posts[pk] for pk in ids if pk in posts]
+
+        return list(self.queryset[key])
+
+
+class UserList:
+    """Список пользователей для пагинатора поверх массива id из графа
+    подписок: страница собирается по id одним запросом.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        ids = list(self.ids[key])
+        users = self.queryset.in_bulk(ids)
+        return [users[pk] for pk in ids if pk in users]
+
+
+class CommentThreads:
+    """Ветки комментариев для пагинатора: страница — это корневые
+    комментарии вместе со всеми ответами любой глубины в порядке
+    обхода в глубину. Корни страницы идут подряд по пути, поэтому их
+    ветки выбираются одним запросом по диапазону путей. Корням
+    проставляется reply_count — число видимых ответов в ветке.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @cached_property
+    def roots(self):
+        return self.queryset.filter(parent=None).order_by('path')
+
+    def count(self):
+        return self.roots.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        paths = list(self.roots.values_list('path', flat=True)[key])
+        if not paths:
+            return []
+        roots = set(paths)
+        comments = [
+            comment for comment in self.queryset.filter(
+                path__gte=paths[0], path__lt=paths[-1] + '/'
+            ).order_by('path')
+            if comment.path.split('.', 1)[0] in roots
+        ]
+        current = None
+        for comment in comments:
+            if comment.path in roots:
+                current = comment
+                current.reply_count = 0
+            elif current is not None:
+                current.reply_count += 1
+
+        return comments
+
+
+class ArchiveFallbackFeed:
+    """Список постов для пагинатора, который после живых постов
+    продолжается архивными. prepare вызывается для каждой выбранной
+    пачки архивных постов, например чтобы подставить авторов.
+    """
+
+    def __init__(self, queryset, archived, prepare=None):
+        self.queryset = queryset
+        self.archived = archived
+        self.prepare = prepare or (lambda posts: posts)
+
+    @cached_property
+    def live_count(self):
+        return self.queryset.count()
+
+    def count(self):
+        return self.live_count + self.archived.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        start = key.start or 0
+        stop = key.stop
+        posts = []
+        if start < self.live_count:
+            posts = list(self.queryset[start:stop])
+        if stop is None or stop > self.live_count:
+            archived = self.archived[
+                max(start - self.live_count, 0):
+                None if stop is None else stop - self.live_count
+            ]
+            posts += self.prepare(list(archived))
+
+        return posts
+
+
+def text_diff(old, new):
+    """Компактный построчный diff двух текстов: только изменённые строки
+    с маркерами hunk'ов, без контекста и заголовков файлов.
+    """
+
+    lines = difflib.unified_diff(
+        old.splitlines(), new.splitlines(), n=0, lineterm=''
+    )
+
+    return '\n'.join(line for line in lines if not line.startswith(
+        ('---', '+++')
+    ))
@@ -1,20 +1,57 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Count, Exists, Max, OuterRef, Q
+from django.utils.http import is_safe_url
 from django.views.decorators.cache import cache_page
-
-from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
-from .utils import get_page
+from django.views.decorators.http import condition, require_POST
+
+from core.ratelimit import ratelimit
+from notifications.delivery import unread_count
+from users.cache import get_user_or_404, resolve_username
+from . import comment_queue, graph, likes
+from .archive import attach_related, get_archived_post
+from .cache import (
+    get_author_head, get_group_head, get_group_list, get_or_404, is_missing,
+    remember_missing,
+)
+from .forms import (
+    VERSION_CONFLICT_MESSAGE, CommentForm, PostForm, ScheduleForm,
+    VersionConflict,
+)
+from .models import ArchivedPost, Group, Like, Post, User, Follow
+from .utils import (
+    ArchiveFallbackFeed, CachedFeed, CommentThreads, UserList, get_page,
+)
 from .constants import CASH_TIME_SEC
 
 
+def _post_page(request, post_list):
+    """Страница постов с отметками «нравится» для карточек. Под
+    likes.deferred отметки подставляются после отрисовки.
+    """
+
+    page_obj = get_page(request, post_list)
+    if not getattr(request, 'likes_deferred', False):
+        page_obj.object_list = likes.attach(
+            page_obj.object_list, request.user
+        )
+
+    return page_obj
+
+
+@likes.deferred
 @cache_page(CASH_TIME_SEC, key_prefix='index_page')
 def index(request):
     """Главная страница."""
 
     template = 'posts/index.html'
-    post_list = Post.objects.select_related('group', 'author').all()
-    page_obj = get_page(request, post_list)
+    post_list = Post.objects.visible().select_related('group', 'author')
+    page_obj = _post_page(request, post_list)
     context = {
         'page_obj': page_obj,
     }
@@ -26,9 +63,12 @@ def group_posts(request, slug):
     """Страница сообщества."""
 
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author')
-    page_obj = get_page(request, post_list)
+    group = get_or_404('group', Group.objects, slug=slug)
+    post_list = CachedFeed(
+        get_group_head(group),
+        group.posts.visible().select_related('author'),
+    )
+    page_obj = _post_page(request, post_list)
 
     context = {
         'group': group,
@@ -38,13 +78,28 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+def group_index(request):
+    """Список сообществ с числом постов в каждом."""
+
+    template = 'posts/group_index.html'
+    context = {
+        'groups': get_group_list(),
+    }
+
+    return render(request, template, context)
+
+
 def profile(request, username):
     """Персональная страница пользователя."""
 
     template = 'posts/profile.html'
-    author = User.objects.get(username=username)
-    post_list = author.posts.select_related('group')
-    page_obj = get_page(request, post_list)
+    author = get_user_or_404(username)
+    post_list = ArchiveFallbackFeed(
+        author.posts.visible().select_related('group'),
+        ArchivedPost.objects.filter(author_id=author.pk, is_hidden=False),
+        prepare=lambda posts: attach_related(posts, author=author),
+    )
+    page_obj = _post_page(request, post_list)
 
     following = (
         request.user.is_authenticated
@@ -52,54 +107,196 @@ def profile(request, username):
         and Follow.objects.filter(user=request.user, author=author).exists()
     )
 
+    scheduled = []
+    if request.user == author:
+        scheduled = author.posts.filter(
+            is_published=False, is_hidden=False
+        ).order_by('publish_at')
+
     context = {
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'followers_count': graph.followers_count(author.pk),
+        'following_count': graph.following_count(author.pk),
+        'scheduled': scheduled,
+    }
+
+    return render(request, template, context)
+
+
+def _user_list(request, author, ids, title):
+    template = 'posts/user_list.html'
+    page_obj = get_page(request, UserList(ids, User.objects))
+    context = {
+        'author': author,
+        'page_obj': page_obj,
+        'title': title,
     }
 
     return render(request, template, context)
 
 
+def followers(request, username):
+    """Подписчики пользователя."""
+
+    author = get_user_or_404(username)
+    return _user_list(
+        request, author, graph.followers(author.pk), 'Подписчики'
+    )
+
+
+def following(request, username):
+    """Авторы, на которых подписан пользователь."""
+
+    author = get_user_or_404(username)
+    return _user_list(
+        request, author, graph.following(author.pk), 'Подписки'
+    )
+
+
+@login_required
+def common_following(request, username):
+    """Авторы, на которых подписаны и пользователь, и текущий посетитель."""
+
+    author = get_user_or_404(username)
+    return _user_list(
+        request,
+        author,
+        graph.common_following(request.user.pk, author.pk),
+        'Вы оба подписаны',
+    )
+
+
+def post_etag(request, post_id):
+    """ETag страницы поста: версия поста, его видимые комментарии, число
+    постов автора, отметки «нравится» и пользователь вместе с
+    CSRF-cookie формы комментария и счётчиком уведомлений в шапке.
+    Состояние поста читается одним запросом; для архивных постов
+    ETag не вычисляется.
+    """
+
+    if is_missing('post', post_id):
+        return None
+    visible_comments = Q(comments__is_hidden=False)
+    state = Post.objects.visible().filter(pk=post_id).annotate(
+        last_comment=Max('comments__id', filter=visible_comments),
+        comments_count=Count('comments', filter=visible_comments),
+        liked=Exists(Like.objects.filter(
+            post=OuterRef('pk'), user_id=request.user.pk
+        )),
+    ).values_list(
+        'version', 'last_comment', 'comments_count', 'author_id', 'liked'
+    ).first()
+    if state is None:
+        return None
+
+    pending = 0
+    if settings.COMMENTS_WRITE_BEHIND:
+        pending = len(comment_queue.pending_comments(post_id, request.user))
+    csrf_secret = ''
+    unread = 0
+    if request.user.is_authenticated:
+        get_token(request)
+        csrf_secret = request.META['CSRF_COOKIE']
+        unread = unread_count(request.user)
+    author_posts = get_author_head(User(pk=state[3]))['count']
+    like_count = likes.counts([post_id])[post_id]
+    key = (
+        f'{post_id}:{state}:{pending}:{author_posts}:{like_count}:'
+        f'{request.user.pk}:{csrf_secret}:{unread}'
+    )
+
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    """Страница просмотра отдельного поста."""
+    """Страница просмотра отдельного поста. Если пост перенесён в архив,
+    он показывается из архива без формы комментария. Несуществующие id
+    попадают в отрицательный кеш; скрытые и отложенные посты — нет.
+    Комментарии выводятся ветками по страницам корневых комментариев.
+    """
 
     template = 'posts/post_detail.html'
-    post = get_object_or_404(
-        Post.objects.select_related(
-            'group',
-            'author'
-        ), id=post_id
+    if is_missing('post', post_id):
+        raise Http404
+    post = Post.objects.visible().select_related(
+        'group',
+        'author'
+    ).filter(id=post_id).first()
+    if post is None:
+        post, comments = get_archived_post(post_id)
+        if post is None:
+            remember_missing('post', post_id, lambda: (
+                Post.objects.filter(pk=post_id).exists()
+                or ArchivedPost.objects.filter(pk=post_id).exists()
+            ))
+            raise Http404
+        likes.attach([post], request.user)
+        context = {
+            'post': post,
+            'author_posts': get_author_head(post.author)['count'],
+            'comments': comments,
+            'is_archived': True,
+        }
+        return render(request, template, context)
+
+    likes.attach([post], request.user)
+    threads = CommentThreads(
+        post.comments.visible().select_related('author')
+    )
+    page_obj = get_page(request, threads)
+    comments = list(page_obj)
+    if settings.COMMENTS_WRITE_BEHIND:
+        comments += comment_queue.pending_comments(post.id, request.user)
+    reply_to = next(
+        (
+            comment for comment in comments
+            if str(comment.pk) == request.GET.get('reply_to')
+        ),
+        None,
     )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
     context = {
         'post': post,
+        'author_posts': get_author_head(post.author)['count'],
         'form': form,
         'comments': comments,
+        'page_obj': page_obj,
+        'reply_to': reply_to,
     }
 
     return render(request, template, context)
 
 
 @login_required
+@ratelimit('post_create')
 def post_create(request):
-    """Страница для создания новой записи."""
+    """Страница для создания новой записи. Публикацию можно отложить:
+    запланированный пост публикует фоновый поток веб-процесса или команда
+    publish_scheduled --loop.
+    """
 
     template = 'posts/create_post.html'
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
     )
-    if request.method == 'POST' and form.is_valid():
+    schedule_form = ScheduleForm(request.POST or None)
+    if request.method == 'POST' and all(
+        [form.is_valid(), schedule_form.is_valid()]
+    ):
         post = form.save(commit=False)
         post.author = request.user
+        schedule_form.schedule(post)
         form.save()
 
         return redirect('posts:profile', request.user)
 
     context = {
         'form': form,
+        'schedule_form': schedule_form,
     }
 
     return render(request, template, context)
@@ -107,7 +304,10 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    """Страница для редактирования поста."""
+    """Страница для редактирования поста. Правка, начатая со старой
+    версии поста, не затирает чужие изменения, а возвращает форму
+    с ошибкой.
+    """
 
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, id=post_id)
@@ -121,10 +321,14 @@ def post_edit(request, post_id):
         instance=post
     )
     if request.method == 'POST' and form.is_valid():
-        post = form.save(commit=False)
-        form.save()
-
-        return redirect('posts:post_detail', post.id)
+        try:
+            post = form.save()
+        except VersionConflict:
+            form.add_error(None, VERSION_CONFLICT_MESSAGE)
+        else:
+            if not post.is_published:
+                return redirect('posts:profile', request.user)
+            return redirect('posts:post_detail', post.id)
 
     context = {
         'form': form,
@@ -136,44 +340,96 @@ def post_edit(request, post_id):
 
 
 @login_required
+@ratelimit('add_comment')
 def add_comment(request, post_id):
-
-    post = get_object_or_404(Post, id=post_id)
-    form = CommentForm(request.POST or None)
-    if form.is_valid():
+    """Добавление комментария или ответа на комментарий. При
+    COMMENTS_WRITE_BEHIND комментарий попадает в журнал и записывается
+    в базу фоновым потоком пачкой.
+    """
+
+    post = get_object_or_404(Post.objects.visible(), id=post_id)
+    form = CommentForm(request.POST or None, post=post)
+    if not form.is_valid():
+        return redirect('posts:post_detail', post.id)
+    if settings.COMMENTS_WRITE_BEHIND:
+        comment_queue.enqueue(
+            post.id,
+            request.user,
+            form.cleaned_data['text'],
+            form.parent_id,
+        )
+    else:
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent_id = form.parent_id
         comment.save()
 
     return redirect('posts:post_detail', post.id)
 
 
+@login_required
+@require_POST
+@ratelimit('post_like')
+def post_like(request, post_id):
+    """Ставит (liked=1) или снимает (liked=0) отметку «нравится».
+    Повтор запроса ничего не меняет. AJAX-запросу отвечает JSON
+    с числом отметок, остальным — переходом на страницу next.
+    """
+
+    post = get_object_or_404(
+        Post.objects.visible().only('pk', 'author_id', 'group_id'),
+        id=post_id,
+    )
+    liked = request.POST.get('liked', '1') != '0'
+    count = likes.set_liked(request.user, post, liked)
+    if request.is_ajax():
+        return JsonResponse({'liked': liked, 'count': count})
+
+    next_url = request.POST.get('next')
+    if not is_safe_url(
+        next_url,
+        allowed_hosts={request.get_host()},
+        require_https=request.is_secure(),
+    ):
+        return redirect('posts:post_detail', post.pk)
+
+    return redirect(next_url)
+
+
 @login_required
 def follow_index(request):
     """Страница с лентой постов авторов, на которых подписан пользователь."""
 
     template = 'posts/follow.html'
 
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page(request, post_list)
+    post_list = Post.objects.visible().filter(
+        author__following__user=request.user
+    ).select_related('group', 'author')
+    page_obj = _post_page(request, post_list)
     context = {
         'page_obj': page_obj,
+        'suggestions': graph.recommended_authors(request.user),
     }
 
     return render(request, template, context)
 
 
 @login_required
+@ratelimit('profile_follow', methods=('GET', 'POST'))
 def profile_follow(request, username):
     """Подписаться на автора."""
 
-    author = get_object_or_404(User, username=username)
+    author_id = resolve_username(username)
+    if author_id is None:
+        raise Http404
     if not (
-        request.user == author
-        or Follow.objects.filter(user=request.user, author=author).exists()
+        request.user.pk == author_id
+        or Follow.objects.filter(
+            user=request.user, author_id=author_id
+        ).exists()
     ):
-        Follow.objects.create(user=request.user, author=author)
+        Follow.objects.create(user=request.user, author_id=author_id)
 
     return redirect('posts:profile', username)
 
@@ -182,8 +438,10 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """Отписка от автора."""
 
-    author = get_object_or_404(User, username=username)
+    author_id = resolve_username(username)
+    if author_id is None:
+        raise Http404
 
-    Follow.objects.filter(user=request.user, author=author).delete()
+    Follow.objects.filter(user=request.user, author_id=author_id).delete()
 
     return redirect('posts:profile', username)
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from core import cache
+
+User = get_user_model()
+
+USER_CACHE_KEY = 'auth:user:{}'
+USER_CACHE_TIME_SEC = 60 * 60
+
+
+def _load_users(user_ids):
+    return User._default_manager.in_bulk(user_ids)
+
+
+def get_cached_user(user_id):
+    """Пользователь по id из общего кеша, при промахе — из базы."""
+
+    return cache.get_many(
+        {USER_CACHE_KEY.format(user_id): user_id},
+        _load_users,
+        USER_CACHE_TIME_SEC,
+    ).get(user_id)
+
+
+def forget_user(user_id):
+    """Удаляет пользователя из кеша бэкенда аутентификации
+    во всех процессах.
+    """
+
+    cache.invalidate(USER_CACHE_KEY.format(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который хранит загруженного по сессии пользователя
+    в общем кеше, чтобы AuthenticationMiddleware не ходил в базу на каждый
+    запрос. Кешируется только в SHARED_CACHE, общем для всех процессов:
+    иначе хеш старого пароля в кеше другого воркера продолжал бы
+    принимать сессии, выданные до смены пароля.
+    """
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is None or not self.user_can_authenticate(user):
+            return None
+
+        return user
@@ -0,0 +1,51 @@
+from urllib.parse import quote
+
+from django.http import Http404
+
+from core import cache
+
+from .backends import USER_CACHE_TIME_SEC, User, get_cached_user
+
+USERNAME_KEY = 'username:{}'
+MISSING = 0
+
+
+def _username_key(username):
+    return USERNAME_KEY.format(quote(username))
+
+
+def resolve_username(username):
+    """id пользователя по имени или None. Имя разрешается через общий
+    кеш; отсутствие пользователя тоже кешируется, чтобы перебор имён
+    не нагружал базу. Регистрация и смена имени сбрасывают отметку
+    во всех процессах.
+    """
+
+    def load(usernames):
+        user_id = User.objects.filter(
+            username=username
+        ).values_list('pk', flat=True).first()
+        return {username: user_id or MISSING}
+
+    user_id = cache.get_many(
+        {_username_key(username): username}, load, USER_CACHE_TIME_SEC
+    )[username]
+
+    return user_id or None
+
+
+def forget_usernames(*usernames):
+    cache.invalidate(*[
+        _username_key(username) for username in usernames if username
+    ])
+
+
+def get_user_or_404(username):
+    """Пользователь по имени через кеш имён и кеш пользователей."""
+
+    user_id = resolve_username(username)
+    user = get_cached_user(user_id) if user_id else None
+    if user is None:
+        raise Http404
+
+    return user
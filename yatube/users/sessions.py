@@ -0,0 +1,14 @@
+from django.contrib.sessions.backends import cached_db
+
+from core.cache import shared_cache
+
+
+class SessionStore(cached_db.SessionStore):
+    """cached_db, который кеширует сессии только в общем кеше
+    SHARED_CACHE: сессия, завершённая в одном процессе, не должна
+    оставаться действительной в кеше другого.
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = shared_cache()
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .backends import forget_user
+from .cache import forget_usernames
+
+User = get_user_model()
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    """Сбрасывает кеш пользователя и его имени (старого и нового) при
+    любом изменении, в том числе при регистрации через SignUp и смене
+    пароля через PasswordChangeView.
+    """
+
+    forget_user(instance.pk)
+    forget_usernames(
+        instance.username, getattr(instance, '_loaded_username', None)
+    )
+    instance._loaded_username = instance.username
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
@@ -0,0 +1,166 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.testing import SharedCacheMixin
+from .backends import forget_user, get_cached_user
+from .cache import resolve_username
+
+User = get_user_model()
+
+
+class CachedAuthTests(SharedCacheMixin, TestCase):
+    """Проверка кеширования сессии и пользователя в общем кеше."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='TestUser',
+            password='Old-pa55word',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.login(username='TestUser', password='Old-pa55word')
+
+    def test_authenticated_page_without_queries(self):
+        """Повторный просмотр страницы авторизованным пользователем
+        не обращается к базе.
+        """
+
+        url = reverse('about:author')
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_refreshes_cached_user(self):
+        """После смены пароля в кеше нет устаревшего пользователя,
+        а сессия остаётся действительной.
+        """
+
+        self.client.get(reverse('about:author'))
+        self.client.post(
+            reverse('users:password_change_form'),
+            {
+                'old_password': 'Old-pa55word',
+                'new_password1': 'New-pa55word',
+                'new_password2': 'New-pa55word',
+            },
+        )
+
+        response = self.client.get(reverse('about:author'))
+        self.assertTrue(response.context['user'].is_authenticated)
+        with self.assertNumQueries(0):
+            user = get_cached_user(self.user.pk)
+        self.assertTrue(user.check_password('New-pa55word'))
+
+    def test_logout_forgets_cached_user(self):
+        """При выходе пользователь удаляется из кеша."""
+
+        self.client.get(reverse('about:author'))
+        self.client.get(reverse('users:logout'))
+
+        with self.assertNumQueries(1):
+            get_cached_user(self.user.pk)
+
+    def test_password_change_in_other_process(self):
+        """Смена пароля в другом процессе сбрасывает пользователя
+        в общем кеше, и сессия, выданная до смены, больше не действует.
+        """
+
+        url = reverse('about:author')
+        self.client.get(url)
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('New-pa55word')
+        )
+        # У другого потока свой объект кеша, как у другого процесса.
+        worker = threading.Thread(target=forget_user, args=(self.user.pk,))
+        worker.start()
+        worker.join()
+
+        response = self.client.get(url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+class ProcessLocalCacheAuthTests(TestCase):
+    """С кешем, локальным для процесса, пользователь не кешируется."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='TestUser',
+            password='Old-pa55word',
+        )
+        self.client.login(username='TestUser', password='Old-pa55word')
+
+    def test_password_change_without_local_invalidation(self):
+        """Смена пароля, сигнал о которой не дошёл до этого процесса,
+        всё равно завершает старую сессию.
+        """
+
+        url = reverse('about:author')
+        self.client.get(url)
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('New-pa55word')
+        )
+
+        response = self.client.get(url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+class UsernameResolverTests(SharedCacheMixin, TestCase):
+    """Проверка кеша имён пользователей для страниц профиля."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_signup_makes_cached_missing_username_available(self):
+        """Отсутствующее имя кешируется, а регистрация через SignUp
+        сразу делает профиль доступным.
+        """
+
+        url = reverse('posts:profile', args=('Newbie',))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_username('Newbie'))
+
+        self.client.post(reverse('users:signup'), {
+            'username': 'Newbie',
+            'password1': 'Str0ng-pa55word',
+            'password2': 'Str0ng-pa55word',
+        })
+
+        user = User.objects.get(username='Newbie')
+        self.assertEqual(resolve_username('Newbie'), user.pk)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_signup_in_other_process(self):
+        """Пользователь, зарегистрированный в другом процессе, сразу
+        получает профиль в этом, хотя его отсутствие уже запомнено.
+        """
+
+        url = reverse('posts:profile', args=('Newbie',))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.other_process():
+            User.objects.create_user(username='Newbie')
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_follow_unknown_user(self):
+        """Подписка на несуществующего пользователя отдаёт 404."""
+
+        user = User.objects.create_user(username='TestUser')
+        self.client.force_login(user)
+
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, args=('ghost',)))
+                self.assertEqual(response.status_code, 404)
@@ -4,7 +4,11 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = '%n4f!7imey8_va8teyvin(@dwp--sisne-c1wt+(&0xg5r$kr*'
 
-DEBUG = True
+# Продакшен-профиль включается переменной окружения YATUBE_DEBUG=0:
+# кешированный загрузчик шаблонов, статика с хешами в именах (нужен
+# collectstatic), фоновые задачи в отдельных потоках и заранее
+# отрисованные страницы.
+DEBUG = os.environ.get('YATUBE_DEBUG', '1') != '0'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -19,6 +23,12 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Кеш для данных, которые должны совпадать во всех процессах: сессий,
+# пользователей, графа подписок и счётчиков отметок. Нужен общий бэкенд
+# (memcached, redis, база); пока это LocMemCache, такие данные
+# не кешируются и читаются из базы.
+SHARED_CACHE = 'default'
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -30,6 +40,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'notifications.apps.NotificationsConfig',
     'sorl.thumbnail',
 ]
 
@@ -37,7 +48,10 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 MIDDLEWARE = [
+    'core.tracing.TracingMiddleware',
+    'core.profiling.SamplingProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.prerender.PrerenderMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -48,7 +62,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Сессии читаются из общего кеша SHARED_CACHE и только при промахе
+# из базы.
+SESSION_ENGINE = 'users.sessions'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Загрузчики не указаны: вне режима отладки Django сам оборачивает их
+# в кешированный загрузчик, и шаблоны, в том числе подключаемые через
+# include карточки, компилируются один раз на процесс.
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -61,6 +85,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'notifications.context_processors.unread_notifications',
             ],
         },
     },
@@ -104,12 +129,122 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+# Вне режима отладки имена файлов статики содержат хеш содержимого,
+# а collectstatic дополнительно готовит сжатые .gz/.br-варианты.
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Статику и медиафайлы отдаёт WSGI-обёртка из yatube/wsgi.py.
+SERVE_STATIC_FILES = True
+
+STATIC_MAX_AGE = 60 * 60
+
+MEDIA_MAX_AGE = 60 * 60 * 24
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
 
 #  LOGOUT_REDIRECT_URL = 'users:logout'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь на диске и отправляются фоновым потоком
+# или командой send_queued_mail через EMAIL_QUEUE_BACKEND. Команда
+# send_digest отправляет через EMAIL_QUEUE_BACKEND напрямую.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+
+EMAIL_QUEUE_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+EMAIL_QUEUE_DIR = os.path.join(BASE_DIR, 'var', 'mail')
+
+EMAIL_QUEUE_BATCH_SIZE = 100
+
+EMAIL_QUEUE_INTERVAL_SEC = 10
+
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+
+EMAIL_QUEUE_RETRY_DELAY_SEC = 60
+
+EMAIL_QUEUE_STALE_SEC = 60 * 10
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+# Адрес сайта для ссылок в письмах-дайджестах.
+SITE_URL = 'http://127.0.0.1:8000'
+
+# Фоновые задачи: в режиме отладки выполняются сразу, в том же потоке.
+BACKGROUND_TASKS_EAGER = DEBUG
+
+BACKGROUND_TASKS_WORKERS = 2
+
+# Отложенная запись комментариев через журнал на диске.
+COMMENTS_WRITE_BEHIND = False
+
+COMMENTS_QUEUE_DIR = os.path.join(BASE_DIR, 'var', 'comments')
+
+COMMENTS_FLUSH_INTERVAL_SEC = 1
+
+# Ограничение частоты запросов на запись: 'число/период' (s, m, h, d)
+# для каждого пользователя ('user') и каждого IP-адреса ('ip').
+RATELIMIT_ENABLED = True
+
+RATELIMITS = {
+    'post_create': {'user': '20/m', 'ip': '60/m'},
+    'add_comment': {'user': '30/m', 'ip': '120/m'},
+    'profile_follow': {'user': '60/m', 'ip': '240/m'},
+    'post_like': {'user': '120/m', 'ip': '480/m'},
+    'signup': {'ip': '10/h'},
+}
+
+# Архив старых постов: база из DATABASES и возраст постов для archive_posts.
+DATABASE_ROUTERS = ['posts.routers.ArchiveRouter']
+
+POSTS_ARCHIVE_DATABASE = 'default'
+
+POSTS_ARCHIVE_AFTER_DAYS = 365
+
+# Заранее отрисованные страницы для анонимных посетителей.
+PRERENDER_ENABLED = not DEBUG
+
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'var', 'prerender')
+
+# Отложенная публикация: как часто фоновый поток или команда
+# publish_scheduled --loop публикует наступившие посты.
+POSTS_PUBLISH_INTERVAL_SEC = 30
+
+# Фоновый поток публикации запускается в каждом веб-процессе при загрузке
+# yatube.wsgi. Выключите, если публикует отдельный процесс
+# publish_scheduled --loop.
+POSTS_PUBLISH_WORKER = True
+
+# Трассировка запросов: спаны view, SQL, шаблонов и миниатюр.
+# Запросы дольше TRACING_SLOW_REQUEST_MS и случайная доля
+# TRACING_SAMPLE_RATE остальных пишутся в TRACING_DIR по кругу,
+# не больше TRACING_BUFFER_SIZE файлов на процесс (см. show_traces).
+TRACING_ENABLED = False
+
+TRACING_DIR = os.path.join(BASE_DIR, 'var', 'traces')
+
+TRACING_BUFFER_SIZE = 200
+
+TRACING_SLOW_REQUEST_MS = 500
+
+TRACING_SAMPLE_RATE = 0.01
+
+THUMBNAIL_BACKEND = 'core.tracing.TracedThumbnailBackend'
+
+# Семплирующий профайлер: стеки доли PROFILING_REQUEST_RATE запросов
+# и профили по запросу со страницы /profiler/ (только для сотрудников)
+# пишутся в PROFILING_DIR в формате collapsed stacks для flamegraph.
+PROFILING_ENABLED = False
+
+PROFILING_DIR = os.path.join(BASE_DIR, 'var', 'profiles')
+
+PROFILING_REQUEST_RATE = 0.05
+
+PROFILING_INTERVAL_MS = 10
+
+PROFILING_FLUSH_SEC = 60
+
+PROFILING_MAX_CAPTURE_SEC = 120
@@ -8,6 +8,11 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path(
+        'notifications/',
+        include('notifications.urls', namespace='notifications')
+    ),
+    path('profiler/', include('core.urls', namespace='core')),
     path('', include('posts.urls', namespace='posts')),
 ]
 
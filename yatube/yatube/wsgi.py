@@ -1,7 +1,20 @@
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from core.static_server import StaticFilesMiddleware
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.SERVE_STATIC_FILES:
+    application = StaticFilesMiddleware(application)
+
+if settings.POSTS_PUBLISH_WORKER:
+    # Иначе после перезапуска процесса уже запланированные посты
+    # не публикуются, пока кто-нибудь не запланирует новый.
+    from posts.publishing import start_worker
+
+    start_worker()